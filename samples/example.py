@@ -31,10 +31,12 @@ class MyGraph(Graph):
                    k=glm.vec3(1, 0.2, 0.01))
 
         car = Model(self, gltf.GLTFFile("../assets/models/car.glb", True))
-        shark = Model(self, gltf.GLTFFile("../assets/models/shark.glb", True))
-        troll = Model(self, gltf.GLTFFile("../assets/models/troll.glb", True))
-        shark.setTransform(glm.translate(glm.mat4(), (.6, 0, 0)))
-        troll.setTransform(glm.translate(glm.mat4(), (-.6, 0, 0)))
+
+        # models can also be loaded in the background, they appear as they are uploaded
+        shark = self.loadModel("../assets/models/shark.glb")
+        troll = self.loadModel("../assets/models/troll.glb")
+        shark.add_done_callback(lambda f: f.result().setTransform(glm.translate(glm.mat4(), (.6, 0, 0))))
+        troll.add_done_callback(lambda f: f.result().setTransform(glm.translate(glm.mat4(), (-.6, 0, 0))))
 
 
 if __name__ == '__main__':
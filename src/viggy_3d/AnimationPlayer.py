@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from .Graph import Graph
+    from .Model import Model
+
+import numpy as np
+
+from .JointBuffer import JointBuffer, jointUnit
+from .ModelData import AnimationData, ModelData
+
+
+# index of each animated property in AnimationClip.paths
+paths = ("translation", "rotation", "scale")
+
+
+def slerp(q0: np.ndarray, q1: np.ndarray, u: np.ndarray) -> np.ndarray:
+    """
+    spherical interpolation along the shorter arc of many pairs of unit quaternions
+    :param q0: (..., 4)
+    :param q1: (..., 4)
+    :param u: (...) interpolation factors in [0, 1]
+    """
+    dot = (q0 * q1).sum(axis=-1)
+    q1 = np.where(dot[..., None] < 0, -q1, q1)
+    dot = np.minimum(np.abs(dot), 1)
+    angle = np.arccos(dot)
+    sin = np.sin(angle)
+    # nearly equal quaternions are interpolated linearly
+    isSmall = sin < 1e-6
+    sin = np.where(isSmall, 1, sin)
+    w0 = np.where(isSmall, 1 - u, np.sin((1 - u) * angle) / sin)
+    w1 = np.where(isSmall, u, np.sin(u * angle) / sin)
+    return w0[..., None] * q0 + w1[..., None] * q1
+
+
+class AnimationClip:
+    def __init__(self, animation: AnimationData, data: ModelData):
+        """
+        keyframes of every channel of an animation packed into flat arrays so that all channels of any number of
+        models are sampled with one binary search, and the models that play the animation, see AnimationPlayer
+        """
+        self.data = data
+        self.duration = animation.duration
+        channels = [channel for channel in animation.channels if len(channel.times)]
+
+        # the animated nodes as indices into data.nodeParents and for every channel the index of its node among
+        # them and its path as an index into paths
+        self.nodes = np.array(sorted({channel.node for channel in channels}), dtype=np.int64)
+        slots = {node: i for i, node in enumerate(self.nodes.tolist())}
+        self.slots = np.array([slots[channel.node] for channel in channels], dtype=np.int64)
+        self.paths = np.array([paths.index(channel.path) for channel in channels], dtype=np.int64)
+        self.isStep = np.array([channel.interpolation == "STEP" for channel in channels], dtype=bool)
+        self.isCubic = np.array([channel.interpolation == "CUBICSPLINE" for channel in channels], dtype=bool)
+
+        # times of every channel one after another, each channel is shifted past the end of the one before so that
+        # the keys stay sorted and a time t of channel c is searched for as t + offsets[c]
+        counts = np.array([len(channel.times) for channel in channels], dtype=np.int64)
+        self.starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        self.ends = self.starts + counts
+        self.firsts = np.array([channel.times[0] for channel in channels], dtype=np.float64)
+        self.lasts = np.array([channel.times[-1] for channel in channels], dtype=np.float64)
+        span = float(self.lasts.max() - self.firsts.min()) + 1 if channels else 1.0
+        self.offsets = np.arange(len(channels)) * span - (self.firsts.min() if channels else 0.0)
+        self.keys = np.concatenate([channel.times.astype(np.float64) + offset
+                                    for channel, offset in zip(channels, self.offsets)] or [np.zeros(0)])
+
+        # [in tangent, value, out tangent] of every key with 4 components, tangents are 0 unless cubic
+        self.values = np.zeros((len(self.keys), 3, 4), dtype=np.float32)
+        for channel, start, end in zip(channels, self.starts, self.ends):
+            size = channel.values.shape[-1]
+            if channel.interpolation == "CUBICSPLINE":
+                self.values[start: end, :, :size] = channel.values
+            else:
+                self.values[start: end, 1, :size] = channel.values
+
+        # transform of the animated nodes at rest, for the properties no channel targets
+        self.restTranslations = data.nodeTranslations[self.nodes]
+        self.restRotations = data.nodeRotations[self.nodes]
+        self.restScales = data.nodeScales[self.nodes]
+
+        # models playing the clip with their node handles, time in seconds, speed and whether they loop
+        self.models: List[Model] = []
+        self.handles = np.zeros((0, len(self.nodes)), dtype=np.int64)
+        self.times = np.zeros(0, dtype=np.float64)
+        self.speeds = np.zeros(0, dtype=np.float64)
+        self.loops = np.zeros(0, dtype=bool)
+
+    def sample(self, times: np.ndarray) -> np.ndarray:
+        """
+        :param times: (m,) times in seconds, clamped to the keys of each channel
+        :return: (m, channels, 4) value of every channel at every time, 3 components are padded with 0
+        """
+        queries = np.clip(np.asarray(times, dtype=np.float64)[:, None] + self.offsets,
+                          self.firsts + self.offsets, self.lasts + self.offsets)
+        k0 = np.clip(np.searchsorted(self.keys, queries, side='right') - 1, self.starts,
+                     np.maximum(self.ends - 2, self.starts))
+        k1 = np.minimum(k0 + 1, self.ends - 1)
+
+        dt = self.keys[k1] - self.keys[k0]
+        u = np.where(dt > 0, (queries - self.keys[k0]) / np.where(dt > 0, dt, 1), 0)
+        # k0 is at most the second to last key, so a step channel reaches its last key only through k1
+        u = np.where(self.isStep, queries >= self.keys[k1], np.clip(u, 0, 1)).astype(np.float32)
+
+        v0 = self.values[k0, 1]
+        v1 = self.values[k1, 1]
+        result = v0 + (v1 - v0) * u[..., None]
+
+        isRotation = self.paths == 1
+        isSlerp = isRotation & ~self.isStep & ~self.isCubic
+        if isSlerp.any():
+            result[:, isSlerp] = slerp(v0[:, isSlerp], v1[:, isSlerp], u[:, isSlerp])
+
+        if self.isCubic.any():
+            # cubic Hermite spline with tangents scaled by the time between the keys
+            c = self.isCubic
+            s = u[:, c, None]
+            s2 = s * s
+            s3 = s2 * s
+            delta = dt[:, c, None].astype(np.float32)
+            result[:, c] = (2 * s3 - 3 * s2 + 1) * v0[:, c] + (s3 - 2 * s2 + s) * delta * self.values[k0[:, c], 2] \
+                + (-2 * s3 + 3 * s2) * v1[:, c] + (s3 - s2) * delta * self.values[k1[:, c], 0]
+
+        if isRotation.any():
+            rotations = result[:, isRotation]
+            lengths = np.linalg.norm(rotations, axis=-1, keepdims=True)
+            result[:, isRotation] = rotations / np.where(lengths > 0, lengths, 1)
+
+        return result
+
+    def localTimes(self) -> np.ndarray:
+        """
+        time of every model within the clip, wrapped around for looping models
+        """
+        if self.duration <= 0:
+            return np.zeros_like(self.times)
+        return np.where(self.loops, np.mod(self.times, self.duration), np.clip(self.times, 0, self.duration))
+
+    def poses(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: node handles of every model and their sampled translations, rotations and scales,
+                 flattened for TransformHierarchy.setTRS
+        """
+        count = len(self.models)
+        values = self.sample(self.localTimes())
+        translations = np.repeat(self.restTranslations[None], count, axis=0)
+        rotations = np.repeat(self.restRotations[None], count, axis=0)
+        scales = np.repeat(self.restScales[None], count, axis=0)
+        for path, target, size in ((0, translations, 3), (1, rotations, 4), (2, scales, 3)):
+            channels = self.paths == path
+            target[:, self.slots[channels]] = values[:, channels, :size]
+        return self.handles.reshape(-1), translations.reshape(-1, 3), rotations.reshape(-1, 4), \
+            scales.reshape(-1, 3)
+
+
+class AnimationPlayer:
+    def __init__(self, graph: Graph):
+        """
+        plays the animations of models and computes the joint matrices of skinned meshes.
+        every model that plays an animation is sampled together with the others playing it, and the local
+        transforms of all of them are set with a single TransformHierarchy.setTRS. after the hierarchy update the
+        joint matrices of every skinned mesh are computed for all models that share a skin at once and uploaded
+        in one JointBuffer, so many animated models cost little more per frame than one
+        """
+        self.graph = graph
+
+        # clips keyed by the model data and the index into its animations
+        self.__clips: Dict[Tuple[int, int], AnimationClip] = dict()
+
+        # clip played by each model, keyed by model id
+        self.__playing: Dict[int, AnimationClip] = dict()
+
+        # created on first use, the OpenGL context must be current
+        self.jointBuffer: Optional[JointBuffer] = None
+
+    def clip(self, data: ModelData, animation: int) -> AnimationClip:
+        key = (id(data), animation)
+        if key not in self.__clips or self.__clips[key].data is not data:
+            self.__clips[key] = AnimationClip(data.animations[animation], data)
+        return self.__clips[key]
+
+    def play(self, model: Model, animation: Union[int, str] = 0, time: float = 0.0, speed: float = 1.0,
+             loop: bool = True):
+        """
+        starts an animation of model.data, replacing the one it plays
+        :param animation: index into model.data.animations or the name of an animation
+        :param time: seconds into the animation to start at
+        :param speed: seconds of the animation played per second
+        :param loop: if False, the last pose is held once the animation ends
+        """
+        if isinstance(animation, str):
+            names = [data.name for data in model.data.animations]
+            if animation not in names:
+                raise KeyError(f"model has no animation {animation}")
+            animation = names.index(animation)
+
+        self.stop(model)
+        clip = self.clip(model.data, animation)
+        clip.models.append(model)
+        clip.handles = np.concatenate((clip.handles, model.nodes[clip.nodes][None]))
+        clip.times = np.append(clip.times, time)
+        clip.speeds = np.append(clip.speeds, speed)
+        clip.loops = np.append(clip.loops, loop)
+        self.__playing[id(model)] = clip
+
+    def stop(self, model: Model):
+        """
+        stops the animation of model, its nodes keep their current transforms
+        """
+        clip = self.__playing.pop(id(model), None)
+        if clip is None:
+            return
+        i = next(i for i, playing in enumerate(clip.models) if playing is model)
+        del clip.models[i]
+        clip.handles = np.delete(clip.handles, i, axis=0)
+        clip.times = np.delete(clip.times, i)
+        clip.speeds = np.delete(clip.speeds, i)
+        clip.loops = np.delete(clip.loops, i)
+
+    def isPlaying(self, model: Model) -> bool:
+        return id(model) in self.__playing
+
+    def time(self, model: Model) -> float:
+        """
+        seconds into the animation model plays
+        """
+        clip = self.__playing[id(model)]
+        return float(clip.localTimes()[next(i for i, playing in enumerate(clip.models) if playing is model)])
+
+    def update(self, seconds: float):
+        """
+        advances every playing animation and sets the local transforms of the animated nodes,
+        call before graph.transforms is updated
+        """
+        poses = []
+        for clip in {id(clip): clip for clip in self.__playing.values()}.values():
+            if not clip.models or not len(clip.nodes):
+                continue
+            clip.times += clip.speeds * seconds
+            poses.append(clip.poses())
+
+        if poses:
+            self.graph.transforms.setTRS(*(np.concatenate(arrays) for arrays in zip(*poses)))
+
+    def updateSkins(self) -> int:
+        """
+        computes the joint matrices of every skinned mesh of the models of graph that are not instanced,
+        uploads them in jointBuffer and binds it. call after graph.transforms is updated,
+        the OpenGL context must be current
+        :return: number of joint matrices uploaded
+        """
+        # skinned meshes grouped by model data, skin and index into model.meshes
+        groups: Dict[Tuple[int, int, Tuple[int, ...]], List[Model]] = dict()
+        for model in self.graph.models:
+            if model.instances is not None or not model.isSkinned:
+                continue
+            skins: Dict[int, List[int]] = dict()
+            for i, skin in enumerate(model.meshSkins):
+                if skin >= 0:
+                    skins.setdefault(skin, []).append(i)
+            for skin, meshes in skins.items():
+                groups.setdefault((id(model.data), skin, tuple(meshes)), []).append(model)
+
+        if not groups:
+            return 0
+
+        hierarchy = self.graph.transforms
+        matrices = []
+        offset = 0
+        for (_, skinIndex, meshes), models in groups.items():
+            skin = models[0].data.skins[skinIndex]
+            joints = np.array(skin.joints, dtype=np.int64)
+            jointHandles = np.stack([model.nodes[joints] for model in models])
+            meshHandles = np.array([[model.meshNodes[i] for i in meshes] for model in models], dtype=np.int64)
+
+            # joint matrices take vertices from the space of the mesh into the space of its node, which the
+            # model matrix of the draw then applies
+            skinned = hierarchy.worlds[hierarchy.rows[jointHandles]] @ skin.inverseBindMatrices
+            meshWorlds = hierarchy.worlds[hierarchy.rows[meshHandles]]
+            # a mesh whose node is hidden by a zero scale has no inverse, its joints collapse it to a point
+            singular = np.linalg.det(meshWorlds[..., :3, :3]) == 0
+            inverses = np.linalg.inv(np.where(singular[..., None, None], np.eye(4, dtype=np.float32), meshWorlds))
+            inverses[singular] = 0
+            matrices.append((inverses[:, :, None] @ skinned[:, None]).reshape(-1, 4, 4))
+
+            jointCount = len(joints)
+            for model in models:
+                for i in meshes:
+                    model.jointOffsets[i] = offset
+                    offset += jointCount
+
+        if self.jointBuffer is None:
+            self.jointBuffer = JointBuffer(self.graph.glState)
+        self.jointBuffer.update(np.concatenate(matrices))
+        self.jointBuffer.bind(jointUnit)
+        return offset
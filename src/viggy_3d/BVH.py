@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+
+def mortonCodes(points: np.ndarray) -> np.ndarray:
+    """
+    :param points: (n, 3) array
+    :return: (n,) 30 bit codes, nearby points get nearby codes
+    """
+    low = points.min(axis=0)
+    size = np.maximum(points.max(axis=0) - low, 1e-30)
+    cells = np.clip((points - low) / size * 1023, 0, 1023).astype(np.uint32)
+
+    # spread the 10 bits of each axis so that the bits of the 3 axes interleave
+    cells = (cells | (cells << 16)) & 0x030000FF
+    cells = (cells | (cells << 8)) & 0x0300F00F
+    cells = (cells | (cells << 4)) & 0x030C30C3
+    cells = (cells | (cells << 2)) & 0x09249249
+    return (cells[:, 0] << 2) | (cells[:, 1] << 1) | cells[:, 2]
+
+
+def intersectRayTriangles(origin: np.ndarray, direction: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """
+    Moller-Trumbore test of one ray against many triangles, both faces are hit
+    :param triangles: (n, 3, 3) corners of each triangle
+    :return: (n,) ray parameter t of each hit, inf where the triangle is missed
+    """
+    edge1 = triangles[:, 1] - triangles[:, 0]
+    edge2 = triangles[:, 2] - triangles[:, 0]
+    p = np.cross(direction, edge2)
+    determinant = (edge1 * p).sum(axis=1)
+
+    parallel = np.abs(determinant) < 1e-12
+    inverse = 1 / np.where(parallel, 1, determinant)
+
+    s = origin - triangles[:, 0]
+    u = (s * p).sum(axis=1) * inverse
+    q = np.cross(s, edge1)
+    v = (q @ direction) * inverse
+    t = (edge2 * q).sum(axis=1) * inverse
+
+    hit = ~parallel & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
+
+
+def transformBounds(bounds: np.ndarray, transforms: np.ndarray) -> np.ndarray:
+    """
+    :param bounds: (n, 2, 3) [min, max] corners of boxes
+    :param transforms: (n, 4, 4) transforms in the layout of np.array(glm.mat4)
+    :return: (n, 2, 3) world aligned boxes around the transformed boxes
+    """
+    centers = np.einsum('nij,nj->ni', transforms[:, :3, :3], (bounds[:, 0] + bounds[:, 1]) / 2) + transforms[:, :3, 3]
+    halfSizes = np.einsum('nij,nj->ni', np.abs(transforms[:, :3, :3]), (bounds[:, 1] - bounds[:, 0]) / 2)
+    return np.stack((centers - halfSizes, centers + halfSizes), axis=1)
+
+
+def rayBoxDistances(origin: np.ndarray, inverseDirection: np.ndarray, mins: np.ndarray, maxs: np.ndarray) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """
+    slab test of one ray against many boxes
+    :return: ray parameters where the ray enters and leaves each box, the box is missed where enter > leave
+    """
+    with np.errstate(invalid='ignore'):
+        t1 = (mins - origin) * inverseDirection
+        t2 = (maxs - origin) * inverseDirection
+    near = np.fmax.reduce(np.fmin(t1, t2), axis=1)
+    far = np.fmin.reduce(np.fmax(t1, t2), axis=1)
+    # inverted boxes of empty nodes are missed, also by rays of unlimited length
+    empty = ~(mins <= maxs).all(axis=1)
+    return np.where(empty, np.inf, near), np.where(empty, -np.inf, far)
+
+
+class BVH:
+    def __init__(self, bounds: np.ndarray, leafSize: int = 8):
+        """
+        bounding volume hierarchy over boxes, stored as a complete binary tree in arrays
+        primitives are ordered along a Morton curve and every leaf holds leafSize consecutive primitives,
+        node i has the children 2 i and 2 i + 1 and node 1 is the root
+        :param bounds: (n, 2, 3) [min, max] corners of the box of each primitive, float32 bounds keep nodes in float32
+        """
+        bounds = np.asarray(bounds, dtype=np.float32 if bounds.dtype == np.float32 else np.float64)
+        self.count = len(bounds)
+        self.leafSize = leafSize
+
+        # primitive indices in the order the leaves hold them
+        self.order = np.argsort(mortonCodes(bounds.mean(axis=1)), kind='stable') if self.count \
+            else np.zeros(0, dtype=np.int64)
+
+        leaves = max(-(-self.count // leafSize), 1)
+        self.leafStart = 1 << (leaves - 1).bit_length()
+
+        # empty nodes have inverted boxes and are never hit
+        self.mins = np.full((2 * self.leafStart, 3), np.inf, dtype=bounds.dtype)
+        self.maxs = np.full((2 * self.leafStart, 3), -np.inf, dtype=bounds.dtype)
+
+        self.refit(bounds)
+
+    def refit(self, bounds: np.ndarray):
+        """
+        recomputes every node box bottom up for new primitive bounds, the tree structure is kept
+        fast, but the tree gets worse if primitives move far from where they were at construction
+        """
+        padded = np.empty((self.leafStart * self.leafSize, 2, 3), dtype=self.mins.dtype)
+        padded[:, 0] = np.inf
+        padded[:, 1] = -np.inf
+        padded[:self.count] = bounds[self.order]
+        padded = padded.reshape(self.leafStart, self.leafSize, 2, 3)
+
+        self.mins[self.leafStart:] = padded[:, :, 0].min(axis=1)
+        self.maxs[self.leafStart:] = padded[:, :, 1].max(axis=1)
+
+        level = self.leafStart
+        while level > 1:
+            level //= 2
+            parents = slice(level, 2 * level)
+            left = slice(2 * level, 4 * level, 2)
+            right = slice(2 * level + 1, 4 * level, 2)
+            self.mins[parents] = np.minimum(self.mins[left], self.mins[right])
+            self.maxs[parents] = np.maximum(self.maxs[left], self.maxs[right])
+
+    def query(self, test: Callable[[np.ndarray, np.ndarray], np.ndarray]) -> np.ndarray:
+        """
+        descends the tree one level at a time, testing all nodes of a level together
+        :param test: takes (k, 3) mins and maxs and returns a (k,) bool array of the boxes to descend into,
+                     must be False for inverted boxes
+        :return: indices of the primitives in all reached leaves, a superset of those whose boxes pass test
+        """
+        nodes = np.ones(1, dtype=np.int64)
+        while True:
+            nodes = nodes[test(self.mins[nodes], self.maxs[nodes])]
+            if len(nodes) == 0 or nodes[0] >= self.leafStart:
+                break
+            nodes = np.stack((2 * nodes, 2 * nodes + 1), axis=1).reshape(-1)
+
+        slots = ((nodes - self.leafStart)[:, None] * self.leafSize + np.arange(self.leafSize)).reshape(-1)
+        return self.order[slots[slots < self.count]]
+
+    @staticmethod
+    def rayTest(origin: np.ndarray, direction: np.ndarray, maxDistance: float = np.inf) \
+            -> Callable[[np.ndarray, np.ndarray], np.ndarray]:
+        """
+        :return: test for query that passes boxes hit by the ray origin + t direction for 0 <= t <= maxDistance
+        """
+        inverse = 1 / np.where(np.abs(direction) < 1e-30, 1e-30, direction)
+
+        def test(mins: np.ndarray, maxs: np.ndarray) -> np.ndarray:
+            near, far = rayBoxDistances(origin, inverse, mins, maxs)
+            return (near <= far) & (far >= 0) & (near <= maxDistance)
+        return test
+
+    @staticmethod
+    def boxTest(low: np.ndarray, high: np.ndarray) -> Callable[[np.ndarray, np.ndarray], np.ndarray]:
+        """
+        :return: test for query that passes boxes overlapping the box from low to high
+        """
+        def test(mins: np.ndarray, maxs: np.ndarray) -> np.ndarray:
+            return (mins <= high).all(axis=1) & (maxs >= low).all(axis=1)
+        return test
+
+    @staticmethod
+    def sphereTest(center: np.ndarray, radius: float) -> Callable[[np.ndarray, np.ndarray], np.ndarray]:
+        """
+        :return: test for query that passes boxes overlapping the sphere
+        """
+        def test(mins: np.ndarray, maxs: np.ndarray) -> np.ndarray:
+            offsets = np.clip(center, mins, maxs) - center
+            return (mins <= maxs).all(axis=1) & ((offsets * offsets).sum(axis=1) <= radius * radius)
+        return test
+
+
+class TriangleBVH:
+    def __init__(self, positions: np.ndarray, triangles: np.ndarray, leafSize: int = 8):
+        """
+        BVH over the triangles of a mesh for ray picks
+        :param positions: (n, 3) float vertex positions
+        :param triangles: (k, 3) vertex indices of each triangle
+        """
+        self.positions = positions
+        self.triangles = triangles
+        corners = positions[triangles]
+        self.bvh = BVH(np.stack((corners.min(axis=1), corners.max(axis=1)), axis=1), leafSize)
+
+    def intersectRay(self, origin: np.ndarray, direction: np.ndarray, maxDistance: float = np.inf) \
+            -> Optional[Tuple[float, int]]:
+        """
+        :return: ray parameter t of the closest hit and the index of the hit triangle, None if nothing is hit
+        """
+        candidates = self.bvh.query(BVH.rayTest(origin, direction, maxDistance))
+        if len(candidates) == 0:
+            return None
+
+        distances = intersectRayTriangles(origin, direction, self.positions[self.triangles[candidates]])
+        closest = int(np.argmin(distances))
+        if np.isinf(distances[closest]) or distances[closest] > maxDistance:
+            return None
+        return float(distances[closest]), int(candidates[closest])
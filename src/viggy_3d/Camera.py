@@ -1,11 +1,12 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Tuple
 
 if TYPE_CHECKING:
     from .Graph import Graph
 
 import glm
+import numpy as np
 
 
 # TODO: create different types of camera motion functions using Key and Mouse events
@@ -61,6 +62,34 @@ class Camera:
         """
         return glm.perspective(self.fov, aspect, self.zMin, self.zMax)
 
+    def ray(self, x: float, y: float, width: int, height: int) -> Tuple[glm.vec3, glm.vec3]:
+        """
+        :param x: pixels from the left of a viewport width pixels wide
+        :param y: pixels from the top of a viewport height pixels high
+        :return: point on the near plane under (x, y) and the unit direction away from the camera through it
+        """
+        inverse = glm.inverse(self.projection(width / height) * self.view)
+        ndcX = 2 * x / width - 1
+        ndcY = 1 - 2 * y / height
+
+        near = inverse * glm.vec4(ndcX, ndcY, -1, 1)
+        far = inverse * glm.vec4(ndcX, ndcY, 1, 1)
+        near = glm.vec3(near) / near.w
+        far = glm.vec3(far) / far.w
+        return near, glm.normalize(far - near)
+
+    @staticmethod
+    def frustumPlanes(view: glm.mat4, projection: glm.mat4) -> np.ndarray:
+        """
+        :return: (6, 4) array of the left, right, bottom, top, near and far planes (a, b, c, d) in world space,
+                 normals are unit length and point inside, so a point p is inside if a p.x + b p.y + c p.z + d >= 0
+        """
+        clip = np.array(projection * view, dtype=np.float64)
+        planes = np.array([clip[3] + clip[0], clip[3] - clip[0],
+                           clip[3] + clip[1], clip[3] - clip[1],
+                           clip[3] + clip[2], clip[3] - clip[2]])
+        return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
     def setTarget(self, target: glm.vec3):
         """
         points the camera towards target vector
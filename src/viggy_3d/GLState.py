@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Tuple
+
+import OpenGL.GL as GL
+
+
+class GLState:
+    def __init__(self):
+        """
+        remembers the state set through it and skips calls that would not change it
+        tracks a single context, each Graph owns the tracker of its context and passes it to the objects it draws.
+        objects created on the upload thread must not use it
+        anything that changes tracked state without going through it must be followed by reset
+        """
+        self.program: Optional[int] = None
+        self.vertexArray: Optional[int] = None
+        self.activeTexture: Optional[int] = None
+
+        # key is (texture unit, target) and value is the bound texture
+        self.textures: Dict[Tuple[int, int], int] = dict()
+
+        # key is a capability such as GL.GL_BLEND and value is whether it is enabled
+        self.capabilities: Dict[int, bool] = dict()
+
+        self.blendFunction: Optional[Tuple[int, int]] = None
+        self.depthFunction: Optional[int] = None
+        self.depthWrite: Optional[bool] = None
+        self.frontFaceMode: Optional[int] = None
+
+        # calls passed on to OpenGL and calls skipped because they would not change the state
+        self.issued = 0
+        self.skipped = 0
+
+        # counters of the last completed frame
+        self.frameIssued = 0
+        self.frameSkipped = 0
+
+    def reset(self):
+        """
+        forgets all tracked state, the next call of every kind is passed on to OpenGL
+        """
+        self.program = None
+        self.vertexArray = None
+        self.activeTexture = None
+        self.textures.clear()
+        self.capabilities.clear()
+        self.blendFunction = None
+        self.depthFunction = None
+        self.depthWrite = None
+        self.frontFaceMode = None
+
+    def beginFrame(self):
+        """
+        resets the state, which Qt or uploads may have changed since the last frame,
+        and moves the counters to frameIssued and frameSkipped
+        """
+        self.reset()
+        self.frameIssued, self.frameSkipped = self.issued, self.skipped
+        self.issued = 0
+        self.skipped = 0
+
+    def __changed(self, isChanged: bool) -> bool:
+        if isChanged:
+            self.issued += 1
+        else:
+            self.skipped += 1
+        return isChanged
+
+    def useProgram(self, program: int):
+        if self.__changed(self.program != program):
+            GL.glUseProgram(program)
+            self.program = program
+
+    def bindVertexArray(self, vertexArray: int):
+        if self.__changed(self.vertexArray != vertexArray):
+            GL.glBindVertexArray(vertexArray)
+            self.vertexArray = vertexArray
+
+    def bindTexture(self, unit: int, target: int, texture: int):
+        """
+        binds texture to target of the texture unit, the active unit is only changed if the binding changes
+        """
+        if not self.__changed(self.textures.get((unit, target)) != texture):
+            return
+        if self.activeTexture != unit:
+            GL.glActiveTexture(GL.GL_TEXTURE0 + unit)
+            self.activeTexture = unit
+            self.issued += 1
+        GL.glBindTexture(target, texture)
+        self.textures[(unit, target)] = texture
+
+    def enable(self, capability: int):
+        if self.__changed(self.capabilities.get(capability) is not True):
+            GL.glEnable(capability)
+            self.capabilities[capability] = True
+
+    def disable(self, capability: int):
+        if self.__changed(self.capabilities.get(capability) is not False):
+            GL.glDisable(capability)
+            self.capabilities[capability] = False
+
+    def blendFunc(self, source: int, destination: int):
+        if self.__changed(self.blendFunction != (source, destination)):
+            GL.glBlendFunc(source, destination)
+            self.blendFunction = (source, destination)
+
+    def depthFunc(self, function: int):
+        if self.__changed(self.depthFunction != function):
+            GL.glDepthFunc(function)
+            self.depthFunction = function
+
+    def depthMask(self, flag: bool):
+        if self.__changed(self.depthWrite != flag):
+            GL.glDepthMask(GL.GL_TRUE if flag else GL.GL_FALSE)
+            self.depthWrite = flag
+
+    def frontFace(self, mode: int):
+        if self.__changed(self.frontFaceMode != mode):
+            GL.glFrontFace(mode)
+            self.frontFaceMode = mode
@@ -6,7 +6,6 @@ if TYPE_CHECKING:
     from .GLTFFile import GLTFFile
 
 from enum import IntEnum
-import struct
 
 import numpy as np
 
@@ -32,22 +31,14 @@ componentSize = {ComponentType.BYTE: 1,
                  ComponentType.UNSIGNED_INT: 4,
                  ComponentType.FLOAT: 4}
 
-componentFormat = {ComponentType.BYTE: 'c',
-                   ComponentType.UNSIGNED_BYTE: 'B',
-                   ComponentType.SHORT: 'h',
-                   ComponentType.UNSIGNED_SHORT: 'H',
-                   ComponentType.INT: 'i',
-                   ComponentType.UNSIGNED_INT: 'I',
-                   ComponentType.FLOAT: 'f'}
-
-# to simplify things everything is stored as int or uint, can be optimized
-componentNumpyType = {ComponentType.BYTE: np.intc,
-                      ComponentType.UNSIGNED_BYTE: np.uintc,
-                      ComponentType.SHORT: np.intc,
-                      ComponentType.UNSIGNED_SHORT: np.uintc,
-                      ComponentType.INT: np.intc,
-                      ComponentType.UNSIGNED_INT: np.uintc,
-                      ComponentType.FLOAT: np.single}
+# components are stored little endian in the buffer, arrays keep the native component type
+componentNumpyType = {ComponentType.BYTE: np.dtype('<i1'),
+                      ComponentType.UNSIGNED_BYTE: np.dtype('<u1'),
+                      ComponentType.SHORT: np.dtype('<i2'),
+                      ComponentType.UNSIGNED_SHORT: np.dtype('<u2'),
+                      ComponentType.INT: np.dtype('<i4'),
+                      ComponentType.UNSIGNED_INT: np.dtype('<u4'),
+                      ComponentType.FLOAT: np.dtype('<f4')}
 
 numComponent = {"SCALAR": 1,
                 "VEC2": 2,
@@ -57,6 +48,11 @@ numComponent = {"SCALAR": 1,
                 "MAT3": 9,
                 "MAT4": 16}
 
+# number of rows in each column of matrix types, columns are padded to 4 byte boundaries
+matrixRows = {"MAT2": 2,
+              "MAT3": 3,
+              "MAT4": 4}
+
 
 class Accessor(GLTFObject):
     def __init__(self, file: GLTFFile, index: int):
@@ -81,7 +77,14 @@ class Accessor(GLTFObject):
         self.min: Optional[List[float]] = self.getFromJSONDict("min")
         self.max: Optional[List[float]] = self.getFromJSONDict("max")
 
-        self.data = np.array(self.__getDataBuffer(), dtype=componentNumpyType[self.componentType])
+        # decoded on first access of data
+        self.__data: Optional[np.ndarray] = None
+
+    @property
+    def data(self) -> Optional[np.ndarray]:
+        if self.__data is None:
+            self.__data = self.__getDataBuffer()
+        return self.__data
 
     @property
     def componentSize(self) -> int:
@@ -98,22 +101,36 @@ class Accessor(GLTFObject):
         else:
             return self.componentSize * self.numComponent
 
-    def __getDataBuffer(self):
+    @property
+    def dtype(self) -> np.dtype:
+        return componentNumpyType[self.componentType]
+
+    def __getDataBuffer(self) -> Optional[np.ndarray]:
+        """
+        creates a strided numpy view over the buffer view bytes, no data is copied unless the view is compressed
+        a view is read only if the underlying buffer is immutable
+        """
         if self.bufferView is None:
             return None
 
-        data = []
-
-        offset = self.byteOffset + self.bufferView.byteOffset
-
-        for _ in range(self.count):
-            dataArray = struct.unpack_from('<' + componentFormat[self.componentType] * self.numComponent,
-                                           self.bufferView.buffer.data[
-                                           offset: offset + self.componentSize * self.numComponent])
-            if self.numComponent == 1:
-                data.extend(dataArray)
-            else:
-                data.append(dataArray)
-            offset += self.stride
+        offset = self.byteOffset
+
+        if self.type in matrixRows and self.componentSize < 4:
+            # each column of the matrix starts on a 4 byte boundary
+            rows = matrixRows[self.type]
+            columnStride = -(-rows * self.componentSize // 4) * 4
+            stride = self.bufferView.byteStride or columnStride * rows
+            data = np.ndarray(shape=(self.count, rows, rows), dtype=self.dtype,
+                              buffer=self.bufferView.data, offset=offset,
+                              strides=(stride, columnStride, self.componentSize))
+            data = data.reshape(self.count, self.numComponent)
+        elif self.numComponent == 1:
+            data = np.ndarray(shape=(self.count,), dtype=self.dtype,
+                              buffer=self.bufferView.data, offset=offset,
+                              strides=(self.stride,))
+        else:
+            data = np.ndarray(shape=(self.count, self.numComponent), dtype=self.dtype,
+                              buffer=self.bufferView.data, offset=offset,
+                              strides=(self.stride, self.componentSize))
 
         return data
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from .GLTFFile import GLTFFile
+
+from enum import Enum
+
+from .Accessor import Accessor
+from .GLTFObject import GLTFObject, getFromJSONDict, createFromKey
+
+
+class Interpolation(Enum):
+    LINEAR = "LINEAR"
+    STEP = "STEP"
+    CUBICSPLINE = "CUBICSPLINE"
+
+
+class AnimationSampler:
+    def __init__(self, file: GLTFFile, samplerDict: dict):
+        self.jsonDict = samplerDict
+
+        # keyframe times in seconds
+        self.input = createFromKey(file, Accessor, "accessors", self.jsonDict, "input")
+
+        # keyframe values, for CUBICSPLINE an in tangent, a value and an out tangent for every keyframe
+        self.output = createFromKey(file, Accessor, "accessors", self.jsonDict, "output")
+
+        self.interpolation = Interpolation(getFromJSONDict(self.jsonDict, "interpolation", "LINEAR"))
+
+
+class AnimationChannel:
+    def __init__(self, channelDict: dict, samplers: List[AnimationSampler]):
+        self.jsonDict = channelDict
+
+        self.sampler = samplers[self.jsonDict["sampler"]]
+
+        target = self.jsonDict["target"]
+
+        # index of the animated node, nodes are created by the scenes that contain them
+        self.node: Optional[int] = getFromJSONDict(target, "node")
+
+        # translation, rotation, scale or weights
+        self.path: str = target["path"]
+
+
+class Animation(GLTFObject):
+    def __init__(self, file: GLTFFile, index: int):
+        super().__init__(file, "animations", index)
+
+        self.samplers = [AnimationSampler(file, samplerDict) for samplerDict in self.jsonDict["samplers"]]
+        self.channels = [AnimationChannel(channelDict, self.samplers) for channelDict in self.jsonDict["channels"]]
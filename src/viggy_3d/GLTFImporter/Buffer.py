@@ -7,7 +7,7 @@ if TYPE_CHECKING:
 
 import os
 
-from .GLTFObject import GLTFObject
+from .GLTFObject import GLTFObject, getFromJSONDict
 
 
 class Buffer(GLTFObject):
@@ -17,9 +17,17 @@ class Buffer(GLTFObject):
         self.byteLength: int = self.jsonDict["byteLength"]
         self.uri: Optional[str] = self.getFromJSONDict("uri")
 
+        # a fallback buffer only backs EXT_meshopt_compression views and need not have any data
+        self.isFallback: bool = getFromJSONDict(getFromJSONDict(self.getFromJSONDict("extensions", dict()),
+                                                                "EXT_meshopt_compression", dict()),
+                                                "fallback", False)
+
         self.data = self.__loadFromUri()
 
     def __loadFromUri(self):
+        if self.uri is None and self.isFallback:
+            return None
+
         if self.uri is None and self.file.isBinary:
             return self.file.binaryData
 
@@ -28,5 +36,8 @@ class Buffer(GLTFObject):
         else:
             path = self.file.path.parent.joinpath(self.uri)
 
+        if self.file.isMemoryMapped:
+            return memoryview(self.file.openMemoryMap(path))
+
         with open(path, 'rb') as f:
             return f.read()
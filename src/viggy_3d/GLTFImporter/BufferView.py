@@ -6,9 +6,14 @@ if TYPE_CHECKING:
     from .GLTFFile import GLTFFile
 
 from enum import IntEnum
+import threading
+import time
 
-from .GLTFObject import GLTFObject
+import numpy as np
+
+from .GLTFObject import GLTFObject, createGLTFObject, getFromJSONDict
 from .Buffer import Buffer
+from . import meshopt
 
 
 class BufferTarget(IntEnum):
@@ -16,6 +21,62 @@ class BufferTarget(IntEnum):
     ELEMENT_ARRAY_BUFFER = 34963
 
 
+class DecodeStats:
+    """
+    accumulates the number of bytes decoded from buffer views and the time taken, that is bytes decompressed
+    from compressed views and bytes of accessor views packed or converted on the CPU, see VertexBuffer and toFloat
+    in ModelData, accessor views that are read in place add nothing
+    the bytes copied to OpenGL buffers and the time taken are accumulated separately, see addUpload
+    """
+    def __init__(self):
+        self.byteCount: int = 0
+        self.seconds: float = 0.0
+        self.uploadByteCount: int = 0
+        self.uploadSeconds: float = 0.0
+
+        # models are decoded on several ModelLoader workers and uploaded on the upload thread at once
+        self.__lock = threading.Lock()
+
+    def add(self, byteCount: int, seconds: float):
+        with self.__lock:
+            self.byteCount += byteCount
+            self.seconds += seconds
+
+    def addUpload(self, byteCount: int, seconds: float):
+        with self.__lock:
+            self.uploadByteCount += byteCount
+            self.uploadSeconds += seconds
+
+    def reset(self):
+        with self.__lock:
+            self.byteCount = 0
+            self.seconds = 0.0
+            self.uploadByteCount = 0
+            self.uploadSeconds = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """
+        :return: decode throughput in MB/s
+        """
+        if self.seconds == 0.0:
+            return 0.0
+        return self.byteCount / self.seconds / 1e6
+
+    @property
+    def uploadThroughput(self) -> float:
+        """
+        :return: throughput of copies to OpenGL buffers in MB/s
+        """
+        if self.uploadSeconds == 0.0:
+            return 0.0
+        return self.uploadByteCount / self.uploadSeconds / 1e6
+
+
+# module wide statistics updated by every compressed BufferView, every conversion of accessor data and every upload
+decodeStats = DecodeStats()
+
+
 class BufferView(GLTFObject):
     def __init__(self, file: GLTFFile, index: int):
         super().__init__(file, "bufferViews", index)
@@ -34,3 +95,34 @@ class BufferView(GLTFObject):
             self.target: Optional[BufferTarget] = BufferTarget(self.jsonDict["target"])
         else:
             self.target: Optional[BufferTarget] = None
+
+        # EXT_meshopt_compression, buffer and byteOffset above then refer to the uncompressed fallback
+        self.compression: Optional[dict] = getFromJSONDict(self.getFromJSONDict("extensions", dict()),
+                                                           "EXT_meshopt_compression")
+
+        # decompressed on first access of data
+        self.__data: Optional[memoryview] = None
+
+    @property
+    def data(self) -> memoryview:
+        """
+        the byteLength bytes of the buffer view, decompressed if the view is compressed
+        """
+        if self.__data is None:
+            if self.compression is not None:
+                self.__data = memoryview(self.__decompress())
+            else:
+                self.__data = memoryview(self.buffer.data)[self.byteOffset: self.byteOffset + self.byteLength]
+        return self.__data
+
+    def __decompress(self) -> np.ndarray:
+        compression = self.compression
+        buffer: Buffer = createGLTFObject(self.file, Buffer, "buffers", compression["buffer"])
+
+        start = time.perf_counter()
+        offset = compression.get("byteOffset", 0)
+        data = meshopt.decodeBufferView(memoryview(buffer.data)[offset: offset + compression["byteLength"]],
+                                        compression["count"], compression["byteStride"],
+                                        compression["mode"], compression.get("filter", "NONE"))
+        decodeStats.add(data.nbytes, time.perf_counter() - start)
+        return data
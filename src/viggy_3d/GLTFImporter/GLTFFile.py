@@ -12,23 +12,57 @@ if TYPE_CHECKING:
     from .Accessor import Accessor
     from .BufferView import BufferView
     from .Buffer import Buffer
+    from .Skin import Skin
 
 import json
+import mmap
 import pathlib
+import struct
 
+from .Animation import Animation
 from .Scene import Scene
+from .errors import GLTFImportError
+
+
+# extensions that change how data is stored, files that require any other extension are rejected
+supportedExtensions = {"KHR_mesh_quantization", "EXT_meshopt_compression"}
 
 
 class GLTFFile:
-    def __init__(self, path, binary=False):
+    def __init__(self, path, binary=False, memoryMap=False):
         """
         only two types of files are allowed, a stand alone binary .glb or a JSON .gltf file
+        :param memoryMap: if True, binary data is memory mapped instead of read,
+                          buffers are then memoryviews and only pages that are accessed are loaded
         """
         self.isBinary: bool = binary
+        self.isMemoryMapped: bool = memoryMap
 
         self.path: pathlib.Path = pathlib.Path(path)
 
-        if binary:
+        # open memory maps, kept alive as long as the file since buffers are views into them
+        self.memoryMaps: List[mmap.mmap] = []
+
+        if binary and memoryMap:
+            data = memoryview(self.openMemoryMap(path))
+
+            # header
+            magic, version, _ = struct.unpack_from('<4sII', data, 0)
+            assert magic == b"glTF"
+            assert version == 2
+
+            # json chunk
+            chunk0Length, tpe = struct.unpack_from('<I4s', data, 12)
+            assert tpe == b"JSON"  # first chunk must be json
+            self.jsonData: dict = json.loads(str(data[20: 20 + chunk0Length], 'utf-8'))
+
+            # binary chunk
+            offset = 20 + chunk0Length
+            chunk1Length, tpe = struct.unpack_from('<I4s', data, offset)
+            assert tpe[:3] == b"BIN"  # second chunk must be binary
+            self.binaryData: memoryview = data[offset + 8: offset + 8 + chunk1Length]
+
+        elif binary:
             with open(path, 'rb') as f:
                 # header
                 assert str(f.read(4), 'utf-8') == "glTF"  # magic
@@ -50,6 +84,10 @@ class GLTFFile:
             with open(path, 'r') as f:
                 self.jsonData: dict = json.load(f)
 
+        unsupported = set(self.jsonData.get("extensionsRequired", [])) - supportedExtensions
+        if unsupported:
+            raise GLTFImportError(f"{self.path.name} requires unsupported extensions {', '.join(sorted(unsupported))}")
+
         self.scenes: List[Optional[Scene]] = self.__makeArray("scenes")
         self.nodes: List[Optional[Node]] = self.__makeArray("nodes")
         self.meshes: List[Optional[Mesh]] = self.__makeArray("meshes")
@@ -60,14 +98,28 @@ class GLTFFile:
         self.accessors: List[Optional[Accessor]] = self.__makeArray("accessors")
         self.bufferViews: List[Optional[BufferView]] = self.__makeArray("bufferViews")
         self.buffers: List[Optional[Buffer]] = self.__makeArray("buffers")
+        self.skins: List[Optional[Skin]] = self.__makeArray("skins")
+        self.animations: List[Optional[Animation]] = self.__makeArray("animations")
 
         for i in range(len(self.jsonData["scenes"])):
             Scene(self, i)
 
         self.scene: Scene = self.scenes[self.jsonData["scene"]]
 
+        for i in range(len(self.jsonData.get("animations", []))):
+            Animation(self, i)
+
     def __makeArray(self, key: str) -> Optional[list]:
         if key in self.jsonData:
             return [None] * len(self.jsonData[key])
         else:
             return None
+
+    def openMemoryMap(self, path) -> mmap.mmap:
+        """
+        memory maps path as read only, the map stays open for the lifetime of the file
+        """
+        with open(path, 'rb') as f:
+            memoryMap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.memoryMaps.append(memoryMap)
+        return memoryMap
@@ -35,5 +35,4 @@ class Image(GLTFObject):
 
             return path
 
-        return io.BytesIO(self.bufferView.buffer.data[self.bufferView.byteOffset:
-                                                      self.bufferView.byteOffset + self.bufferView.byteLength])
+        return io.BytesIO(self.bufferView.data)
@@ -9,6 +9,7 @@ import glm
 
 from .GLTFObject import GLTFObject
 from .Mesh import Mesh
+from .Skin import Skin
 
 
 class Node(GLTFObject):
@@ -39,6 +40,9 @@ class Node(GLTFObject):
         # mesh
         self.mesh = self.createFromKey(Mesh, "meshes", "mesh")
 
+        # joints that deform the mesh
+        self.skin = self.createFromKey(Skin, "skins", "skin")
+
         # children
         self.children = self.createArrayFromKey(Node, "nodes", "children", self)
 
@@ -9,7 +9,7 @@ from enum import IntEnum
 
 from .Material import Material
 from .Accessor import Accessor
-from .GLTFObject import getFromJSONDict, createFromKey
+from .GLTFObject import getFromJSONDict, createFromKey, createGLTFObject
 
 
 class PrimitiveMode(IntEnum):
@@ -49,13 +49,19 @@ class Attribute:
         self.normal = self.__getAttribute(file, "NORMAL")
         self.tangent = self.__getAttribute(file, "TANGENT")
 
+        # first set of joint indices and weights of skinned meshes
+        self.joints0 = self.__getAttribute(file, "JOINTS_0")
+        self.weights0 = self.__getAttribute(file, "WEIGHTS_0")
+
         n = 0
         while True:
             if f"TEXCOORD_{n}" in self.jsonDict:
-                setattr(self, f"texCoord{n}", Accessor(file, self.jsonDict[f"TEXCOORD_{n}"]))
+                setattr(self, f"texCoord{n}",
+                        createGLTFObject(file, Accessor, "accessors", self.jsonDict[f"TEXCOORD_{n}"]))
             else:
                 break
             n += 1
 
     def __getAttribute(self, file, attribute: str) -> Optional[Accessor]:
-        return Accessor(file, self.jsonDict[attribute]) if attribute in self.jsonDict else None
+        # accessors are shared between primitives, so they must come from the file cache
+        return createFromKey(file, Accessor, "accessors", self.jsonDict, attribute)
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from .GLTFFile import GLTFFile
+
+from .Accessor import Accessor
+from .GLTFObject import GLTFObject
+
+
+class Skin(GLTFObject):
+    def __init__(self, file: GLTFFile, index: int):
+        super().__init__(file, "skins", index)
+
+        # MAT4 accessor with the inverse bind matrix of every joint, identity matrices if None
+        self.inverseBindMatrices: Optional[Accessor] = self.createFromKey(Accessor, "accessors",
+                                                                          "inverseBindMatrices")
+
+        # indices of the joint nodes, nodes are created by the scenes that contain them
+        self.joints: List[int] = self.jsonDict["joints"]
+
+        # index of the common root of the joints, if given
+        self.skeleton: Optional[int] = self.getFromJSONDict("skeleton")
@@ -1,6 +1,8 @@
-from .Accessor import Accessor
+from .Accessor import Accessor, ComponentType
+from .Animation import Animation, AnimationChannel, AnimationSampler, Interpolation
 from .Buffer import Buffer
-from .BufferView import BufferView
+from .errors import GLTFImportError
+from .BufferView import BufferView, DecodeStats, decodeStats
 from .GLTFFile import GLTFFile
 from .Image import Image
 from .Material import Material, PBRInfo
@@ -9,5 +11,6 @@ from .Node import Node
 from .Primitive import Primitive, PrimitiveMode
 from .Sampler import Sampler, TextureMinFilter, TextureMagFilter, TextureWrap
 from .Scene import Scene
+from .Skin import Skin
 from .Texture import Texture
 from .TextureInfo import TextureInfo, NormalTextureInfo, OcclusionTextureInfo
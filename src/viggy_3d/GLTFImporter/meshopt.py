@@ -0,0 +1,417 @@
+"""
+decoders for the EXT_meshopt_compression bitstreams and filters
+attribute data and filters are decoded with numpy, the index codecs are sequential by design
+"""
+from __future__ import annotations
+
+from typing import List, Tuple
+
+import numpy as np
+
+from .errors import GLTFImportError
+
+
+vertexHeader = 0xa0
+indexHeader = 0xe0
+sequenceHeader = 0xd0
+
+# number of sentinel fields in a byte of a 2 bit or 4 bit group, each sentinel is followed by an extra byte
+sentinels2 = [sum((b >> shift) & 3 == 3 for shift in (0, 2, 4, 6)) for b in range(256)]
+sentinels4 = [sum((b >> shift) & 15 == 15 for shift in (0, 4)) for b in range(256)]
+
+
+def decodeVertexBuffer(data, count: int, byteStride: int) -> np.ndarray:
+    """
+    :param data: bytes encoded with the attribute codec (mode ATTRIBUTES)
+    :return: (count, byteStride) array of decoded bytes
+    """
+    buffer = bytes(data)
+    encoded = np.frombuffer(buffer, dtype=np.uint8)
+
+    if len(buffer) < 1 or buffer[0] & 0xf0 != vertexHeader:
+        raise GLTFImportError("invalid meshopt vertex buffer header")
+    if buffer[0] & 0x0f != 0:
+        raise GLTFImportError(f"unsupported meshopt vertex codec version {buffer[0] & 0x0f}")
+
+    tailSize = max(byteStride, 32)
+    if len(buffer) < 1 + tailSize:
+        raise GLTFImportError("meshopt vertex buffer is truncated")
+    baseline = encoded[len(buffer) - byteStride:]
+
+    blockSize = min((8192 // byteStride) & ~15, 256)
+
+    # every group of 16 bytes is described by its mode, the column it belongs to,
+    # its first row in the output with blocks padded to 16 rows, and the offset of its data
+    modes: List[int] = []
+    columns: List[int] = []
+    rows: List[int] = []
+    offsets: List[int] = []
+    validRows: List[np.ndarray] = []
+
+    position = 1
+    alignedStart = 0
+    for blockStart in range(0, count, blockSize):
+        blockCount = min(blockSize, count - blockStart)
+        alignedCount = (blockCount + 15) & ~15
+        groupCount = alignedCount // 16
+        headerSize = (groupCount + 3) // 4
+
+        for k in range(byteStride):
+            header = buffer[position: position + headerSize]
+            position += headerSize
+
+            for g in range(groupCount):
+                mode = (header[g // 4] >> ((g % 4) * 2)) & 3
+                modes.append(mode)
+                columns.append(k)
+                rows.append(alignedStart + g * 16)
+                offsets.append(position)
+
+                if mode == 1:
+                    position += 4 + sum(sentinels2[b] for b in buffer[position: position + 4])
+                elif mode == 2:
+                    position += 8 + sum(sentinels4[b] for b in buffer[position: position + 8])
+                elif mode == 3:
+                    position += 16
+
+            if position > len(buffer) - tailSize:
+                raise GLTFImportError("meshopt vertex buffer is truncated")
+
+        validRows.append(np.arange(alignedStart, alignedStart + blockCount))
+        alignedStart += alignedCount
+
+    if position != len(buffer) - tailSize:
+        raise GLTFImportError("meshopt vertex buffer has trailing data")
+
+    deltas = np.zeros((alignedStart, byteStride), dtype=np.uint8)
+
+    modes = np.array(modes, dtype=np.int64)
+    columns = np.array(columns, dtype=np.int64)
+    rows = np.array(rows, dtype=np.int64)
+    offsets = np.array(offsets, dtype=np.int64)
+    lane = np.arange(16)
+
+    for mode, bits in ((1, 2), (2, 4), (3, 8)):
+        selected = modes == mode
+        if not selected.any():
+            continue
+
+        groupOffsets = offsets[selected]
+        fixedSize = 2 * bits
+
+        # fields are packed most significant bits first
+        packed = encoded[groupOffsets[:, None] + np.arange(fixedSize)]
+        shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+        values = ((packed[:, :, None] >> shifts) & ((1 << bits) - 1)).reshape(-1, 16).astype(np.uint8)
+
+        if bits < 8:
+            # sentinel fields are replaced by the next extra byte of the group
+            sentinel = values == (1 << bits) - 1
+            rank = np.cumsum(sentinel, axis=1) - 1
+            extra = encoded[np.where(sentinel, groupOffsets[:, None] + fixedSize + rank, 0)]
+            values = np.where(sentinel, extra, values)
+
+        deltas[rows[selected][:, None] + lane, columns[selected][:, None]] = values
+
+    if count == 0:
+        return np.zeros((0, byteStride), dtype=np.uint8)
+
+    # drop the rows that only pad blocks to a multiple of 16
+    deltas = deltas[np.concatenate(validRows)]
+
+    # each byte is a zigzag encoded delta from the same byte of the previous vertex, the chain starts at baseline
+    deltas = (deltas >> 1) ^ (0 - (deltas & 1)).astype(np.uint8)
+    deltas[0] += baseline
+    return np.cumsum(deltas, axis=0, dtype=np.uint8)
+
+
+def _decodeVByte(data: bytes, position: int) -> Tuple[int, int]:
+    lead = data[position]
+    position += 1
+    if lead < 128:
+        return lead, position
+
+    result = lead & 127
+    shift = 7
+    for _ in range(4):
+        group = data[position]
+        position += 1
+        result |= (group & 127) << shift
+        shift += 7
+        if group < 128:
+            break
+
+    return result, position
+
+
+def _decodeIndex(data: bytes, position: int, last: int) -> Tuple[int, int]:
+    v, position = _decodeVByte(data, position)
+    return (last + ((v >> 1) ^ -(v & 1))) & 0xffffffff, position
+
+
+def decodeIndexBuffer(data, count: int) -> np.ndarray:
+    """
+    :param data: bytes encoded with the triangle codec (mode TRIANGLES)
+    :return: array of count uint32 indices
+    """
+    buffer = bytes(data)
+
+    if count % 3 != 0:
+        raise GLTFImportError("meshopt index count must be a multiple of 3")
+    if len(buffer) < 1 + count // 3 + 16:
+        raise GLTFImportError("meshopt index buffer is truncated")
+    if buffer[0] & 0xf0 != indexHeader:
+        raise GLTFImportError("invalid meshopt index buffer header")
+    version = buffer[0] & 0x0f
+    if version > 1:
+        raise GLTFImportError(f"unsupported meshopt index codec version {version}")
+
+    edgeFifo = [(0xffffffff, 0xffffffff)] * 16
+    vertexFifo = [0xffffffff] * 16
+    edgeOffset = 0
+    vertexOffset = 0
+
+    nextIndex = 0
+    last = 0
+    fecMax = 13 if version >= 1 else 15
+
+    codes = buffer[1: 1 + count // 3]
+    position = 1 + count // 3
+    auxTable = buffer[len(buffer) - 16:]
+
+    result = [0] * count
+
+    for t, code in enumerate(codes):
+        if code < 0xf0:
+            # one edge from the edge fifo and a new, cached or free third vertex
+            a, b = edgeFifo[(edgeOffset - 1 - (code >> 4)) & 15]
+            fec = code & 15
+
+            if fec < fecMax:
+                c = nextIndex if fec == 0 else vertexFifo[(vertexOffset - 1 - fec) & 15]
+                vertexFifo[vertexOffset] = c
+                if fec == 0:
+                    vertexOffset = (vertexOffset + 1) & 15
+                    nextIndex += 1
+            else:
+                # 13 and 14 are -1 and +1 from the last free index, 15 is an explicit free index
+                if fec != 15:
+                    c = (last + (fec - (fec ^ 3))) & 0xffffffff
+                else:
+                    c, position = _decodeIndex(buffer, position, last)
+                last = c
+                vertexFifo[vertexOffset] = c
+                vertexOffset = (vertexOffset + 1) & 15
+
+            edgeFifo[edgeOffset] = (c, b)
+            edgeFifo[(edgeOffset + 1) & 15] = (a, c)
+            edgeOffset = (edgeOffset + 2) & 15
+
+        else:
+            if code < 0xfe:
+                # all three vertices are new or cached, described by the aux table
+                aux = auxTable[code & 15]
+                feb = aux >> 4
+                fec = aux & 15
+
+                a = nextIndex
+                nextIndex += 1
+
+                b = nextIndex if feb == 0 else vertexFifo[(vertexOffset - feb) & 15]
+                if feb == 0:
+                    nextIndex += 1
+
+                c = nextIndex if fec == 0 else vertexFifo[(vertexOffset - fec) & 15]
+                if fec == 0:
+                    nextIndex += 1
+
+                pushB = feb == 0
+                pushC = fec == 0
+            else:
+                # the aux byte is stored inline and may also encode free indices
+                aux = buffer[position]
+                position += 1
+
+                fea = 0 if code == 0xfe else 15
+                feb = aux >> 4
+                fec = aux & 15
+
+                # reset
+                if aux == 0:
+                    nextIndex = 0
+
+                a = 0
+                if fea == 0:
+                    a = nextIndex
+                    nextIndex += 1
+
+                b = 0
+                if feb == 0:
+                    b = nextIndex
+                    nextIndex += 1
+                elif feb != 15:
+                    b = vertexFifo[(vertexOffset - feb) & 15]
+
+                c = 0
+                if fec == 0:
+                    c = nextIndex
+                    nextIndex += 1
+                elif fec != 15:
+                    c = vertexFifo[(vertexOffset - fec) & 15]
+
+                if fea == 15:
+                    a, position = _decodeIndex(buffer, position, last)
+                    last = a
+                if feb == 15:
+                    b, position = _decodeIndex(buffer, position, last)
+                    last = b
+                if fec == 15:
+                    c, position = _decodeIndex(buffer, position, last)
+                    last = c
+
+                pushB = feb == 0 or feb == 15
+                pushC = fec == 0 or fec == 15
+
+            vertexFifo[vertexOffset] = a
+            vertexOffset = (vertexOffset + 1) & 15
+            vertexFifo[vertexOffset] = b
+            vertexOffset = (vertexOffset + pushB) & 15
+            vertexFifo[vertexOffset] = c
+            vertexOffset = (vertexOffset + pushC) & 15
+
+            edgeFifo[edgeOffset] = (b, a)
+            edgeFifo[(edgeOffset + 1) & 15] = (c, b)
+            edgeFifo[(edgeOffset + 2) & 15] = (a, c)
+            edgeOffset = (edgeOffset + 3) & 15
+
+        result[3 * t: 3 * t + 3] = (a, b, c)
+
+    if position > len(buffer) - 16:
+        raise GLTFImportError("meshopt index buffer is truncated")
+
+    return np.array(result, dtype=np.uint32)
+
+
+def decodeIndexSequence(data, count: int) -> np.ndarray:
+    """
+    :param data: bytes encoded with the index sequence codec (mode INDICES)
+    :return: array of count uint32 indices
+    """
+    buffer = bytes(data)
+
+    if len(buffer) < 1 + count + 4:
+        raise GLTFImportError("meshopt index sequence is truncated")
+    if buffer[0] & 0xf0 != sequenceHeader:
+        raise GLTFImportError("invalid meshopt index sequence header")
+    if buffer[0] & 0x0f > 1:
+        raise GLTFImportError(f"unsupported meshopt index sequence version {buffer[0] & 0x0f}")
+
+    # two baselines, the low bit of each code selects the one the delta applies to
+    last = [0, 0]
+    position = 1
+    result = [0] * count
+
+    for i in range(count):
+        v, position = _decodeVByte(buffer, position)
+        current = v & 1
+        v >>= 1
+        index = (last[current] + ((v >> 1) ^ -(v & 1))) & 0xffffffff
+        result[i] = index
+        last[current] = index
+
+    if position > len(buffer) - 4:
+        raise GLTFImportError("meshopt index sequence is truncated")
+
+    return np.array(result, dtype=np.uint32)
+
+
+def _roundAway(x: np.ndarray) -> np.ndarray:
+    """
+    rounds half away from zero like the reference decoder
+    """
+    return np.trunc(x + np.where(x >= 0, np.float32(0.5), np.float32(-0.5)))
+
+
+def decodeFilterOctahedral(data: np.ndarray) -> np.ndarray:
+    """
+    :param data: (count, 4) array of int8 or int16, x and y are octahedral coordinates and
+                 the third component holds the quantized value of 1
+    :return: the same array with unit vectors in the first three components, the fourth is unchanged
+    """
+    one = np.float32(np.iinfo(data.dtype).max)
+
+    # computed in float32 like the reference decoder so results round identically
+    x = data[:, 0].astype(np.float32)
+    y = data[:, 1].astype(np.float32)
+    z = data[:, 2].astype(np.float32) - np.abs(x) - np.abs(y)
+
+    # octahedral fixup for the negative hemisphere
+    t = np.minimum(z, np.float32(0))
+    x += np.where(x >= 0, t, -t)
+    y += np.where(y >= 0, t, -t)
+
+    s = one / np.sqrt(x * x + y * y + z * z)
+
+    result = data.copy()
+    result[:, 0] = _roundAway(x * s)
+    result[:, 1] = _roundAway(y * s)
+    result[:, 2] = _roundAway(z * s)
+    return result
+
+
+def decodeFilterQuaternion(data: np.ndarray) -> np.ndarray:
+    """
+    :param data: (count, 4) array of int16, three smallest components and, in the last component,
+                 the quantized value of 1 with the index of the largest component in its low two bits
+    :return: (count, 4) array of int16 normalized quaternions
+    """
+    scale = np.float32(1 / np.sqrt(2)) / (data[:, 3].astype(np.int32) | 3).astype(np.float32)
+    components = data[:, :3].astype(np.float32) * scale[:, None]
+    ww = np.float32(1) - np.sum(components * components, axis=1, dtype=np.float32)
+    w = np.sqrt(np.maximum(ww, np.float32(0)))
+
+    quantized = _roundAway(np.column_stack((components, w)) * np.float32(32767)).astype(np.int16)
+
+    # the largest component is w, stored at maxComponent, the others follow cyclically
+    maxComponent = data[:, 3].astype(np.int64) & 3
+    rows = np.arange(len(data))[:, None]
+    result = np.empty_like(data)
+    result[rows, (maxComponent[:, None] + np.array([1, 2, 3, 0])) % 4] = quantized
+    return result
+
+
+def decodeFilterExponential(data: np.ndarray) -> np.ndarray:
+    """
+    :param data: array of uint32 words, each a signed 24 bit mantissa and a signed 8 bit exponent
+    :return: float32 array of the same shape
+    """
+    words = data.view(np.int32)
+    mantissa = (words << 8) >> 8
+    exponent = words >> 24
+    return np.ldexp(mantissa.astype(np.float64), exponent).astype(np.float32)
+
+
+def decodeBufferView(data, count: int, byteStride: int, mode: str, filter: str = "NONE") -> np.ndarray:
+    """
+    decodes the compressed bytes of an EXT_meshopt_compression bufferView
+    :return: flat array of count * byteStride decoded bytes
+    """
+    if mode == "ATTRIBUTES":
+        decoded = decodeVertexBuffer(data, count, byteStride)
+    elif mode == "TRIANGLES":
+        decoded = decodeIndexBuffer(data, count).astype(np.uint16 if byteStride == 2 else np.uint32)
+    elif mode == "INDICES":
+        decoded = decodeIndexSequence(data, count).astype(np.uint16 if byteStride == 2 else np.uint32)
+    else:
+        raise GLTFImportError(f"unknown meshopt compression mode {mode}")
+
+    if filter == "OCTAHEDRAL":
+        decoded = decodeFilterOctahedral(decoded.view(np.int8 if byteStride == 4 else np.int16))
+    elif filter == "QUATERNION":
+        decoded = decodeFilterQuaternion(decoded.view(np.int16))
+    elif filter == "EXPONENTIAL":
+        decoded = decodeFilterExponential(decoded.view(np.uint32))
+    elif filter != "NONE":
+        raise GLTFImportError(f"unknown meshopt filter {filter}")
+
+    return np.ascontiguousarray(decoded).view(np.uint8).reshape(-1)
@@ -2,18 +2,37 @@ from __future__ import annotations
 
 import math
 import os
-from typing import List
+import time
+from typing import Dict, List, Optional, Tuple, Union
+from concurrent.futures import Future
 
 import glm
+import numpy as np
 from OpenGL import GL
 from PySide6.QtCore import QTimer, Qt
 from PySide6.QtGui import QMouseEvent, QSurfaceFormat, QKeyEvent
 from PySide6.QtOpenGLWidgets import QOpenGLWidget
 
+from .AnimationPlayer import AnimationPlayer
 from .Camera import Camera
+from .GLState import GLState
+from .JointBuffer import jointUnit
+from .LightClusters import LightClusters, lightsUnit, clustersUnit, lightIndicesUnit
 from .Model import Model
+from .ModelCache import ModelCache
+from .ModelData import TextureData
+from .ModelLoader import ModelLoader
 from .PointLight import PointLight
+from .RenderQueue import RenderQueue
+from .SceneBVH import SceneBVH, Hit
 from .Shader import Shader
+from .SkyBox import SkyBox
+from .ShaderCache import ShaderCache
+from .Texture import Texture
+from .TransformHierarchy import TransformHierarchy
+from .UniformBuffer import UniformBuffer, frameLayout
+from .UploadThread import UploadThread
+from .VertexLayout import VertexLayout, defaultLayout
 from .colors import fromRGB
 
 
@@ -37,9 +56,53 @@ class Graph(QOpenGLWidget):
         self.lights: List[PointLight] = []
         self.models: List[Model] = []
         self.shaders: List[Shader] = []
-        self.skyBox = None
+        self.__skyBox: Optional[SkyBox] = None
         self.activeCameraIndex = 0  # change to change to the active camera
 
+        # size of the viewport in device pixels, set in resizeGL so that no frame has to query it from OpenGL
+        self.__viewportSize = (1, 1)
+
+        # bound objects and fixed function state of the context, counts the calls it issues and skips
+        self.glState = GLState()
+
+        # local and world transforms of the nodes of every model, updated once per frame in paintGL
+        self.transforms = TransformHierarchy()
+
+        # plays the animations of models and computes the joint matrices of skinned meshes in paintGL
+        self.animations = AnimationPlayer(self)
+        self.__lastPaint: Optional[float] = None
+
+        # meshes of the current frame sorted by state, refilled in every paintGL
+        self.renderQueue = RenderQueue(self.glState, self.transforms)
+
+        # spatial index over every mesh for picking and box and sphere queries
+        self.sceneBVH = SceneBVH(self)
+
+        # camera and light data of the current frame shared by all shaders, created in initializeGL
+        self.frameUniforms: Optional[UniformBuffer] = None
+
+        # 1x1 white texture bound as the base texture of materials without one, created in initializeGL
+        self.whiteTexture: Optional[Texture] = None
+
+        # every light assigned to the clusters of the view frustum in each paintGL, the model shaders shade
+        # each fragment with the lights of its cluster
+        self.lightClusters = LightClusters(self.glState)
+
+        # if given, the built in shaders are read from or stored in this cache, set before initializeGL
+        self.shaderCache: Optional[ShaderCache] = None
+
+        # model and instanced shaders generated for models with interleaved vertices and skinned shaders,
+        # keyed by shader directory and the GLSL of the layout, see shaderFor
+        self.__layoutShaders: Dict[Tuple[str, str], Shader] = dict()
+
+        # background loading of models, uploads are spread over frames in paintGL
+        self.modelLoader = ModelLoader(self)
+
+        # if True, models loaded in the background upload buffers and textures on a shared context
+        # in a separate thread instead of in paintGL, created in initializeGL
+        self.useUploadThread = True
+        self.uploadThread: Optional[UploadThread] = None
+
         # main loop that calls paintGL multiple times
         timer = QTimer(self)
         timer.setInterval(1)  # time between frames in ms
@@ -61,18 +124,96 @@ class Graph(QOpenGLWidget):
     def addModels(self, *models: Model):
         self.models.extend(models)
 
+    def removeModels(self, *models: Model):
+        """
+        removes models from the scene, their animations are stopped and their nodes are removed from transforms
+        """
+        for model in models:
+            self.models.remove(model)
+            self.animations.stop(model)
+        self.transforms.remove(np.array([model.node for model in models], dtype=np.int64))
+
+    @property
+    def skyBox(self) -> Optional[SkyBox]:
+        return self.__skyBox
+
+    @skyBox.setter
+    def skyBox(self, skyBox: Optional[SkyBox]):
+        # the sky box is drawn in the context of the graph, so it shares its state tracker
+        if skyBox is not None:
+            self.__adoptState(skyBox)
+        self.__skyBox = skyBox
+
     def addShaders(self, *shaders: Shader):
+        """
+        shaders then share the state tracker of the graph
+        """
+        for shader in shaders:
+            self.__adoptState(shader)
         self.shaders.extend(shaders)
 
+    def __adoptState(self, drawable: Union[Shader, SkyBox]):
+        """
+        gives drawable the state tracker of the graph
+        """
+        if drawable.glState is not self.glState:
+            # state set through the tracker of drawable is not known to the tracker of the graph
+            drawable.glState = self.glState
+            self.glState.reset()
+
+    def loadModel(self, path, cache: Optional[ModelCache] = None, batch: bool = False, lods: bool = False,
+                  optimize: bool = False, vertexLayout: Optional[VertexLayout] = None) -> Future:
+        """
+        loads a .glb, .gltf or .obj file without blocking, see ModelLoader.load
+        :return: future that holds the Model once it is completely uploaded
+        """
+        return self.modelLoader.load(path, cache, batch, lods, optimize, vertexLayout)
+
+    def shaderFor(self, model: Model, skinned: bool = False) -> Shader:
+        """
+        the model or instanced shader with the vertex inputs of model, shaders for interleaved vertices are
+        generated on first use, the OpenGL context must be current
+        :param skinned: if True, the skinned shader for the skinned meshes of model, generated on first use
+        """
+        if model.vertexLayout is None and not skinned:
+            return self.modelShader if model.instances is None else self.instancedShader
+
+        directory = "shaders/skinned" if skinned else "shaders/model" if model.instances is None \
+            else "shaders/instanced"
+        key = (directory, (model.vertexLayout or defaultLayout).glsl())
+        if key not in self.__layoutShaders:
+            # skinned meshes are shaded like every other model, only their vertex stage differs
+            shader = Shader(os.path.join(os.path.dirname(__file__), directory), self.shaderCache,
+                            model.vertexLayout,
+                            os.path.join(os.path.dirname(__file__), "shaders/model") if skinned else None,
+                            glState=self.glState)
+            self.__initModelShader(shader)
+            if skinned:
+                shader.setUniform("jointMatrices", jointUnit)
+            self.addShaders(shader)
+            self.__layoutShaders[key] = shader
+        return self.__layoutShaders[key]
+
+    @staticmethod
+    def __initModelShader(shader: Shader):
+        shader.setUniform("material", {"ambient": (1.0, 1.0, 1.0),
+                                       "diffuse": (1.0, 1.0, 1.0),
+                                       "specular": (1.0, 1.0, 1.0),
+                                       "shininess": 32.0})
+
+        shader.setUniform("baseTexture", 0)
+        shader.setUniform("lights", lightsUnit)
+        shader.setUniform("clusters", clustersUnit)
+        shader.setUniform("lightIndices", lightIndicesUnit)
+
     @property
     def view(self) -> glm.mat4:
         return self.activeCamera.view
 
     @property
     def projection(self) -> glm.mat4:
-        viewport_data = GL.glGetIntegerv(GL.GL_VIEWPORT)
-        return self.activeCamera.projection((viewport_data[2] - viewport_data[0])  # width
-                                            / (viewport_data[3] - viewport_data[1]))  # height
+        width, height = self.__viewportSize
+        return self.activeCamera.projection(width / height)
 
     @staticmethod
     def __setBG(rgb: str):
@@ -106,6 +247,15 @@ class Graph(QOpenGLWidget):
 
         event.accept()
 
+    def pick(self, x: float, y: float) -> Optional[Hit]:
+        """
+        :param x: pixels from the left of the widget, such as QMouseEvent.x()
+        :param y: pixels from the top of the widget
+        :return: the closest mesh under (x, y) seen by the active camera, if any
+        """
+        origin, direction = self.activeCamera.ray(x, y, self.width(), self.height())
+        return self.sceneBVH.intersectRay(origin, direction)
+
     def mousePressEvent(self, event: QMouseEvent):
         self.lastX = event.x()
         self.lastY = event.y()
@@ -134,62 +284,105 @@ class Graph(QOpenGLWidget):
 
     def setVP(self):
         """
-        set view and projection matrix for all shaders
+        set view and projection matrix for all shaders, sent with the rest of the frame uniforms
         """
-        # create local variables in order to pass pointers
-        # if local variables are not used then glm.value_ptr will point to deallocated memory
-        view = self.view
-        projection = self.projection
+        # the uniform block expects column major matrices
+        self.frameUniforms.data["view"] = np.array(self.view).T
+        self.frameUniforms.data["projection"] = np.array(self.projection).T
 
-        for shader in self.shaders:
-            shader.setUniform("view", glm.value_ptr(view))
-            shader.setUniform("projection", glm.value_ptr(projection))
+    def setLight(self, light: PointLight):
+        """
+        set the light for shaders that only use one, sent with the rest of the frame uniforms
+        """
+        data = self.frameUniforms.data["light"]
+        data["position"] = light.position
+        data["ambient"] = light.ambient
+        data["diffuse"] = light.diffuse
+        data["specular"] = light.specular
+        data["k"] = light.k
+
+    def setLights(self):
+        """
+        assigns every light to the clusters of the frustum of the active camera and uploads them,
+        the cluster grid is sent with the rest of the frame uniforms
+        """
+        clusters = self.lightClusters
+        clusters.update(self.lights, self.view, self.projection)
+        clusters.bind()
+        self.frameUniforms.data["clusterGrid"] = (*clusters.grid, clusters.lightCount)
+        # tiles are found from window coordinates, which are in device pixels
+        self.frameUniforms.data["clusterDepth"] = (clusters.depthScale, clusters.depthBias, *self.__viewportSize)
+        if self.lights:
+            self.setLight(self.lights[0])
 
     def resizeGL(self, width, height):
-        GL.glViewport(0, 0, width, height)
+        # width and height are in device independent pixels, the framebuffer is larger on high DPI screens
+        ratio = self.devicePixelRatioF()
+        self.__viewportSize = (max(round(width * ratio), 1), max(round(height * ratio), 1))
+        GL.glViewport(0, 0, *self.__viewportSize)
 
     def initializeGL(self):
         """
         initialize OpenGL and create meshes and shaders
         """
-        GL.glEnable(GL.GL_MULTISAMPLE)
-        GL.glEnable(GL.GL_DEPTH_TEST)
-        GL.glEnable(GL.GL_BLEND)
-        GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
+        self.glState.enable(GL.GL_MULTISAMPLE)
+        self.glState.enable(GL.GL_DEPTH_TEST)
+        self.glState.enable(GL.GL_BLEND)
+        self.glState.blendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
 
-        # shader for all models
-        self.modelShader = Shader(os.path.join(os.path.dirname(__file__), "shaders/model"))
-        self.skyBoxShader = Shader(os.path.join(os.path.dirname(__file__), "shaders/sky_box"))
-        self.addShaders(self.modelShader, self.skyBoxShader)
+        if self.useUploadThread:
+            self.uploadThread = UploadThread(self.context())
+            self.context().aboutToBeDestroyed.connect(self.uploadThread.stop)
 
-        self.modelShader.setUniform("material", ((1.0, 1.0, 1.0),
-                                                 (1.0, 1.0, 1.0),
-                                                 (1.0, 1.0, 1.0),
-                                                 32.0))
+        self.frameUniforms = UniformBuffer(frameLayout, Shader.uniformBlockBindings["Frame"])
 
-        self.modelShader.setUniform("baseTexture", 0)
+        self.whiteTexture = Texture(TextureData(np.full((1, 1, 4), 255, dtype=np.uint8)), self.glState)
+
+        # shader for all models
+        self.modelShader = Shader(os.path.join(os.path.dirname(__file__), "shaders/model"),
+                                  self.shaderCache, glState=self.glState)
+        self.skyBoxShader = Shader(os.path.join(os.path.dirname(__file__), "shaders/sky_box"),
+                                   self.shaderCache, glState=self.glState)
+        # shader for models with instances
+        self.instancedShader = Shader(os.path.join(os.path.dirname(__file__), "shaders/instanced"),
+                                      self.shaderCache, glState=self.glState)
+        self.addShaders(self.modelShader, self.skyBoxShader, self.instancedShader)
+
+        for shader in (self.modelShader, self.instancedShader):
+            self.__initModelShader(shader)
 
     def paintGL(self):
+        # upload part of any models loaded in the background
+        self.modelLoader.upload()
+
+        # Qt and uploads may have changed the state since the last frame
+        self.glState.beginFrame()
+
         # clear buffers
         GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
 
         self.__setBG(self.bgColor)
 
-        # set the view and projection matrices for all shaders
+        # set the view and projection matrices, lights and camera for all shaders in a single upload
         self.setVP()
-
-        # set lights and camera uniforms
-        self.modelShader.setUniform("cameraPos", self.activeCamera.position)
-        self.modelShader.setUniform("light", (self.lights[0].position,
-                                              self.lights[0].ambient,
-                                              self.lights[0].diffuse,
-                                              self.lights[0].specular,
-                                              self.lights[0].k))
+        self.frameUniforms.data["cameraPos"] = self.activeCamera.position
+        self.setLights()
+        self.frameUniforms.upload()
 
         # sky box should be first thing drawn
         if self.skyBox:
             self.skyBoxShader.use()
             self.skyBox.draw()
 
+        # animated nodes are posed before the hierarchy update and skins after it
+        now = time.perf_counter()
+        self.animations.update(0.0 if self.__lastPaint is None else now - self.__lastPaint)
+        self.__lastPaint = now
+        self.transforms.update()
+        self.animations.updateSkins()
+
+        self.renderQueue.clear(self.view, self.projection, self.__viewportSize[1])
         for model in self.models:
-            model.draw(self.modelShader)
+            model.addToQueue(self.renderQueue, self.shaderFor(model),
+                             self.shaderFor(model, True) if model.isSkinned and model.instances is None else None)
+        self.renderQueue.draw()
@@ -1,20 +1,35 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
-
-if TYPE_CHECKING:
-    import numpy as np
+import time
 
+import numpy as np
 import OpenGL.GL as GL
 
+from .GLTFImporter import decodeStats
+
+
+# OpenGL index types for each numpy index type, signed indices are not valid glTF
+GLIndexType = {np.dtype(np.uint8): GL.GL_UNSIGNED_BYTE,
+               np.dtype(np.uint16): GL.GL_UNSIGNED_SHORT,
+               np.dtype(np.uint32): GL.GL_UNSIGNED_INT}
+
 
 class IndexBuffer:
     def __init__(self, array: np.ndarray):
-        self.buffer = array
-        self.length = array.size // 3  # number of faces
+        # indices are uploaded with their native width, strided accessor views are packed, see VertexBuffer
+        start = time.perf_counter()
+        buffer = array if array.dtype in GLIndexType else array.astype(np.uint32)
+        self.buffer = np.ascontiguousarray(buffer)
+        if self.buffer is not array:
+            decodeStats.add(self.buffer.nbytes, time.perf_counter() - start)
+        self.type = GLIndexType[self.buffer.dtype]
+        self.length = self.buffer.size // 3  # number of faces
         self.glBuffer = GL.glGenBuffers(1)
-        self.bind()
-        GL.glBufferData(GL.GL_ELEMENT_ARRAY_BUFFER, self.buffer.nbytes, self.buffer, GL.GL_STATIC_DRAW)
+        # the element array binding belongs to the bound vertex array, so upload through another target
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, self.glBuffer)
+        start = time.perf_counter()
+        GL.glBufferData(GL.GL_COPY_WRITE_BUFFER, self.buffer.nbytes, self.buffer, GL.GL_STATIC_DRAW)
+        decodeStats.addUpload(self.buffer.nbytes, time.perf_counter() - start)
 
     def bind(self):
         GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self.glBuffer)
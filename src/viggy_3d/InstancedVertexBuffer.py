@@ -1,20 +1,82 @@
-from typing import TYPE_CHECKING, Tuple
+from __future__ import annotations
 
-if TYPE_CHECKING:
-    import numpy as np
+from typing import Tuple
 
+import ctypes
+
+import numpy as np
 import OpenGL.GL as GL
 
 
+# per instance data of instanced models, must match the instance attributes of shaders/instanced
+# the model matrix is column major and uses locations 3 to 6, the color location 7
+instanceLayout = np.dtype([("model", np.float32, (4, 4)), ("color", np.float32, 4)])
+instanceIndices = (3, 7)
+instanceSizes = (16, 4)
+
+
 class InstancedVertexBuffer:
-    def __init__(self, array: np.ndarray, indices: Tuple, layout: Tuple, divisors: Tuple):
+    def __init__(self, array: np.ndarray, indices: Tuple[int, ...], layout: Tuple[int, ...],
+                 divisors: Tuple[int, ...]):
         """
-        :param array:
-        :param indices:
-        :param layout:
+        float attributes of every instance interleaved in one buffer, the buffer can be shared by any number of meshes
+        :param array: float32 array, or structured array of float32 fields, with the attributes of each instance
+                      one after another in the order of indices
+        :param indices: attribute location of each attribute
+        :param layout: number of components of each attribute, an attribute with more than 4 such as a mat4
+                       takes consecutive locations of 4 components each, like matrix attributes in GLSL
         :param divisors: the divisor for each index, tells OpenGL when to update the vertex attribute
                 0: update for every iteration of vertex shader
                 n: update for after every n instance drawings
         """
+        self.indices = tuple(indices)
+        self.layout = tuple(layout)
+        self.divisors = tuple(divisors)
+        self.vertexAttributesNo = len(self.indices)
+
+        # bytes per instance
+        self.stride = sum(self.layout) * 4
+
+        # number of instances in the buffer and the size of its storage in bytes
+        self.count = 0
+        self.capacity = 0
+
+        self.glBuffer = GL.glGenBuffers(1)
+        self.update(array)
+
+    def bind(self):
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.glBuffer)
+
+    def update(self, array: np.ndarray):
+        """
+        replaces the data of every instance, the storage only grows when there are more instances than before
+        """
+        data = np.ascontiguousarray(array).view(np.uint8).reshape(-1)
+        if len(data) % self.stride:
+            raise ValueError(f"instance data of {len(data)} bytes is not a multiple of {self.stride} bytes")
+        self.count = len(data) // self.stride
+
+        self.bind()
+        if len(data) > self.capacity:
+            self.capacity = len(data)
+            GL.glBufferData(GL.GL_ARRAY_BUFFER, self.capacity, data, GL.GL_DYNAMIC_DRAW)
+        elif len(data):
+            # orphaning lets the driver keep reading the old storage in draws that are still in flight
+            GL.glBufferData(GL.GL_ARRAY_BUFFER, self.capacity, None, GL.GL_DYNAMIC_DRAW)
+            GL.glBufferSubData(GL.GL_ARRAY_BUFFER, 0, len(data), data)
+
+    def setAttributes(self):
+        """
+        sources the instance attributes from this buffer, the target vertex array must be bound
+        """
+        self.bind()
+        offset = 0
         for i in range(self.vertexAttributesNo):
-            GL.glVertexAttribDivisor(self.indices[i], self.divisors[i])
+            for column in range(0, self.layout[i], 4):
+                location = self.indices[i] + column // 4
+                size = min(4, self.layout[i] - column)
+                GL.glEnableVertexAttribArray(location)
+                GL.glVertexAttribPointer(location, size, GL.GL_FLOAT, GL.GL_FALSE, self.stride,
+                                         ctypes.c_void_p(offset))
+                GL.glVertexAttribDivisor(location, self.divisors[i])
+                offset += size * 4
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import numpy as np
+import OpenGL.GL as GL
+
+from .GLState import GLState
+from .TextureBuffer import TextureBuffer
+
+
+# texture unit of the joint buffer, materials use unit 0. skinned shaders read it as the jointMatrices sampler
+jointUnit = 1
+
+
+class JointBuffer(TextureBuffer):
+    def __init__(self, glState: GLState):
+        """
+        joint matrices of every skinned mesh drawn in a frame in one buffer texture of RGBA32F texels,
+        each matrix takes 4 texels, one for each column, and is read in vertex shaders with texelFetch
+        """
+        super().__init__(glState, GL.GL_RGBA32F)
+
+        # number of matrices in the buffer
+        self.count = 0
+
+    def update(self, matrices: np.ndarray):
+        """
+        replaces every matrix, the storage only grows when there are more matrices than before
+        :param matrices: (n, 4, 4) matrices in the layout of np.array(glm.mat4)
+        """
+        self.count = len(matrices)
+        # GLSL matrices are column major
+        super().update(np.asarray(matrices, dtype=np.float32).transpose(0, 2, 1))
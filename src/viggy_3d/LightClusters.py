@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .GLState import GLState
+    from .PointLight import PointLight
+
+import glm
+import numpy as np
+import OpenGL.GL as GL
+
+from .TextureBuffer import TextureBuffer
+
+
+# texture units of the light data, the range of each cluster and the light indices of the clusters,
+# materials use unit 0 and the joint buffer unit 1
+lightsUnit = 2
+clustersUnit = 3
+lightIndicesUnit = 4
+
+# texels of each light in the lights buffer: position and radius, ambient, diffuse, specular, attenuation
+lightTexels = 5
+
+
+def lightRadii(colors: np.ndarray, k: np.ndarray, cutoff: float) -> np.ndarray:
+    """
+    distance at which the attenuated light no longer reaches cutoff
+    :param colors: (n, 3) sum of the ambient, diffuse and specular color of each light
+    :param k: (n, 3) constant, linear and quadratic attenuation
+    :return: (n,) radii, infinite for lights that are not attenuated with distance
+    """
+    # solves kz d^2 + ky d + kx = intensity / cutoff for d
+    c = np.asarray(k[:, 0], dtype=np.float64) - np.asarray(colors, dtype=np.float64).max(axis=1) / cutoff
+    b = np.asarray(k[:, 1], dtype=np.float64)
+    a = np.asarray(k[:, 2], dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        quadratic = (-b + np.sqrt(np.maximum(b * b - 4 * a * c, 0))) / (2 * a)
+        linear = np.where(b > 0, -c / b, np.inf)
+    return np.maximum(np.where(a > 0, quadratic, linear), 0)
+
+
+class LightClusters:
+    def __init__(self, glState: GLState, grid: Tuple[int, int, int] = (16, 9, 24), cutoff: float = 1 / 256):
+        """
+        clustered forward lighting: the view frustum is split into grid clusters, tiles of the viewport along
+        x and y and slices along the view depth that grow exponentially from the near to the far plane.
+        every frame each point light is assigned on the CPU to the clusters its sphere of influence overlaps,
+        so each fragment only shades the lights of its cluster
+        :param glState: state tracker of the context the clusters are drawn in
+        :param cutoff: lights are ignored where their attenuated color is below this, which bounds their influence
+        """
+        self.glState = glState
+        self.grid = tuple(grid)
+        self.cutoff = cutoff
+
+        # the slice of a view depth d is log(d) * depthScale + depthBias, set by update
+        self.depthScale = 0.0
+        self.depthBias = 0.0
+
+        # number of lights and of light indices in all clusters in the last update
+        self.lightCount = 0
+        self.assignments = 0
+
+        # created in the first update, the OpenGL context must be current
+        self.lights: Optional[TextureBuffer] = None
+        self.clusters: Optional[TextureBuffer] = None
+        self.lightIndices: Optional[TextureBuffer] = None
+
+        # view space boxes of the clusters as (clusters, 2, 3) [min, max] corners, for the projection they were
+        # computed with
+        self.__boxes = np.zeros((0, 2, 3))
+        self.__projection: Optional[np.ndarray] = None
+
+    @property
+    def clusterCount(self) -> int:
+        return self.grid[0] * self.grid[1] * self.grid[2]
+
+    @staticmethod
+    def nearFar(projection: np.ndarray) -> Tuple[float, float]:
+        """
+        :param projection: perspective projection in the layout of np.array(glm.mat4)
+        """
+        return projection[2, 3] / (projection[2, 2] - 1), projection[2, 3] / (projection[2, 2] + 1)
+
+    def __clusterBoxes(self, projection: np.ndarray) -> np.ndarray:
+        """
+        view space box around every cluster, clusters are ordered by slice, then by row and then by column
+        """
+        x, y, z = self.grid
+        near, far = self.nearFar(projection)
+        depths = near * (far / near) ** (np.arange(z + 1) / z)
+        # view space x and y of normalized device coordinates at a depth d are (ndc + offset) * d / scale
+        ndcX = np.linspace(-1, 1, x + 1)
+        ndcY = np.linspace(-1, 1, y + 1)
+        cornersX = (ndcX[None, :] + projection[0, 2]) * depths[:, None] / projection[0, 0]
+        cornersY = (ndcY[None, :] + projection[1, 2]) * depths[:, None] / projection[1, 1]
+
+        boxes = np.empty((z, y, x, 2, 3))
+        # each cluster spans two depths and two tile edges, its box contains the 8 corners
+        xs = np.stack((cornersX[:-1, :-1], cornersX[:-1, 1:], cornersX[1:, :-1], cornersX[1:, 1:]))
+        ys = np.stack((cornersY[:-1, :-1], cornersY[:-1, 1:], cornersY[1:, :-1], cornersY[1:, 1:]))
+        boxes[..., 0, 0] = xs.min(axis=0)[:, None, :]
+        boxes[..., 1, 0] = xs.max(axis=0)[:, None, :]
+        boxes[..., 0, 1] = ys.min(axis=0)[:, :, None]
+        boxes[..., 1, 1] = ys.max(axis=0)[:, :, None]
+        boxes[..., 0, 2] = -depths[1:, None, None]
+        boxes[..., 1, 2] = -depths[:-1, None, None]
+        return boxes.reshape(-1, 2, 3)
+
+    def assign(self, positions: np.ndarray, radii: np.ndarray, view: np.ndarray,
+               projection: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param positions: (n, 3) world positions of the lights
+        :param radii: (n,) radius of influence of each light
+        :param view: view matrix in the layout of np.array(glm.mat4)
+        :param projection: perspective projection in the layout of np.array(glm.mat4)
+        :return: (clusters, 2) first index into the light indices and light count of every cluster,
+                 and the light indices of all clusters one after another
+        """
+        x, y, z = self.grid
+        near, far = self.nearFar(projection)
+        if self.__projection is None or not np.array_equal(projection, self.__projection):
+            self.__projection = projection.copy()
+            self.__boxes = self.__clusterBoxes(projection)
+        self.depthScale = z / np.log(far / near)
+        self.depthBias = -np.log(near) * self.depthScale
+
+        centers = positions @ view[:3, :3].T + view[:3, 3]
+        # a sphere larger than the distance to the farthest corner of the frustum covers all of it
+        farCorner = far * np.sqrt(1 + 1 / projection[0, 0] ** 2 + 1 / projection[1, 1] ** 2)
+        radii = np.minimum(radii, np.linalg.norm(centers, axis=1) + farCorner)
+
+        # range of view depths, tiles and slices of the box around each sphere
+        depthMin = np.maximum(-centers[:, 2] - radii, near)
+        depthMax = np.minimum(-centers[:, 2] + radii, far)
+        lows = centers[:, :2] - radii[:, None]
+        highs = centers[:, :2] + radii[:, None]
+        # x / d over the box is smallest and largest at its nearest or farthest depth
+        scales = projection[[0, 1], [0, 1]]
+        offsets = projection[[0, 1], [2, 2]]
+        ndcLow = np.minimum(lows / depthMin[:, None], lows / depthMax[:, None]) * scales - offsets
+        ndcHigh = np.maximum(highs / depthMin[:, None], highs / depthMax[:, None]) * scales - offsets
+
+        visible = (depthMin <= depthMax) & (radii > 0) & (ndcHigh >= -1).all(axis=1) & (ndcLow <= 1).all(axis=1)
+        lights = np.nonzero(visible)[0]
+        tiles = np.array([x, y])
+        first = np.clip(np.floor((ndcLow[lights] + 1) / 2 * tiles), 0, tiles - 1).astype(np.int64)
+        last = np.clip(np.floor((ndcHigh[lights] + 1) / 2 * tiles), 0, tiles - 1).astype(np.int64)
+        slices = np.clip(np.floor(np.log(np.stack((depthMin[lights], depthMax[lights]), axis=1)) * self.depthScale
+                                  + self.depthBias), 0, z - 1).astype(np.int64)
+
+        # every (light, cluster) pair in the ranges, numbered light by light
+        extents = np.concatenate((last - first + 1, slices[:, 1:] - slices[:, :1] + 1), axis=1)
+        counts = extents.prod(axis=1)
+        pairLights = np.repeat(np.arange(len(lights)), counts)
+        local = np.arange(len(pairLights)) - np.repeat(np.cumsum(counts) - counts, counts)
+        extents = extents[pairLights]
+        columns = first[pairLights, 0] + local % extents[:, 0]
+        rows = first[pairLights, 1] + local // extents[:, 0] % extents[:, 1]
+        depths = slices[pairLights, 0] + local // (extents[:, 0] * extents[:, 1])
+        clusters = (depths * y + rows) * x + columns
+
+        # only pairs whose sphere reaches the box of the cluster are kept
+        boxes = self.__boxes[clusters]
+        pairCenters = centers[lights[pairLights]]
+        closest = np.clip(pairCenters, boxes[:, 0], boxes[:, 1])
+        keep = ((closest - pairCenters) ** 2).sum(axis=1) <= radii[lights[pairLights]] ** 2
+        clusters = clusters[keep]
+        indices = lights[pairLights[keep]]
+
+        order = np.argsort(clusters, kind='stable')
+        ranges = np.zeros((self.clusterCount, 2), dtype=np.uint32)
+        ranges[:, 1] = np.bincount(clusters, minlength=self.clusterCount)
+        ranges[1:, 0] = np.cumsum(ranges[:-1, 1])
+        return ranges, indices[order].astype(np.uint32)
+
+    def update(self, lights: List[PointLight], view: glm.mat4, projection: glm.mat4):
+        """
+        assigns lights to the clusters of the frustum of view and projection and uploads the light data,
+        the cluster ranges and the light indices, the OpenGL context must be current
+        """
+        if self.lights is None:
+            self.lights = TextureBuffer(self.glState, GL.GL_RGBA32F)
+            self.clusters = TextureBuffer(self.glState, GL.GL_RG32UI)
+            self.lightIndices = TextureBuffer(self.glState, GL.GL_R32UI)
+
+        data = np.zeros((len(lights), lightTexels, 4), dtype=np.float32)
+        if lights:
+            data[:, :, :3] = [(light.position, light.ambient, light.diffuse, light.specular, light.k)
+                              for light in lights]
+        radii = lightRadii(data[:, 1:4, :3].sum(axis=1), data[:, 4, :3], self.cutoff)
+        # shaders skip fragments farther than the radius, the largest float stands for no limit
+        data[:, 0, 3] = np.minimum(radii, np.finfo(np.float32).max)
+
+        ranges, indices = self.assign(data[:, 0, :3].astype(np.float64), radii, np.array(view, dtype=np.float64),
+                                      np.array(projection, dtype=np.float64))
+        self.lightCount = len(lights)
+        self.assignments = len(indices)
+
+        # buffers are never empty, so that the textures always have storage
+        self.lights.update(data if len(data) else np.zeros((1, lightTexels, 4), dtype=np.float32))
+        self.clusters.update(ranges)
+        self.lightIndices.update(indices if len(indices) else np.zeros(1, dtype=np.uint32))
+
+    def bind(self):
+        self.lights.bind(lightsUnit)
+        self.clusters.bind(clustersUnit)
+        self.lightIndices.bind(lightIndicesUnit)
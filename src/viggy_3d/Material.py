@@ -3,44 +3,72 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, List, Optional
 
 if TYPE_CHECKING:
+    from .GLState import GLState
+    from .Shader import Shader
     from .Texture import Texture
 
-import viggy_3d.GLTFImporter as gltf
+import glm
+import OpenGL.GL as GL
+
+from .ModelData import MaterialData
 
 
 class Material:
-    def __init__(self, material: gltf.Material, textures: List[Texture]):
+    # id given to the next material, ids are small integers that render queue keys are built from
+    nextID = 0
+
+    def __init__(self, glState: GLState, material: MaterialData, textures: List[Optional[Texture]],
+                 whiteTexture: Texture):
         """
         material has emissive, occlusion, normal, base and metallic-roughness textures
+        :param whiteTexture: bound instead of the base texture if the material has none, the shaders always
+                             multiply baseColorFactor with the base texture
         """
+        self.glState = glState
+        self.whiteTexture = whiteTexture
         self.fileData = material
 
-        if material.emissiveTextureInfo is not None:
-            self.emissiveTexture: Optional[Texture] = textures[material.emissiveTextureInfo.texture.index]
-        else:
-            self.emissiveTexture: Optional[Texture] = None
+        self.id = Material.nextID
+        Material.nextID += 1
 
-        if material.occlusionTextureInfo is not None:
-            self.occlusionTexture: Optional[Texture] = textures[material.occlusionTextureInfo.texture.index]
-        else:
-            self.occlusionTexture: Optional[Texture] = None
+        self.baseColorFactor = glm.vec4(*material.baseColorFactor)
+
+        # fragments with a lower alpha are discarded, 0 keeps every fragment
+        self.alphaCutoff = float(material.alphaCutoff) if material.alphaMode == "MASK" else 0.0
+
+        self.emissiveTexture: Optional[Texture] = self.__getTexture(material.emissiveTexture, textures)
+        self.occlusionTexture: Optional[Texture] = self.__getTexture(material.occlusionTexture, textures)
+        self.normalTexture: Optional[Texture] = self.__getTexture(material.normalTexture, textures)
+        self.baseTexture: Optional[Texture] = self.__getTexture(material.baseTexture, textures)
+        self.metallicRoughnessTexture: Optional[Texture] = \
+            self.__getTexture(material.metallicRoughnessTexture, textures)
+
+    @property
+    def isTransparent(self) -> bool:
+        """
+        True if the material is blended, it is then drawn after every opaque material
+        """
+        return self.fileData.alphaMode == "BLEND"
 
-        if material.normalTextureInfo is not None:
-            self.normalTexture: Optional[Texture] = textures[material.normalTextureInfo.texture.index]
+    def bind(self, shader: Shader):
+        """
+        binds the textures of the material and sets its uniforms and face culling, shader must be in use
+        """
+        if self.baseTexture is not None:
+            self.baseTexture.bind(0)
         else:
-            self.normalTexture: Optional[Texture] = None
-
-        if material.pbrInfo is not None:
-            if material.pbrInfo.baseColorTextureInfo is not None:
-                self.baseTexture: Optional[Texture] = textures[material.pbrInfo.baseColorTextureInfo.texture.index]
-            else:
-                self.baseTexture: Optional[Texture] = None
-
-            if material.pbrInfo.metallicRoughnessTextureInfo is not None:
-                self.metallicRoughnessTexture: Optional[Texture] = \
-                    textures[material.pbrInfo.metallicRoughnessTextureInfo.texture.index]
-            else:
-                self.metallicRoughnessTexture: Optional[Texture] = None
+            self.whiteTexture.bind(0)
+
+        if "baseColorFactor" in shader.uniforms:
+            shader.uniform("baseColorFactor").set(self.baseColorFactor)
+        if "alphaCutoff" in shader.uniforms:
+            shader.uniform("alphaCutoff").set(self.alphaCutoff)
+
+        if self.fileData.doubleSided:
+            self.glState.disable(GL.GL_CULL_FACE)
         else:
-            self.baseTexture: Optional[Texture] = None
-            self.metallicRoughnessTexture: Optional[Texture] = None
+            self.glState.enable(GL.GL_CULL_FACE)
+
+    @staticmethod
+    def __getTexture(index: Optional[int], textures: List[Optional[Texture]]) -> Optional[Texture]:
+        return textures[index] if index is not None else None
@@ -1,23 +1,161 @@
+from typing import List, Optional
+
+import numpy as np
 from OpenGL import GL
 
+from .GLState import GLState
+from .BVH import TriangleBVH
 from .IndexBuffer import IndexBuffer
+from .InstancedVertexBuffer import InstancedVertexBuffer
 from .VertexBuffer import VertexBuffer
 from .Material import Material
+from .ModelData import toFloat
+from .VertexLayout import VertexLayout
 
 
 class Mesh:
-    def __init__(self, vertices, normals, texCoord, indices, material: Material):
+    def __init__(self, glState: GLState, vertices: VertexBuffer, normals: VertexBuffer, texCoord: VertexBuffer,
+                 indices: IndexBuffer, material: Material, draws: Optional[List[List[int]]] = None,
+                 bounds: Optional[List[List[float]]] = None, lods: Optional[List[List[float]]] = None,
+                 attributes: Optional[List[List]] = None, joints: Optional[VertexBuffer] = None,
+                 weights: Optional[VertexBuffer] = None):
+        """
+        buffers may be shared with other meshes, each mesh only owns its vertex array
+        :param glState: state tracker of the context the mesh is drawn in
+        :param draws: for a batch of meshes, [index count, first index, base vertex] of each, see ModelData.batched
+        :param bounds: [min, max] corners of the box around the vertices, meshes without bounds are never culled
+        :param lods: [first index, index count, error] of each simplified level of detail in indices,
+                     see ModelData.withLods
+        :param attributes: if given, vertices, normals and texCoord are the same buffer of interleaved vertices
+                           with these [name, location, format] attributes, see ModelData.interleaved
+        :param joints: if given with weights, the mesh is skinned and drawn with shaders/skinned,
+                       joint indices must not be normalized
+        """
+        self.glState = glState
+
         self.VAO = GL.glGenVertexArrays(1)
-        GL.glBindVertexArray(self.VAO)
-        self.VBO = VertexBuffer(vertices, normals, texCoord)
-        self.IBO = IndexBuffer(indices)
+        glState.bindVertexArray(self.VAO)
+
+        # attribute locations 0, 1, 2
+        self.VBOs = (vertices, normals, texCoord)
+        self.attributes = attributes
+        if attributes is None:
+            for i, VBO in enumerate(self.VBOs):
+                VBO.setAttribute(i)
+        else:
+            vertices.bind()
+            VertexLayout.setAttributes(attributes)
+
+        # attribute locations 8, 9 after the instance attributes
+        self.skinVBOs = None if joints is None or weights is None else (joints, weights)
+        if self.skinVBOs is not None:
+            joints.setAttribute(8)
+            weights.setAttribute(9)
+
+        # element buffer binding is stored in the vertex array
+        self.IBO = indices
+        self.IBO.bind()
 
         self.material = material
 
-    def draw(self):
+        self.bounds: Optional[np.ndarray] = None if bounds is None else np.array(bounds, dtype=np.float32)
+
+        # built on first use, see triangleBVH
+        self.__triangleBVH: Optional[TriangleBVH] = None
+
+        # arguments of the multi draw call of a batch
+        self.drawCount = 0
+        if draws:
+            draws = np.array(draws, dtype=np.int64).reshape(-1, 3)
+            self.drawCount = len(draws)
+            self.counts = draws[:, 0].astype(np.int32)
+            self.offsets = (draws[:, 1] * self.IBO.buffer.itemsize).astype(np.uintp)  # in bytes
+            self.baseVertices = draws[:, 2].astype(np.int32)
+
+        # levels of detail after the full detail, level i is drawn from lodOffsets[i - 1]
+        lods = np.array(lods or [], dtype=np.float64).reshape(-1, 3)
+        self.lodOffsets = (lods[:, 0].astype(np.int64) * self.IBO.buffer.itemsize).astype(np.uintp)  # in bytes
+        self.lodCounts = lods[:, 1].astype(np.int32)
+        self.lodErrors = lods[:, 2]
+
+        # number of indices of the full detail, the levels of detail follow them in the index buffer
+        self.indexCount = int(lods[0, 0]) if len(lods) else self.IBO.buffer.size
+
+    @property
+    def isSkinned(self) -> bool:
+        return self.skinVBOs is not None
+
+    @property
+    def lodCount(self) -> int:
+        """
+        number of levels of detail including the full detail at level 0
+        """
+        return len(self.lodCounts) + 1
+
+    def lodLevel(self, pixelsPerUnit: float, maxPixelError: float = 1.0) -> int:
+        """
+        :param pixelsPerUnit: pixels on screen covered by one unit in the space of the mesh
+        :return: the coarsest level whose error covers at most maxPixelError pixels
+        """
+        return int(np.searchsorted(self.lodErrors * pixelsPerUnit, maxPixelError, side='right'))
+
+    def triangleCount(self, level: int = 0) -> int:
+        return (self.lodCounts[level - 1] if level else self.indexCount) // 3
+
+    def draw(self, level: int = 0):
+        """
+        draws mesh, user must ensure that the right shader and the material are bound, see Material.bind
+        :param level: level of detail, see lodLevel
+        """
+        self.glState.bindVertexArray(self.VAO)
+        if level:
+            GL.glDrawElements(GL.GL_TRIANGLES, int(self.lodCounts[level - 1]), self.IBO.type,
+                              GL.GLvoidp(int(self.lodOffsets[level - 1])))
+        elif self.drawCount:
+            GL.glMultiDrawElementsBaseVertex(GL.GL_TRIANGLES, self.counts, self.IBO.type, self.offsets,
+                                             self.drawCount, self.baseVertices)
+        else:
+            GL.glDrawElements(GL.GL_TRIANGLES, self.indexCount, self.IBO.type, None)
+
+    @property
+    def triangleBVH(self) -> TriangleBVH:
+        """
+        BVH over the triangles in the space of the mesh, built on first use from the arrays kept by the buffers
+        """
+        if self.__triangleBVH is None:
+            if self.attributes is None:
+                positions = toFloat(self.VBOs[0].buffer, self.VBOs[0].normalized == GL.GL_TRUE)
+            else:
+                positions = VertexLayout.decode(self.VBOs[0].buffer, self.attributes, "position")
+            indices = self.IBO.buffer.reshape(-1)[:self.indexCount].astype(np.int64)
+            if self.drawCount:
+                # indices of a batch are relative to the base vertex of their draw
+                firsts = self.offsets.astype(np.int64) // self.IBO.buffer.itemsize
+                indices = np.concatenate([indices[first: first + count] + baseVertex for count, first, baseVertex
+                                          in zip(self.counts, firsts, self.baseVertices)])
+            self.__triangleBVH = TriangleBVH(positions, indices.reshape(-1, 3))
+        return self.__triangleBVH
+
+    def setInstanceBuffer(self, instances: InstancedVertexBuffer):
+        """
+        sources the instance attributes of the vertex array from instances
+        """
+        self.glState.bindVertexArray(self.VAO)
+        instances.setAttributes()
+
+    def drawInstanced(self, count: int, level: int = 0):
         """
-        draws mesh, user must ensure that the right shader is bound
+        draws the mesh count times, the instance buffer must be set and the right shader and the material bound
         """
-        self.material.baseTexture.bind(0)
-        GL.glBindVertexArray(self.VAO)
-        GL.glDrawElements(GL.GL_TRIANGLES, self.IBO.length * 3, GL.GL_UNSIGNED_INT, None)
+        self.glState.bindVertexArray(self.VAO)
+        if level:
+            GL.glDrawElementsInstanced(GL.GL_TRIANGLES, int(self.lodCounts[level - 1]), self.IBO.type,
+                                       GL.GLvoidp(int(self.lodOffsets[level - 1])), count)
+        elif self.drawCount:
+            # there is no instanced multi draw, so each mesh of a batch is drawn on its own
+            for i in range(self.drawCount):
+                GL.glDrawElementsInstancedBaseVertex(GL.GL_TRIANGLES, int(self.counts[i]), self.IBO.type,
+                                                     GL.GLvoidp(int(self.offsets[i])), count,
+                                                     int(self.baseVertices[i]))
+        else:
+            GL.glDrawElementsInstanced(GL.GL_TRIANGLES, self.indexCount, self.IBO.type, None, count)
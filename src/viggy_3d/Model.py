@@ -1,61 +1,349 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Union
 
 if TYPE_CHECKING:
     from .Graph import Graph
+    from .UploadThread import UploadThread, PendingUpload
+    from .RenderQueue import RenderQueue
 
 import glm
+import numpy as np
 
-from .GLTFImporter import GLTFFile, Node, Mesh as gltfMesh, PrimitiveMode
+from .GLTFImporter import GLTFFile
+from .InstancedVertexBuffer import InstancedVertexBuffer, instanceLayout, instanceIndices, instanceSizes
 from .Mesh import Mesh
+from .IndexBuffer import IndexBuffer
+from .VertexBuffer import VertexBuffer
 from .Shader import Shader
 from .Texture import Texture
 from .Material import Material
+from .ModelData import ModelData, MeshData
+from .VertexLayout import VertexLayout
+
+
+# bytes of textures and buffers that a model submits to the upload thread as one task with one fence,
+# the vertex arrays of the meshes of a batch are created once its fence signals
+uploadBatchBytes = 1 << 25
 
 
 class Model:
-    def __init__(self, graph: Graph, file: GLTFFile):
+    def __init__(self, graph: Graph, file: Union[GLTFFile, ModelData], upload: bool = True, batch: bool = False,
+                 lods: bool = False, optimize: bool = False, vertexLayout: Optional[VertexLayout] = None):
+        """
+        :param file: an imported glTF file, or model data that was already decoded such as from a ModelCache
+        :param upload: if False, no OpenGL calls are made here and the caller must call uploadStep until it
+                       returns None, meshes are drawn as soon as they are uploaded.
+                       buffers and textures are then uploaded on graph.uploadThread if it exists
+        :param batch: if True, the model is static and meshes that share a material are merged into one mesh
+                      drawn with a single multi draw call, see ModelData.batched
+        :param lods: if True, simplified levels of detail are generated for every mesh, see ModelData.withLods
+        :param optimize: if True, triangles and vertices are reordered for the vertex cache and fetch,
+                         see ModelData.optimized
+        :param vertexLayout: if given, the vertices of every mesh are interleaved in one buffer encoded as it declares,
+                             see ModelData.interleaved. the model must then be drawn with a shader generated
+                             for the layout, see Graph.shaderFor
+        """
         self.graph = graph
         self.graph.addModels(self)
 
-        self.fileData = file
+        if isinstance(file, GLTFFile):
+            self.fileData: Optional[GLTFFile] = file
+            self.data = ModelData.fromGLTF(file)
+        else:
+            self.fileData: Optional[GLTFFile] = None
+            self.data = file
+
+        self.data = self.data.prepared(batch, lods, optimize, vertexLayout)
+
+        # layout that vertex shaders are generated with, None for defaultLayout. data that was interleaved
+        # before, such as by a ModelLoader, declares it through the attributes of its meshes
+        attributes = next((mesh.attributes for mesh in self.data.meshes if mesh.attributes is not None), None)
+        self.vertexLayout: Optional[VertexLayout] = None if attributes is None else VertexLayout(*attributes)
+
+        # textures and materials are created when the first mesh using them is uploaded
+        self.textures: List[Optional[Texture]] = [None] * len(self.data.textures)
+        self.materials: List[Optional[Material]] = [None] * len(self.data.materials)
+
+        # OpenGL buffers keyed by accessor index, each accessor is uploaded once
+        self.vertexBuffers: Dict[int, VertexBuffer] = dict()
+        self.indexBuffers: Dict[int, IndexBuffer] = dict()
+
+        # meshes are reused by every node that refers to the same glTF mesh, meshNodes is the node of each
         self.meshes: List[Mesh] = []
-        self.meshTransforms: List[glm.mat4x4] = []
+        self.meshNodes: List[int] = []
+
+        # for each of meshes the index into data.skins of its skin, -1 if it is not skinned, and the first
+        # of its joint matrices in the joint buffer of the frame, set by AnimationPlayer.updateSkins
+        self.meshSkins: List[int] = []
+        self.jointOffsets: List[Optional[int]] = []
+
+        # handles of the nodes of the model in graph.transforms, node is the root whose local transform is
+        # set by setTransform and nodes are the nodes of the data below it, in the order of ModelData.nodeParents.
+        # Graph.removeModels removes them with the model
+        hierarchy = graph.transforms
+        self.node = int(hierarchy.add(np.eye(4))[0])
+        if len(self.data.meshNodes) == len(self.data.meshIndices):
+            self.nodes = hierarchy.add(self.data.nodeTransforms, self.data.nodeParents, self.node)
+            self.__drawnNodes = self.nodes[np.array(self.data.meshNodes, dtype=np.int64)]
+        else:
+            # data without a node tree, each drawn mesh gets a node with its global transform
+            self.nodes = hierarchy.add(self.data.meshTransforms, None, self.node)
+            self.__drawnNodes = self.nodes
+
+        # world transform of each mesh as glm matrices and the hierarchy update they were read after
+        self.__worldTransforms: List[glm.mat4x4] = []
+        self.__worldVersion = -1
+
+        # if set, the model is drawn once for each instance, see setInstances
+        self.instances: Optional[InstancedVertexBuffer] = None
+
+        self.__uploadThread: Optional[UploadThread] = None if upload else graph.uploadThread
+        self.__pendingUpload: Optional[PendingUpload] = None
+
+        self.__uploader = self.__upload()
+        if upload:
+            while self.uploadStep() is not None:
+                pass
+
+    @property
+    def isUploaded(self) -> bool:
+        return self.__uploader is None
+
+    @property
+    def isWaiting(self) -> bool:
+        """
+        True while the next upload step is waiting for the upload thread
+        """
+        return self.__pendingUpload is not None and not self.__pendingUpload.isComplete()
+
+    def uploadStep(self) -> Optional[int]:
+        """
+        performs the next OpenGL upload, the OpenGL context must be current
+        :return: number of bytes uploaded, or None once the model is completely uploaded
+        """
+        if self.__uploader is None:
+            return None
+        try:
+            return next(self.__uploader)
+        except StopIteration:
+            self.__uploader = None
+            return None
+
+    def __upload(self) -> Iterator[int]:
+        meshIndices: Dict[int, List[int]] = dict()
+        for i, meshIndex in enumerate(self.data.meshIndices):
+            meshIndices.setdefault(meshIndex, []).append(i)
+
+        if self.__uploadThread is None:
+            for meshIndex, mesh in enumerate(self.data.meshes):
+                yield from self.__uploadResources(mesh)
+                self.__addMesh(meshIndex, meshIndices.get(meshIndex, []))
+                yield 0
+            return
 
-        # load all textures into OpenGL
-        self.textures: List[Texture] = [Texture(texture) if texture else None for texture in file.textures]
+        for batch in self.__uploadBatches():
+            # only the vertex arrays are created here, they cannot be shared between contexts
+            self.__pendingUpload = self.__uploadThread.submit(
+                lambda b=batch: sum(sum(self.__uploadResources(self.data.meshes[i])) for i in b))
+            while not self.__pendingUpload.isComplete():
+                yield 0
+            uploaded = self.__pendingUpload.future.result()
+            self.__pendingUpload = None
+            yield uploaded
+
+            for meshIndex in batch:
+                self.__addMesh(meshIndex, meshIndices.get(meshIndex, []))
+                yield 0
+
+    def __uploadBatches(self) -> Iterator[List[int]]:
+        """
+        splits the meshes in order into batches whose textures and buffers that are not in an earlier batch
+        add up to at least uploadBatchBytes, except for the last
+        """
+        counted = set()
+        batch: List[int] = []
+        size = 0
+        for meshIndex, mesh in enumerate(self.data.meshes):
+            sizes = [(("texture", i), self.data.textures[i].pixels.nbytes) for i in self.__textureIndices(mesh)] + \
+                    [(("vertex", key), self.data.vertexArrays[key].nbytes) for key in mesh.vertexKeys] + \
+                    [(("index", mesh.indices), self.data.indexArrays[mesh.indices].nbytes)]
+            for resource, nbytes in sizes:
+                if resource not in counted:
+                    counted.add(resource)
+                    size += nbytes
+
+            batch.append(meshIndex)
+            if size >= uploadBatchBytes:
+                yield batch
+                batch = []
+                size = 0
+
+        if batch:
+            yield batch
+
+    def __addMesh(self, meshIndex: int, drawn: List[int]):
+        """
+        creates the mesh of data.meshes[meshIndex] from its uploaded buffers and adds it for each of drawn,
+        the indices into data.meshIndices that draw it
+        """
+        mesh = self.data.meshes[meshIndex]
 
         # each material contains reference to loaded texture
-        self.materials: List[Material] = [Material(material, self.textures) for material in file.materials]
+        if self.materials[mesh.material] is None:
+            self.materials[mesh.material] = Material(self.graph.glState, self.data.materials[mesh.material],
+                                                     self.textures, self.graph.whiteTexture)
+
+        # the bounds of a skinned mesh are those of its bind pose, so it is never culled
+        uploaded = Mesh(self.graph.glState,
+                        self.vertexBuffers[mesh.position],
+                        self.vertexBuffers[mesh.normal],
+                        self.vertexBuffers[mesh.texCoord],
+                        self.indexBuffers[mesh.indices],
+                        self.materials[mesh.material],
+                        mesh.draws,
+                        None if mesh.isSkinned else mesh.bounds,
+                        mesh.lods,
+                        mesh.attributes,
+                        self.vertexBuffers[mesh.joints] if mesh.isSkinned else None,
+                        self.vertexBuffers[mesh.weights] if mesh.isSkinned else None)
+
+        if self.instances is not None:
+            uploaded.setInstanceBuffer(self.instances)
+
+        for i in drawn:
+            self.meshes.append(uploaded)
+            self.meshNodes.append(int(self.__drawnNodes[i]))
+            self.meshSkins.append(self.data.meshSkins[i] if self.data.meshSkins and mesh.isSkinned else -1)
+            self.jointOffsets.append(None)
+
+    def __textureIndices(self, mesh: MeshData) -> List[int]:
+        material = self.data.materials[mesh.material]
+        return [textureIndex for textureIndex in (material.baseTexture, material.metallicRoughnessTexture,
+                                                  material.normalTexture, material.occlusionTexture,
+                                                  material.emissiveTexture) if textureIndex is not None]
 
-        for rootNode in self.fileData.scene.rootNodes:
-            self.__processNode(rootNode)
+    def __uploadResources(self, mesh: MeshData) -> Iterator[int]:
+        """
+        uploads the textures and buffers of mesh that are not uploaded yet
+        """
+        for textureIndex in self.__textureIndices(mesh):
+            if self.textures[textureIndex] is None:
+                self.textures[textureIndex] = Texture(self.data.textures[textureIndex], self.graph.glState)
+                yield self.data.textures[textureIndex].pixels.nbytes
 
-        self.transform = glm.mat4()
+        for key in mesh.vertexKeys:
+            if key not in self.vertexBuffers:
+                # joint indices are read as they are
+                self.vertexBuffers[key] = VertexBuffer(self.data.vertexArrays[key],
+                                                       False if key == mesh.joints else
+                                                       self.data.vertexNormalized.get(key))
+                yield self.vertexBuffers[key].buffer.nbytes
+
+        if mesh.indices not in self.indexBuffers:
+            self.indexBuffers[mesh.indices] = IndexBuffer(self.data.indexArrays[mesh.indices])
+            yield self.indexBuffers[mesh.indices].buffer.nbytes
 
     def setTransform(self, transform: glm.mat4):
-        self.transform = transform
+        self.graph.transforms.setLocal(self.node, np.array(transform))
+
+    def setNodeTransform(self, node: int, transform: glm.mat4):
+        """
+        :param node: index of a node of the data, see ModelData.nodeParents
+        :param transform: new local transform of the node
+        """
+        self.graph.transforms.setLocal(self.nodes[node], np.array(transform))
+
+    @property
+    def transformVersion(self) -> int:
+        """
+        the update of graph.transforms that last changed a world transform of the model,
+        spatial indices refit when it changes
+        """
+        hierarchy = self.graph.transforms
+        return int(hierarchy.updated[hierarchy.rows[self.meshNodes]].max()) if self.meshNodes else 0
+
+    def worldTransforms(self) -> List[glm.mat4x4]:
+        """
+        world transform of every mesh as of the last update of graph.transforms
+        """
+        version = self.transformVersion
+        if version != self.__worldVersion or len(self.__worldTransforms) != len(self.meshNodes):
+            hierarchy = self.graph.transforms
+            self.__worldTransforms = [glm.mat4(matrix) for matrix in hierarchy.worlds[hierarchy.rows[self.meshNodes]]]
+            self.__worldVersion = version
+        return self.__worldTransforms
+
+    @property
+    def isSkinned(self) -> bool:
+        """
+        whether any mesh is deformed by the joints of a skin, such meshes are drawn with shaders/skinned
+        """
+        return any(skin >= 0 for skin in self.meshSkins)
 
-    def __processNode(self, node: Node):
-        if node.mesh:
-            self.__processMesh(node.mesh, node.globalTransform)
+    @property
+    def instanceCount(self) -> int:
+        """
+        number of times the model is drawn, 1 if it is not instanced
+        """
+        return 1 if self.instances is None else self.instances.count
 
-        if node.children:
-            for childNode in node.children:
-                self.__processNode(childNode)
+    def setInstances(self, transforms: np.ndarray, colors: Optional[np.ndarray] = None):
+        """
+        draws the model once for every transform with one instanced draw per mesh, call again to update
+        the instances, such as every frame. the model must then be drawn with an instanced shader
+        the OpenGL context must be current
+        :param transforms: (n, 4, 4) array of transforms in the layout of np.array(glm.mat4),
+                           each is applied after the model transform
+        :param colors: (n, 4) array of RGBA factors of the base color, white if not given
+        """
+        data = np.empty(len(transforms), dtype=instanceLayout)
+        # GLSL matrices are column major
+        data["model"] = np.asarray(transforms, dtype=np.float32).transpose(0, 2, 1)
+        data["color"] = 1.0 if colors is None else colors
 
-    def __processMesh(self, mesh: gltfMesh, transform: glm.mat4x4):
-        for primitive in mesh.primitives:
-            if primitive.mode is PrimitiveMode.TRIANGLES:
-                self.meshes.append(Mesh(primitive.attributes.position.data,
-                                        primitive.attributes.normal.data,
-                                        primitive.attributes.texCoord0.data,
-                                        primitive.indices.data, self.materials[primitive.material.index]))
-                self.meshTransforms.append(transform)
+        if self.instances is not None:
+            self.instances.update(data)
+            return
+
+        self.instances = InstancedVertexBuffer(data, instanceIndices, instanceSizes, (1, 1))
+        for mesh in {id(mesh): mesh for mesh in self.meshes}.values():
+            mesh.setInstanceBuffer(self.instances)
 
     def draw(self, shader: Shader):
+        """
+        draws every mesh immediately in node order, see addToQueue for sorted drawing
+        """
+        self.graph.transforms.update()
+        transforms = self.worldTransforms()
+
+        shader.use()
+        model = shader.uniform("model")
+        joints = shader.uniform("jointOffset") if "jointOffset" in shader.uniforms else None
+        for i in range(len(self.meshes)):
+            self.meshes[i].material.bind(shader)
+            model.set(transforms[i])
+            if joints is not None and self.jointOffsets[i] is not None:
+                joints.set(self.jointOffsets[i])
+            if self.instances is None:
+                self.meshes[i].draw()
+            else:
+                self.meshes[i].drawInstanced(self.instances.count)
+
+    def addToQueue(self, queue: RenderQueue, shader: Shader, skinnedShader: Optional[Shader] = None):
+        """
+        adds every uploaded mesh to queue to be drawn with shader, graph.transforms must be updated
+        and be the transforms of queue
+        :param skinnedShader: if given, skinned meshes whose joint matrices are uploaded are drawn with it,
+                              see AnimationPlayer.updateSkins. instances are drawn in the bind pose
+        """
+        if self.instances is not None and self.instances.count == 0:
+            return
+        transforms = self.worldTransforms()
         for i in range(len(self.meshes)):
-            transform = self.transform * self.meshTransforms[i]
-            shader.setUniform("model", glm.value_ptr(transform))
-            self.meshes[i].draw()
+            if self.instances is None and skinnedShader is not None and self.jointOffsets[i] is not None:
+                queue.add(skinnedShader, self.meshes[i], transforms[i], jointOffset=self.jointOffsets[i],
+                          node=self.meshNodes[i])
+            else:
+                queue.add(shader, self.meshes[i], transforms[i],
+                          None if self.instances is None else self.instances.count, node=self.meshNodes[i])
@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+import struct
+import tempfile
+
+import numpy as np
+
+import viggy_3d.GLTFImporter as gltf
+from .ModelData import ModelData, TextureData, MaterialData, MeshData, SkinData, ChannelData, AnimationData
+from .VertexLayout import VertexLayout
+
+
+# container layout, all integers little endian:
+#     magic        4 bytes  b"V3DM"
+#     headerLength 4 bytes  length of the JSON header in bytes
+#     header       JSON     array table and everything in ModelData that is not an array
+#     padding      so that the first array starts on an alignment boundary
+#     arrays       raw array bytes, each starting on an alignment boundary
+# array offsets in the header are relative to header["dataStart"]
+
+magic = b"V3DM"
+alignment = 64
+
+
+class ModelCacheError(Exception):
+    """
+    raised for a file that is not a valid cache container, such as a foreign or truncated file
+    """
+    pass
+
+
+def writeModelData(path, data: ModelData):
+    """
+    writes data to path atomically
+    """
+    arrays: Dict[str, np.ndarray] = dict()
+
+    for i, texture in enumerate(data.textures):
+        if texture is not None:
+            arrays[f"texture{i}"] = texture.pixels
+    for key, array in data.vertexArrays.items():
+        arrays[f"vertex{key}"] = array
+    for key, array in data.indexArrays.items():
+        arrays[f"index{key}"] = array
+    arrays["meshTransforms"] = data.meshTransforms
+    arrays["nodeTransforms"] = data.nodeTransforms
+    arrays["nodeTranslations"] = data.nodeTranslations
+    arrays["nodeRotations"] = data.nodeRotations
+    arrays["nodeScales"] = data.nodeScales
+    for i, skin in enumerate(data.skins):
+        arrays[f"skin{i}"] = skin.inverseBindMatrices
+    for i, animation in enumerate(data.animations):
+        for j, channel in enumerate(animation.channels):
+            arrays[f"animation{i}.{j}.times"] = channel.times
+            arrays[f"animation{i}.{j}.values"] = channel.values
+
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    header = {"textures": [None if texture is None else
+                           {"minFilter": None if texture.minFilter is None else int(texture.minFilter),
+                            "magFilter": None if texture.magFilter is None else int(texture.magFilter),
+                            "wrapS": int(texture.wrapS),
+                            "wrapT": int(texture.wrapT)}
+                           for texture in data.textures],
+              "materials": [vars(material) for material in data.materials],
+              "meshes": [vars(mesh) for mesh in data.meshes],
+              "meshIndices": data.meshIndices,
+              "nodeParents": data.nodeParents,
+              "meshNodes": data.meshNodes,
+              "skins": [skin.joints for skin in data.skins],
+              "meshSkins": data.meshSkins,
+              "animations": [{"name": animation.name,
+                              "channels": [[channel.node, channel.path, channel.interpolation]
+                                           for channel in animation.channels]}
+                             for animation in data.animations],
+              "vertexArrays": list(data.vertexArrays.keys()),
+              "vertexNormalized": [data.vertexNormalized.get(key) for key in data.vertexArrays.keys()],
+              "indexArrays": list(data.indexArrays.keys()),
+              "arrays": dict()}
+
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // alignment) * alignment
+
+    # the header length depends on dataStart, so grow it until the header fits
+    dataStart = alignment
+    while True:
+        header["dataStart"] = dataStart
+        encoded = json.dumps(header).encode('utf-8')
+        if 8 + len(encoded) <= dataStart:
+            break
+        dataStart = -(-(8 + len(encoded)) // alignment) * alignment
+
+    # every writer gets its own temporary file, loads of the same file on other threads may write the same entry
+    path = pathlib.Path(path)
+    handle, tempPath = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(magic)
+            f.write(struct.pack('<I', len(encoded)))
+            f.write(encoded)
+            f.write(b'\0' * (dataStart - 8 - len(encoded)))
+            for name, array in arrays.items():
+                if array.nbytes:
+                    f.write(memoryview(array).cast('B'))
+                f.write(b'\0' * (-array.nbytes % alignment))
+        os.replace(tempPath, path)
+    except BaseException:
+        os.remove(tempPath)
+        raise
+
+
+def readModelData(path) -> ModelData:
+    """
+    memory maps the container at path, arrays in the returned data are read only views into the map
+    :raises ModelCacheError: if path is not a valid container
+    """
+    try:
+        return _readModelData(path)
+    except (ValueError, KeyError, TypeError, struct.error) as e:
+        raise ModelCacheError(f"{path} is not a valid model cache container") from e
+
+
+def _readModelData(path) -> ModelData:
+    with open(path, 'rb') as f:
+        buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    if bytes(buffer[:4]) != magic:
+        raise ModelCacheError(f"{path} is not a valid model cache container")
+    headerLength, = struct.unpack_from('<I', buffer, 4)
+    header = json.loads(str(buffer[8: 8 + headerLength], 'utf-8'))
+
+    def getArray(name: str) -> np.ndarray:
+        info = header["arrays"][name]
+        dtype = np.dtype(info["dtype"])
+        count = int(np.prod(info["shape"], dtype=np.int64))
+        return np.frombuffer(buffer, dtype=dtype, count=count,
+                             offset=header["dataStart"] + info["offset"]).reshape(info["shape"])
+
+    data = ModelData()
+
+    for i, sampler in enumerate(header["textures"]):
+        if sampler is None:
+            data.textures.append(None)
+            continue
+        data.textures.append(TextureData(getArray(f"texture{i}"),
+                                         None if sampler["minFilter"] is None else
+                                         gltf.TextureMinFilter(sampler["minFilter"]),
+                                         None if sampler["magFilter"] is None else
+                                         gltf.TextureMagFilter(sampler["magFilter"]),
+                                         gltf.TextureWrap(sampler["wrapS"]),
+                                         gltf.TextureWrap(sampler["wrapT"])))
+
+    data.materials = [MaterialData(**material) for material in header["materials"]]
+    data.meshes = [MeshData(**mesh) for mesh in header["meshes"]]
+    data.meshIndices = header["meshIndices"]
+    data.vertexArrays = {key: getArray(f"vertex{key}") for key in header["vertexArrays"]}
+    data.vertexNormalized = {key: normalized for key, normalized in zip(header["vertexArrays"],
+                                                                        header["vertexNormalized"])
+                             if normalized is not None}
+    data.indexArrays = {key: getArray(f"index{key}") for key in header["indexArrays"]}
+    data.meshTransforms = getArray("meshTransforms")
+    data.nodeParents = header["nodeParents"]
+    data.nodeTransforms = getArray("nodeTransforms")
+    data.meshNodes = header["meshNodes"]
+    data.nodeTranslations = getArray("nodeTranslations")
+    data.nodeRotations = getArray("nodeRotations")
+    data.nodeScales = getArray("nodeScales")
+    data.skins = [SkinData(joints, getArray(f"skin{i}")) for i, joints in enumerate(header["skins"])]
+    data.meshSkins = header["meshSkins"]
+    data.animations = [AnimationData(animation["name"],
+                                     [ChannelData(node, path, interpolation, getArray(f"animation{i}.{j}.times"),
+                                                  getArray(f"animation{i}.{j}.values"))
+                                      for j, (node, path, interpolation) in enumerate(animation["channels"])])
+                       for i, animation in enumerate(header["animations"])]
+
+    return data
+
+
+class ModelCache:
+    # bump whenever the importer or the container layout changes, invalidates every entry
+    version = 9
+
+    def __init__(self, directory, maxBytes: Optional[int] = None):
+        """
+        on disk cache of decoded models keyed by file content, importer version and processing options,
+        unchanged files are recognized by path, size and modification time without hashing them again
+        :param directory: created if it does not exist
+        :param maxBytes: if given, least recently used entries are evicted after every store
+        """
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.maxBytes = maxBytes
+
+    def __files(self, path: pathlib.Path) -> List[pathlib.Path]:
+        """
+        the file and for .gltf files every external file it refers to
+        """
+        paths = [path]
+        if path.suffix.lower() == ".gltf":
+            with open(path, 'r') as f:
+                jsonData = json.load(f)
+            for item in jsonData.get("buffers", []) + jsonData.get("images", []):
+                uri = item.get("uri")
+                if uri is not None and not uri.startswith("data:"):
+                    paths.append(path.parent.joinpath(uri))
+        return paths
+
+    def __optionsDigest(self, batch: bool, lods: bool, optimize: bool, vertexLayout: Optional[VertexLayout]):
+        layoutKey = None if vertexLayout is None else vertexLayout.key
+        return hashlib.sha256(f"viggy-3d model cache {self.version} batch={batch} lods={lods} optimize={optimize} "
+                              f"vertexLayout={layoutKey}".encode('utf-8'))
+
+    def key(self, path, batch: bool = False, lods: bool = False, optimize: bool = False,
+            vertexLayout: Optional[VertexLayout] = None) -> str:
+        """
+        hash of the importer version, the options, the file and for .gltf files every external file it refers to
+        """
+        digest = self.__optionsDigest(batch, lods, optimize, vertexLayout)
+        for p in self.__files(pathlib.Path(path)):
+            with open(p, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def statKey(self, path, batch: bool = False, lods: bool = False, optimize: bool = False,
+                vertexLayout: Optional[VertexLayout] = None) -> str:
+        """
+        hash of the importer version, the options and the absolute path, size and modification time of the files
+        hashed by key, computed without reading them
+        """
+        digest = self.__optionsDigest(batch, lods, optimize, vertexLayout)
+        for p in self.__files(pathlib.Path(path)):
+            stat = p.stat()
+            digest.update(f"{p.resolve()}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def entryPath(self, path, batch: bool = False, lods: bool = False, optimize: bool = False,
+                  vertexLayout: Optional[VertexLayout] = None) -> pathlib.Path:
+        """
+        path of the entry named by key, the content is only hashed if the files changed since the last call
+        or the entry was evicted, a small .ref file named by statKey remembers the key of unchanged files
+        """
+        ref = self.directory.joinpath(self.statKey(path, batch, lods, optimize, vertexLayout) + ".ref")
+        try:
+            entry = self.directory.joinpath(ref.read_text('ascii').strip() + ".v3dm")
+            if entry.exists():
+                return entry
+        except (FileNotFoundError, UnicodeDecodeError):
+            pass
+
+        entry = self.directory.joinpath(self.key(path, batch, lods, optimize, vertexLayout) + ".v3dm")
+
+        # written atomically like the entries, other threads may look up the same file
+        handle, tempPath = tempfile.mkstemp(dir=self.directory, prefix=ref.name, suffix=".tmp")
+        try:
+            with os.fdopen(handle, 'w') as f:
+                f.write(entry.stem)
+            os.replace(tempPath, ref)
+        except BaseException:
+            os.remove(tempPath)
+            raise
+
+        return entry
+
+    def load(self, path, batch: bool = False, lods: bool = False, optimize: bool = False,
+             vertexLayout: Optional[VertexLayout] = None) -> ModelData:
+        """
+        returns the cached model data for the .glb, .gltf or .obj file at path, importing and storing it on a miss
+        :param batch: if True, the data is batched before it is stored, see ModelData.batched
+        :param lods: if True, levels of detail are generated before the data is stored, see ModelData.withLods
+        :param optimize: if True, the data is optimized before it is stored, see ModelData.optimized
+        :param vertexLayout: if given, vertices are interleaved before the data is stored, see ModelData.interleaved
+        """
+        entry = self.entryPath(path, batch, lods, optimize, vertexLayout)
+
+        if entry.exists():
+            try:
+                data = readModelData(entry)
+            except ModelCacheError:
+                # a foreign or corrupt entry is a miss, it is replaced by a new import
+                entry.unlink(missing_ok=True)
+            else:
+                # modification time is used as the last access time for eviction
+                os.utime(entry)
+                return data
+
+        data = ModelData.fromFile(path, batch, lods, optimize, vertexLayout)
+        writeModelData(entry, data)
+
+        if self.maxBytes is not None:
+            self.evict(self.maxBytes)
+
+        return data
+
+    def prewarm(self, *paths, batch: bool = False, lods: bool = False, optimize: bool = False,
+                vertexLayout: Optional[VertexLayout] = None):
+        """
+        imports and stores every file that is not cached yet, without creating any OpenGL objects
+        """
+        for path in paths:
+            entry = self.entryPath(path, batch, lods, optimize, vertexLayout)
+            if entry.exists():
+                os.utime(entry)
+            else:
+                writeModelData(entry, ModelData.fromFile(path, batch, lods, optimize, vertexLayout))
+
+        if self.maxBytes is not None:
+            self.evict(self.maxBytes)
+
+    def entries(self) -> List[pathlib.Path]:
+        """
+        :return: cache entries, least recently used first
+        """
+        return sorted(self.directory.glob("*.v3dm"), key=lambda p: p.stat().st_mtime)
+
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in self.entries())
+
+    def evict(self, maxBytes: int = 0):
+        """
+        removes least recently used entries until the cache is at most maxBytes large
+        """
+        entries = self.entries()
+        total = sum(entry.stat().st_size for entry in entries)
+
+        for entry in entries:
+            if total <= maxBytes:
+                break
+            size = entry.stat().st_size
+            try:
+                entry.unlink()
+            except OSError:
+                continue  # still mapped on platforms that lock mapped files
+            total -= size
+
+        # references to removed entries are looked up again by content
+        for ref in self.directory.glob("*.ref"):
+            try:
+                if not self.directory.joinpath(ref.read_text('ascii').strip() + ".v3dm").exists():
+                    ref.unlink()
+            except (OSError, UnicodeDecodeError):
+                continue  # removed by another thread
@@ -0,0 +1,744 @@
+from __future__ import annotations
+
+import logging
+import pathlib
+import time
+from typing import Dict, List, Optional, Tuple
+
+import glm
+import numpy as np
+
+import viggy_3d.GLTFImporter as gltf
+from . import decoding
+from .simplification import simplify
+from . import optimization
+from .VertexLayout import VertexLayout
+from .WavefrontImporter import loadIndexedObject
+
+
+logger = logging.getLogger(__name__)
+
+
+class TextureData:
+    def __init__(self, pixels: np.ndarray,
+                 minFilter: Optional[gltf.TextureMinFilter] = None,
+                 magFilter: Optional[gltf.TextureMagFilter] = None,
+                 wrapS: gltf.TextureWrap = gltf.TextureWrap.REPEAT,
+                 wrapT: gltf.TextureWrap = gltf.TextureWrap.REPEAT):
+        """
+        decoded texture image and its sampler settings, no OpenGL calls are made
+        :param pixels: (height, width, 4) array of RGBA bytes, or (height, width, 3) of RGB bytes for opaque images
+        """
+        self.pixels = pixels
+        self.minFilter = minFilter
+        self.magFilter = magFilter
+        self.wrapS = wrapS
+        self.wrapT = wrapT
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    @property
+    def isMipmapped(self) -> bool:
+        return self.minFilter in (gltf.TextureMinFilter.NEAREST_MIPMAP_NEAREST,
+                                  gltf.TextureMinFilter.LINEAR_MIPMAP_NEAREST,
+                                  gltf.TextureMinFilter.NEAREST_MIPMAP_LINEAR,
+                                  gltf.TextureMinFilter.LINEAR_MIPMAP_LINEAR)
+
+    @staticmethod
+    def fromGLTF(texture: gltf.Texture, pixels: Optional[np.ndarray] = None) -> TextureData:
+        """
+        :param pixels: the already decoded image of texture, decoded here if not given
+        """
+        if pixels is None:
+            pixels = decoding.decodeImage(texture.image.path, "RGBA")
+
+        if texture.sampler is None:
+            return TextureData(pixels)
+
+        return TextureData(pixels, texture.sampler.minFilter, texture.sampler.magFilter,
+                           texture.sampler.wrapS, texture.sampler.wrapT)
+
+
+class MaterialData:
+    def __init__(self, baseTexture: Optional[int] = None, metallicRoughnessTexture: Optional[int] = None,
+                 normalTexture: Optional[int] = None, occlusionTexture: Optional[int] = None,
+                 emissiveTexture: Optional[int] = None, baseColorFactor: Tuple[float, ...] = (1, 1, 1, 1),
+                 alphaMode: str = "OPAQUE", alphaCutoff: float = 0.5, doubleSided: bool = False):
+        """
+        textures are given as indices into ModelData.textures
+        """
+        self.baseTexture = baseTexture
+        self.metallicRoughnessTexture = metallicRoughnessTexture
+        self.normalTexture = normalTexture
+        self.occlusionTexture = occlusionTexture
+        self.emissiveTexture = emissiveTexture
+        self.baseColorFactor = tuple(baseColorFactor)
+        self.alphaMode = alphaMode
+        self.alphaCutoff = alphaCutoff
+        self.doubleSided = doubleSided
+
+    @staticmethod
+    def fromGLTF(material: gltf.Material) -> MaterialData:
+        def textureIndex(info: Optional[gltf.TextureInfo]) -> Optional[int]:
+            return info.texture.index if info is not None else None
+
+        data = MaterialData(normalTexture=textureIndex(material.normalTextureInfo),
+                            occlusionTexture=textureIndex(material.occlusionTextureInfo),
+                            emissiveTexture=textureIndex(material.emissiveTextureInfo),
+                            alphaMode=material.alphaMode,
+                            alphaCutoff=material.alphaCutoff,
+                            doubleSided=material.doubleSided)
+
+        if material.pbrInfo is not None:
+            data.baseTexture = textureIndex(material.pbrInfo.baseColorTextureInfo)
+            data.metallicRoughnessTexture = textureIndex(material.pbrInfo.metallicRoughnessTextureInfo)
+            data.baseColorFactor = tuple(material.pbrInfo.baseColorFactor)
+
+        return data
+
+
+def toFloat(array: np.ndarray, normalized: Optional[bool]) -> np.ndarray:
+    """
+    :return: float32 values of a vertex attribute as OpenGL reads them, see VertexBuffer
+    """
+    if array.dtype == np.float32:
+        return array
+    start = time.perf_counter()
+    if normalized is False:
+        values = array.astype(np.float32)
+    else:
+        info = np.iinfo(array.dtype)
+        # signed normalized values use a symmetric range and clamp the lowest value to -1
+        values = np.maximum(array / np.float32(info.max), -1).astype(np.float32)
+    gltf.decodeStats.add(values.nbytes, time.perf_counter() - start)
+    return values
+
+
+def positionBounds(accessor: gltf.Accessor) -> Optional[List[List[float]]]:
+    """
+    :return: [min, max] corners of the box around the positions in accessor, from its min and max if it has them
+    """
+    if accessor.min is not None and accessor.max is not None:
+        bounds = np.array([accessor.min[:3], accessor.max[:3]]).astype(accessor.data.dtype)
+    elif len(accessor.data):
+        bounds = np.stack((accessor.data.min(axis=0), accessor.data.max(axis=0)))
+    else:
+        return None
+    return toFloat(bounds, accessor.normalized).tolist()
+
+
+class SkinData:
+    def __init__(self, joints: List[int], inverseBindMatrices: np.ndarray):
+        """
+        :param joints: index into ModelData.nodeParents of each joint node
+        :param inverseBindMatrices: (joints, 4, 4) matrices in the layout of np.array(glm.mat4) that move vertices
+                                    from the space of the mesh into the space of each joint
+        """
+        self.joints = joints
+        self.inverseBindMatrices = inverseBindMatrices
+
+    @staticmethod
+    def fromGLTF(skin: gltf.Skin, nodeIndices: Dict[int, int]) -> SkinData:
+        """
+        :param nodeIndices: index into ModelData.nodeParents of each glTF node index
+        """
+        if skin.inverseBindMatrices is None:
+            inverseBindMatrices = np.tile(np.eye(4, dtype=np.float32), (len(skin.joints), 1, 1))
+        else:
+            # accessors hold column major matrices
+            inverseBindMatrices = skin.inverseBindMatrices.data.reshape(-1, 4, 4).transpose(0, 2, 1)
+        return SkinData([nodeIndices[joint] for joint in skin.joints],
+                        np.ascontiguousarray(inverseBindMatrices, dtype=np.float32))
+
+
+class ChannelData:
+    def __init__(self, node: int, path: str, interpolation: str, times: np.ndarray, values: np.ndarray):
+        """
+        keyframes of one animated property of a node
+        :param node: index into ModelData.nodeParents
+        :param path: translation, rotation or scale
+        :param interpolation: LINEAR, STEP or CUBICSPLINE
+        :param times: (keys,) increasing times in seconds
+        :param values: (keys, 3) or (keys, 4) float32 values, rotations as (x, y, z, w) quaternions.
+                       for CUBICSPLINE (keys, 3, k) in tangent, value and out tangent of every key
+        """
+        self.node = node
+        self.path = path
+        self.interpolation = interpolation
+        self.times = times
+        self.values = values
+
+
+class AnimationData:
+    def __init__(self, name: Optional[str], channels: List[ChannelData]):
+        self.name = name
+        self.channels = channels
+
+    @property
+    def duration(self) -> float:
+        return max((float(channel.times[-1]) for channel in self.channels if len(channel.times)), default=0.0)
+
+    @staticmethod
+    def fromGLTF(animation: gltf.Animation, nodeIndices: Dict[int, int]) -> AnimationData:
+        """
+        channels that target morph target weights or nodes outside the scene are skipped
+        """
+        channels = []
+        for channel in animation.channels:
+            if channel.path not in ("translation", "rotation", "scale") or channel.node not in nodeIndices:
+                continue
+            sampler = channel.sampler
+            size = 4 if channel.path == "rotation" else 3
+            values = toFloat(sampler.output.data, sampler.output.normalized).reshape(-1, size)
+            if sampler.interpolation is gltf.Interpolation.CUBICSPLINE:
+                values = values.reshape(-1, 3, size)
+            channels.append(ChannelData(nodeIndices[channel.node], channel.path, sampler.interpolation.value,
+                                        np.ascontiguousarray(sampler.input.data.reshape(-1), dtype=np.float32),
+                                        np.ascontiguousarray(values, dtype=np.float32)))
+        return AnimationData(animation.getFromJSONDict("name"), channels)
+
+
+class MeshData:
+    def __init__(self, position: int, normal: int, texCoord: int, indices: int, material: int,
+                 draws: Optional[List[List[int]]] = None, bounds: Optional[List[List[float]]] = None,
+                 lods: Optional[List[List[float]]] = None, acmr: Optional[List[float]] = None,
+                 attributes: Optional[List[List]] = None, joints: Optional[int] = None,
+                 weights: Optional[int] = None):
+        """
+        a single drawable primitive, attributes are keys into ModelData.vertexArrays,
+        indices is a key into ModelData.indexArrays and material an index into ModelData.materials
+        :param draws: if given, the mesh is a batch drawn with one multi draw call,
+                      each draw is [index count, first index, base vertex]
+        :param bounds: [min, max] corners of the box around the positions, in the space of the mesh
+        :param lods: simplified levels of detail stored after the indices of the mesh in the same index array,
+                     each is [first index, index count, error], see ModelData.withLods
+        :param acmr: average cache miss ratio of the full detail [before, after] ModelData.optimized
+        :param attributes: if given, position, normal and texCoord are the same array of interleaved vertices
+                           with these [name, location, format] attributes, see ModelData.interleaved
+        :param joints: if given with weights, the mesh is skinned and these are the keys of its (n, 4) joint
+                       indices into the joints of its skin and their (n, 4) weights
+        """
+        self.position = position
+        self.normal = normal
+        self.texCoord = texCoord
+        self.indices = indices
+        self.material = material
+        self.draws = draws
+        self.bounds = bounds
+        self.lods = lods
+        self.acmr = acmr
+        self.attributes = attributes
+        self.joints = joints
+        self.weights = weights
+
+    @property
+    def isSkinned(self) -> bool:
+        return self.joints is not None and self.weights is not None
+
+    @property
+    def vertexKeys(self) -> Tuple[int, ...]:
+        """
+        keys of every vertex array of the mesh
+        """
+        keys = (self.position, self.normal, self.texCoord)
+        return keys + (self.joints, self.weights) if self.isSkinned else keys
+
+
+class ModelData:
+    def __init__(self):
+        """
+        everything a Model uploads to OpenGL, decoded and flattened out of the node tree
+        """
+        self.textures: List[Optional[TextureData]] = []
+        self.materials: List[MaterialData] = []
+
+        # vertex attribute and index arrays keyed by accessor index
+        self.vertexArrays: Dict[int, np.ndarray] = dict()
+        self.indexArrays: Dict[int, np.ndarray] = dict()
+
+        # whether integer vertex arrays are normalized, quantized attributes need not be
+        self.vertexNormalized: Dict[int, bool] = dict()
+
+        # unique primitives, shared by every node that refers to the same glTF mesh
+        self.meshes: List[MeshData] = []
+
+        # for every drawn mesh, the index into meshes and its (4, 4) global transform
+        self.meshIndices: List[int] = []
+        self.meshTransforms: np.ndarray = np.zeros((0, 4, 4), dtype=np.float32)
+
+        # node tree of the scene, parents come before their children. for every node the index of its parent,
+        # -1 for roots, and its (4, 4) local transform. for every drawn mesh the index of its node
+        self.nodeParents: List[int] = []
+        self.nodeTransforms: np.ndarray = np.zeros((0, 4, 4), dtype=np.float32)
+        self.meshNodes: List[int] = []
+
+        # local transform of every node as a translation, an (x, y, z, w) rotation and a scale, animations
+        # replace the properties they target. identity for nodes whose transform is given as a matrix
+        self.nodeTranslations: np.ndarray = np.zeros((0, 3), dtype=np.float32)
+        self.nodeRotations: np.ndarray = np.zeros((0, 4), dtype=np.float32)
+        self.nodeScales: np.ndarray = np.zeros((0, 3), dtype=np.float32)
+
+        # joints of skinned meshes and for every drawn mesh the index into skins of its skin, -1 if it has none
+        self.skins: List[SkinData] = []
+        self.meshSkins: List[int] = []
+
+        # keyframe animations of the nodes, see AnimationPlayer
+        self.animations: List[AnimationData] = []
+
+    def copyNodes(self, data: ModelData):
+        """
+        shares the node tree, skins and animations of data
+        """
+        self.meshIndices = data.meshIndices
+        self.meshTransforms = data.meshTransforms
+        self.nodeParents = data.nodeParents
+        self.nodeTransforms = data.nodeTransforms
+        self.meshNodes = data.meshNodes
+        self.nodeTranslations = data.nodeTranslations
+        self.nodeRotations = data.nodeRotations
+        self.nodeScales = data.nodeScales
+        self.skins = data.skins
+        self.meshSkins = data.meshSkins
+        self.animations = data.animations
+
+    @property
+    def acmr(self) -> Optional[List[float]]:
+        """
+        average cache miss ratio [before, after] optimized of the full detail of all meshes, weighted by their
+        triangle counts, None if no mesh was optimized
+        """
+        meshes = [mesh for mesh in self.meshes if mesh.acmr is not None]
+        if not meshes:
+            return None
+        counts = np.array([sum(count for count, _, _ in mesh.draws) if mesh.draws else
+                           mesh.lods[0][0] if mesh.lods else self.indexArrays[mesh.indices].size
+                           for mesh in meshes], dtype=np.float64)
+        ratios = np.array([mesh.acmr for mesh in meshes], dtype=np.float64)
+        return (counts @ ratios / max(counts.sum(), 1)).tolist()
+
+    @staticmethod
+    def fromGLTF(file: gltf.GLTFFile) -> ModelData:
+        data = ModelData()
+
+        # each image is decoded once on the decoding pool, even if several textures share it
+        textures = [texture for texture in file.textures or [] if texture]
+        images = list({texture.image.index: texture.image for texture in textures}.values())
+        pixels = dict(zip((image.index for image in images),
+                          decoding.decodeImages((image.path for image in images), "RGBA")))
+        data.textures = [TextureData.fromGLTF(texture, pixels[texture.image.index]) if texture else None
+                         for texture in file.textures or []]
+        data.materials = [MaterialData.fromGLTF(material) for material in file.materials or []]
+
+        transforms: List[glm.mat4x4] = []
+        localTransforms: List[glm.mat4x4] = []
+        nodeTRS: List[Tuple[List[float], List[float], List[float]]] = []
+        meshCache: Dict[int, List[int]] = dict()
+
+        # index into data.nodeParents of each glTF node in the scene, and the glTF skin of each drawn mesh
+        nodeIndices: Dict[int, int] = dict()
+        meshSkins: List[Optional[gltf.Skin]] = []
+
+        def processMesh(mesh: gltf.Mesh) -> List[int]:
+            if mesh.index not in meshCache:
+                meshCache[mesh.index] = []
+                for primitive in mesh.primitives:
+                    if primitive.mode is not gltf.PrimitiveMode.TRIANGLES:
+                        continue
+
+                    attributes = primitive.attributes
+                    accessors = [attributes.position, attributes.normal, attributes.texCoord0]
+                    isSkinned = attributes.joints0 is not None and attributes.weights0 is not None
+                    if isSkinned:
+                        accessors += [attributes.joints0, attributes.weights0]
+                    for accessor in accessors:
+                        data.vertexArrays[accessor.index] = accessor.data
+                        data.vertexNormalized[accessor.index] = accessor.normalized
+                    data.indexArrays[primitive.indices.index] = primitive.indices.data
+
+                    meshCache[mesh.index].append(len(data.meshes))
+                    data.meshes.append(MeshData(attributes.position.index, attributes.normal.index,
+                                                attributes.texCoord0.index, primitive.indices.index,
+                                                primitive.material.index,
+                                                bounds=positionBounds(attributes.position),
+                                                joints=attributes.joints0.index if isSkinned else None,
+                                                weights=attributes.weights0.index if isSkinned else None))
+            return meshCache[mesh.index]
+
+        def processNode(node: gltf.Node, parent: int):
+            nodeIndex = len(data.nodeParents)
+            nodeIndices[node.index] = nodeIndex
+            data.nodeParents.append(parent)
+            localTransforms.append(node.localTransform)
+            if node.matrix is None:
+                nodeTRS.append((node.translation, node.rotation, node.scale))
+            else:
+                nodeTRS.append(([0, 0, 0], [0, 0, 0, 1], [1, 1, 1]))
+
+            if node.mesh:
+                for i in processMesh(node.mesh):
+                    data.meshIndices.append(i)
+                    data.meshNodes.append(nodeIndex)
+                    meshSkins.append(node.skin if data.meshes[i].isSkinned else None)
+                    transforms.append(node.globalTransform)
+
+            if node.children:
+                for childNode in node.children:
+                    processNode(childNode, nodeIndex)
+
+        for rootNode in file.scene.rootNodes:
+            processNode(rootNode, -1)
+
+        if transforms:
+            data.meshTransforms = np.array([np.array(transform) for transform in transforms], dtype=np.float32)
+        if localTransforms:
+            data.nodeTransforms = np.array([np.array(transform) for transform in localTransforms],
+                                           dtype=np.float32)
+            data.nodeTranslations, data.nodeRotations, data.nodeScales = (
+                np.array(values, dtype=np.float32) for values in zip(*nodeTRS))
+
+        # only skins used by a drawn mesh are kept, meshes whose node has no skin are drawn unskinned
+        skinIndices: Dict[int, int] = dict()
+        for skin in meshSkins:
+            if skin is not None and skin.index not in skinIndices:
+                skinIndices[skin.index] = len(data.skins)
+                data.skins.append(SkinData.fromGLTF(skin, nodeIndices))
+        data.meshSkins = [-1 if skin is None else skinIndices[skin.index] for skin in meshSkins]
+
+        data.animations = [AnimationData.fromGLTF(animation, nodeIndices) for animation in file.animations or []
+                           if animation]
+
+        return data
+
+    @staticmethod
+    def fromOBJ(path) -> ModelData:
+        """
+        imports a .obj file as a single mesh with the default material drawn by a single root node
+        UVs missing from the file are 0 and missing normals are the area weighted normals of the faces around
+        each vertex
+        """
+        positions, uvs, normals, indices = loadIndexedObject(path)
+        triangles = indices.reshape(-1, 3)
+
+        if uvs is None:
+            uvs = np.zeros((len(positions), 2), dtype=np.float32)
+        if normals is None:
+            corners = positions[triangles]
+            faceNormals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+            normals = np.zeros_like(positions)
+            for column in range(3):
+                np.add.at(normals, triangles[:, column], faceNormals)
+            lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+            normals = (normals / np.where(lengths > 0, lengths, 1)).astype(np.float32)
+
+        data = ModelData()
+        data.materials = [MaterialData()]
+        data.vertexArrays = {0: positions, 1: normals, 2: uvs}
+        data.indexArrays = {0: indices}
+        bounds = [positions.min(axis=0).tolist(), positions.max(axis=0).tolist()] if len(positions) else None
+        data.meshes = [MeshData(0, 1, 2, 0, 0, bounds=bounds)]
+
+        data.meshIndices = [0]
+        data.meshTransforms = np.eye(4, dtype=np.float32)[None]
+        data.nodeParents = [-1]
+        data.nodeTransforms = np.eye(4, dtype=np.float32)[None]
+        data.meshNodes = [0]
+        data.nodeTranslations = np.zeros((1, 3), dtype=np.float32)
+        data.nodeRotations = np.array([[0, 0, 0, 1]], dtype=np.float32)
+        data.nodeScales = np.ones((1, 3), dtype=np.float32)
+        data.meshSkins = [-1]
+
+        return data
+
+    @staticmethod
+    def fromFile(path, batch: bool = False, lods: bool = False, optimize: bool = False,
+                 vertexLayout: Optional[VertexLayout] = None) -> ModelData:
+        """
+        imports the .glb, .gltf or .obj file at path and prepares it with the given options, see prepared
+        """
+        suffix = pathlib.Path(path).suffix.lower()
+        if suffix == ".obj":
+            return ModelData.fromOBJ(path).prepared(batch, lods, optimize, vertexLayout)
+        file = gltf.GLTFFile(path, suffix == ".glb")
+        return ModelData.fromGLTF(file).prepared(batch, lods, optimize, vertexLayout)
+
+    def prepared(self, batch: bool = False, lods: bool = False, optimize: bool = False,
+                 vertexLayout: Optional[VertexLayout] = None) -> ModelData:
+        """
+        the processing shared by Model, ModelLoader and ModelCache, applied in this order
+        :param batch: if True, meshes are merged by material, see batched
+        :param lods: if True, levels of detail are generated, see withLods
+        :param optimize: if True, meshes are reordered for the vertex cache and fetch, see optimized
+        :param vertexLayout: if given, vertices are interleaved as it declares, see interleaved
+        :return: new model data, or this data if no option is set
+        """
+        data = self
+        if batch:
+            data = data.batched()
+        if lods:
+            data = data.withLods()
+        if optimize:
+            data = data.optimized()
+        if vertexLayout is not None:
+            data = data.interleaved(vertexLayout)
+        return data
+
+    def batched(self) -> ModelData:
+        """
+        merges every drawn mesh that uses a material into one mesh per material for static geometry
+        mesh transforms are baked into float32 positions and normals, a mesh drawn by several nodes is copied
+        for each of them, meshes hidden by a zero scale are left out. indices keep the widest type of the merged meshes and are offset with base vertices
+        skinned meshes are merged in their bind pose
+        :return: new model data with one mesh per used material and identity transforms, without skins or animations
+        """
+        data = ModelData()
+        data.textures = self.textures
+        data.materials = self.materials
+
+        # drawn meshes grouped by material, in order of first use
+        # meshes with a singular transform such as a zero scale are invisible and have no normal matrix
+        groups: Dict[int, List[int]] = dict()
+        for i, meshIndex in enumerate(self.meshIndices):
+            if np.linalg.det(self.meshTransforms[i][:3, :3].astype(np.float64)) == 0:
+                continue
+            groups.setdefault(self.meshes[meshIndex].material, []).append(i)
+
+        for material, drawn in groups.items():
+            positions, normals, texCoords, indices = [], [], [], []
+            draws = []
+            vertexCount = 0
+            indexCount = 0
+
+            for i in drawn:
+                mesh = self.meshes[self.meshIndices[i]]
+                transform = self.meshTransforms[i].astype(np.float64)
+                # normals are transformed by the inverse transpose of the upper 3x3 matrix
+                normalMatrix = np.linalg.inv(transform[:3, :3]).T
+
+                position = toFloat(self.vertexArrays[mesh.position], self.vertexNormalized.get(mesh.position))
+                positions.append(position @ transform[:3, :3].T + transform[:3, 3])
+
+                normal = toFloat(self.vertexArrays[mesh.normal], self.vertexNormalized.get(mesh.normal)) \
+                    @ normalMatrix.T
+                lengths = np.linalg.norm(normal, axis=1, keepdims=True)
+                normals.append(normal / np.where(lengths > 0, lengths, 1))
+
+                texCoords.append(toFloat(self.vertexArrays[mesh.texCoord], self.vertexNormalized.get(mesh.texCoord)))
+
+                index = self.indexArrays[mesh.indices].reshape(-1)
+                indices.append(index)
+                draws.append([len(index), indexCount, vertexCount])
+                vertexCount += len(position)
+                indexCount += len(index)
+
+            key = len(data.meshes)
+            data.vertexArrays[3 * key] = np.concatenate(positions).astype(np.float32)
+            bounds = None
+            if len(data.vertexArrays[3 * key]):
+                bounds = [data.vertexArrays[3 * key].min(axis=0).tolist(),
+                          data.vertexArrays[3 * key].max(axis=0).tolist()]
+            data.vertexArrays[3 * key + 1] = np.concatenate(normals).astype(np.float32)
+            data.vertexArrays[3 * key + 2] = np.concatenate(texCoords).astype(np.float32)
+            data.indexArrays[key] = np.concatenate(indices).astype(np.result_type(*indices))
+
+            data.meshes.append(MeshData(3 * key, 3 * key + 1, 3 * key + 2, key, material, draws, bounds))
+
+        data.meshIndices = list(range(len(data.meshes)))
+        data.meshTransforms = np.tile(np.eye(4, dtype=np.float32), (len(data.meshes), 1, 1))
+        # every batch is drawn by a single node
+        data.nodeParents = [-1]
+        data.nodeTransforms = np.eye(4, dtype=np.float32)[None]
+        data.meshNodes = [0] * len(data.meshes)
+        data.nodeTranslations = np.zeros((1, 3), dtype=np.float32)
+        data.nodeRotations = np.array([[0, 0, 0, 1]], dtype=np.float32)
+        data.nodeScales = np.ones((1, 3), dtype=np.float32)
+        data.meshSkins = [-1] * len(data.meshes)
+
+        return data
+
+    def withLods(self, levels: int = 4, ratio: float = 0.5, minTriangles: int = 64) -> ModelData:
+        """
+        adds simplified levels of detail to every mesh, see simplification.simplify.
+        the levels reuse the vertex arrays and are appended to a copy of the index array of the mesh,
+        indices of a batch are made absolute so that each level is a single draw
+        :param levels: largest number of levels after the full detail
+        :param ratio: triangle count of each level relative to the one before
+        :param minTriangles: no level has fewer triangles, smaller meshes get no levels
+        :return: new model data that shares every array except the index arrays of simplified meshes
+        """
+        data = ModelData()
+        data.textures = self.textures
+        data.materials = self.materials
+        data.vertexArrays = self.vertexArrays
+        data.vertexNormalized = self.vertexNormalized
+        data.indexArrays = dict(self.indexArrays)
+        data.copyNodes(self)
+
+        nextKey = max(self.indexArrays.keys(), default=-1) + 1
+        for mesh in self.meshes:
+            indices = self.indexArrays[mesh.indices].reshape(-1)
+            full = indices
+            if mesh.draws:
+                full = np.concatenate([indices[first: first + count].astype(np.int64) + baseVertex
+                                       for count, first, baseVertex in mesh.draws])
+
+            triangleCount = len(full) // 3
+            targets = [int(triangleCount * ratio ** level) for level in range(1, levels + 1)]
+            targets = [target for target in targets if target >= minTriangles]
+            position = toFloat(self.vertexArrays[mesh.position], self.vertexNormalized.get(mesh.position))
+            simplified = simplify(position, full, targets) if targets else []
+
+            # a level is only kept if it draws noticeably fewer triangles than the one before
+            lods = []
+            lodIndices = []
+            first = len(indices)
+            count = len(full)
+            for levelIndices, error in simplified:
+                if len(levelIndices) > 0.8 * count:
+                    continue
+                count = len(levelIndices)
+                lods.append([first, count, error])
+                lodIndices.append(levelIndices)
+                first += count
+
+            if not lods:
+                data.meshes.append(mesh)
+                continue
+
+            dtype = np.result_type(indices.dtype, np.min_scalar_type(max(int(level.max()) for level in lodIndices)))
+            data.indexArrays[nextKey] = np.concatenate([indices] + lodIndices).astype(dtype)
+            data.meshes.append(MeshData(mesh.position, mesh.normal, mesh.texCoord, nextKey, mesh.material,
+                                        mesh.draws, mesh.bounds, lods, joints=mesh.joints, weights=mesh.weights))
+            nextKey += 1
+
+        # index arrays that only simplified meshes used were copied
+        used = {mesh.indices for mesh in data.meshes}
+        data.indexArrays = {key: array for key, array in data.indexArrays.items() if key in used}
+
+        return data
+
+    def optimized(self) -> ModelData:
+        """
+        reorders the triangles of every mesh for the post transform cache and against overdraw,
+        see optimization.optimizeVertexCache, each draw of a batch and each level of detail on its own.
+        vertices, with the joints and weights of skinned meshes, are then reordered by first use for fetch locality
+        if no other mesh uses the vertex arrays,
+        and indices are narrowed to 16 bits where they fit. the ACMR of every mesh is kept in MeshData.acmr,
+        that of the model is logged and kept in acmr
+        :return: new model data that shares the arrays of meshes whose vertices are not reordered
+        """
+        data = ModelData()
+        data.textures = self.textures
+        data.materials = self.materials
+        data.vertexArrays = dict(self.vertexArrays)
+        data.vertexNormalized = dict(self.vertexNormalized)
+        data.copyNodes(self)
+
+        users: Dict[int, int] = dict()
+        for mesh in self.meshes:
+            for key in set(mesh.vertexKeys):
+                users[key] = users.get(key, 0) + 1
+
+        nextVertexKey = max(self.vertexArrays.keys(), default=-1) + 1
+        for mesh in self.meshes:
+            indices = self.indexArrays[mesh.indices].reshape(-1).astype(np.int64)
+            position = toFloat(self.vertexArrays[mesh.position], self.vertexNormalized.get(mesh.position))
+            vertexCount = len(position)
+
+            # ranges of indices that are drawn on their own as [first index, index count, base vertex]
+            draws = mesh.draws or [[len(indices) if not mesh.lods else mesh.lods[0][0], 0, 0]]
+            ranges = [[first, count, baseVertex] for count, first, baseVertex in draws]
+            ranges += [[int(first), int(count), 0] for first, count, _ in mesh.lods or []]
+
+            def fullDetail(array: np.ndarray) -> np.ndarray:
+                return np.concatenate([array[first: first + count] + baseVertex for count, first, baseVertex in draws])
+
+            before = optimization.acmr(fullDetail(indices))
+            for first, count, baseVertex in ranges:
+                indices[first: first + count] = optimization.optimizeVertexCache(
+                    position[baseVertex:], indices[first: first + count])
+
+            vertexKeys = mesh.vertexKeys
+            if all(users[key] == 1 for key in vertexKeys) and len(set(vertexKeys)) == len(vertexKeys):
+                # each draw of a batch keeps its vertices between its base vertex and the next one
+                full = fullDetail(indices)
+                starts = sorted({baseVertex for _, _, baseVertex in draws} | {0})
+                ends = starts[1:] + [vertexCount]
+                order = np.concatenate([start + optimization.vertexFetchOrder(
+                    full[(full >= start) & (full < end)] - start, end - start) for start, end in zip(starts, ends)])
+                remap = np.empty(vertexCount, dtype=np.int64)
+                remap[order] = np.arange(vertexCount)
+
+                for first, count, baseVertex in ranges:
+                    indices[first: first + count] = remap[indices[first: first + count] + baseVertex] - baseVertex
+
+                keys = []
+                for key in vertexKeys:
+                    data.vertexArrays[nextVertexKey] = np.ascontiguousarray(self.vertexArrays[key][order])
+                    if key in self.vertexNormalized:
+                        data.vertexNormalized[nextVertexKey] = self.vertexNormalized[key]
+                    del data.vertexArrays[key]
+                    data.vertexNormalized.pop(key, None)
+                    keys.append(nextVertexKey)
+                    nextVertexKey += 1
+            else:
+                keys = list(vertexKeys)
+
+            data.indexArrays[len(data.meshes)] = optimization.narrowIndices(
+                indices.astype(self.indexArrays[mesh.indices].dtype))
+            data.meshes.append(MeshData(*keys[:3], len(data.meshes), mesh.material, mesh.draws, mesh.bounds,
+                                        mesh.lods, [before, optimization.acmr(fullDetail(indices))],
+                                        joints=keys[3] if mesh.isSkinned else None,
+                                        weights=keys[4] if mesh.isSkinned else None))
+
+        if data.meshes:
+            before, after = data.acmr
+            logger.info("optimized %d meshes, ACMR %.3f before and %.3f after", len(data.meshes), before, after)
+        return data
+
+    def interleaved(self, layout: VertexLayout) -> ModelData:
+        """
+        packs the position, normal and texture coordinates of every mesh into one array of interleaved vertices
+        encoded as layout declares, attributes whose values do not fit a lossy format within the tolerance of
+        layout use its fallback. meshes that share all of their vertex arrays share the interleaved array.
+        joints and weights of skinned meshes stay separate arrays
+        :return: new model data, vertex arrays that no mesh uses any more are dropped
+        """
+        data = ModelData()
+        data.textures = self.textures
+        data.materials = self.materials
+        data.indexArrays = self.indexArrays
+        data.copyNodes(self)
+
+        interleavedKeys: Dict[Tuple[int, int, int], Tuple[int, List[List]]] = dict()
+        nextKey = max(self.vertexArrays.keys(), default=-1) + 1
+        for mesh in self.meshes:
+            vertexKeys = (mesh.position, mesh.normal, mesh.texCoord)
+            if vertexKeys not in interleavedKeys:
+                if mesh.attributes is None:
+                    values = {name: toFloat(self.vertexArrays[key], self.vertexNormalized.get(key))
+                              for name, key in zip(("position", "normal", "texCoord"), vertexKeys)}
+                else:
+                    values = {name: VertexLayout.decode(self.vertexArrays[mesh.position], mesh.attributes, name)
+                              for name in ("position", "normal", "texCoord")}
+                attributes = layout.formatsFor(values)
+                data.vertexArrays[nextKey] = VertexLayout.encode(values, attributes)
+                interleavedKeys[vertexKeys] = (nextKey, attributes)
+                nextKey += 1
+
+            if mesh.isSkinned:
+                for skinKey in (mesh.joints, mesh.weights):
+                    data.vertexArrays[skinKey] = self.vertexArrays[skinKey]
+                    if skinKey in self.vertexNormalized:
+                        data.vertexNormalized[skinKey] = self.vertexNormalized[skinKey]
+
+            key, attributes = interleavedKeys[vertexKeys]
+            data.meshes.append(MeshData(key, key, key, mesh.indices, mesh.material, mesh.draws, mesh.bounds,
+                                        mesh.lods, mesh.acmr, attributes, mesh.joints, mesh.weights))
+
+        return data
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Deque, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .Graph import Graph
+    from .ModelCache import ModelCache
+    from .VertexLayout import VertexLayout
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import queue
+import time
+
+from .Model import Model
+from .ModelData import ModelData
+
+
+class ModelLoader:
+    def __init__(self, graph: Graph, maxWorkers: Optional[int] = None):
+        """
+        loads models in the background, parsing and decoding happen on worker threads
+        and OpenGL uploads are spread over frames by calling upload from paintGL
+        :param maxWorkers: number of files decoded at the same time
+        """
+        self.graph = graph
+
+        # time and bytes that upload may spend each frame, None for no limit
+        self.maxUploadSeconds: Optional[float] = 0.004
+        self.maxUploadBytes: Optional[int] = None
+
+        self.__pool = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="viggy_3d-load")
+
+        # decoded models handed from worker threads to the OpenGL thread
+        self.__decoded: queue.Queue[Tuple[Future, Optional[ModelData], Optional[BaseException]]] = queue.Queue()
+
+        # models created on the OpenGL thread that are still being uploaded, in load order
+        self.__uploading: Deque[Tuple[Future, Model]] = deque()
+
+    @property
+    def isIdle(self) -> bool:
+        return self.__decoded.empty() and not self.__uploading
+
+    def load(self, path, cache: Optional[ModelCache] = None, batch: bool = False, lods: bool = False,
+             optimize: bool = False, vertexLayout: Optional[VertexLayout] = None) -> Future:
+        """
+        starts loading the .glb, .gltf or .obj file at path, returns immediately
+        :param cache: if given, the model data is read from or stored in the cache
+        :param batch: if True, meshes are merged by material on the decoding thread, see ModelData.batched
+        :param lods: if True, levels of detail are generated on the decoding thread, see ModelData.withLods
+        :param optimize: if True, meshes are optimized on the decoding thread, see ModelData.optimized
+        :param vertexLayout: if given, vertices are interleaved on the decoding thread, see ModelData.interleaved
+        :return: future that holds the Model once it is completely uploaded,
+                 the model is added to the graph and drawn progressively before that
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self.__pool.submit(self.__decode, future, path, cache, batch, lods, optimize, vertexLayout)
+        return future
+
+    def __decode(self, future: Future, path, cache: Optional[ModelCache], batch: bool, lods: bool, optimize: bool,
+                 vertexLayout: Optional[VertexLayout]):
+        try:
+            if cache is not None:
+                data = cache.load(path, batch, lods, optimize, vertexLayout)
+            else:
+                data = ModelData.fromFile(path, batch, lods, optimize, vertexLayout)
+            self.__decoded.put((future, data, None))
+        except BaseException as e:
+            self.__decoded.put((future, None, e))
+
+    def upload(self):
+        """
+        uploads decoded models until the per frame budget is used up, the OpenGL context must be current
+        """
+        start = time.perf_counter()
+        uploaded = 0
+
+        while True:
+            try:
+                future, data, exception = self.__decoded.get_nowait()
+            except queue.Empty:
+                break
+            if exception is not None:
+                future.set_exception(exception)
+                continue
+            try:
+                model = Model(self.graph, data, upload=False)
+            except BaseException as e:
+                future.set_exception(e)
+                continue
+            self.__uploading.append((future, model))
+
+        # models waiting on the upload thread are skipped until their upload completes
+        waiting = 0
+        while len(self.__uploading) > waiting:
+            future, model = self.__uploading[0]
+
+            try:
+                if model.isWaiting:
+                    self.__uploading.rotate(-1)
+                    waiting += 1
+                    continue
+                step = model.uploadStep()
+            except BaseException as e:
+                self.__uploading.popleft()
+                self.graph.removeModels(model)
+                future.set_exception(e)
+                continue
+
+            if step is None:
+                self.__uploading.popleft()
+                future.set_result(model)
+                continue
+
+            uploaded += step
+            if self.maxUploadSeconds is not None and time.perf_counter() - start >= self.maxUploadSeconds:
+                break
+            if self.maxUploadBytes is not None and uploaded >= self.maxUploadBytes:
+                break
+
+    def shutdown(self):
+        self.__pool.shutdown(wait=False)
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .GLState import GLState
+    from .Mesh import Mesh
+    from .Shader import Shader
+    from .Material import Material
+    from .TransformHierarchy import TransformHierarchy
+
+import itertools
+import struct
+
+import glm
+import numpy as np
+import OpenGL.GL as GL
+
+from .Camera import Camera
+
+
+# bit widths of the fields of a sort key, from least to most significant
+depthBits = 32
+vertexArrayBits = 24
+materialBits = 24
+programBits = 16
+
+
+def depthKey(depth: float) -> int:
+    """
+    bits of a non negative float32 sort in the same order as the floats
+    """
+    return struct.unpack('<I', struct.pack('<f', max(depth, 0.0)))[0]
+
+
+def intersectsFrustum(planes: np.ndarray, bounds: np.ndarray, transforms: np.ndarray) -> np.ndarray:
+    """
+    conservative test of many transformed boxes against a frustum, a box is kept unless it is fully outside a plane
+    both its bounding sphere and the world aligned box around it must pass
+    :param planes: (6, 4) planes from Camera.frustumPlanes
+    :param bounds: (n, 2, 3) [min, max] corners of each box
+    :param transforms: (n, 4, 4) transform of each box in the layout of np.array(glm.mat4)
+    :return: (n,) bool array, True where the box may be visible
+    """
+    rotations = transforms[:, :3, :3]
+    centers = np.einsum('nij,nj->ni', rotations, (bounds[:, 0] + bounds[:, 1]) / 2) + transforms[:, :3, 3]
+    halfSizes = (bounds[:, 1] - bounds[:, 0]) / 2
+
+    # signed distance of every center to every plane
+    distances = centers @ planes[:, :3].T + planes[:, 3]
+
+    # the sphere radius grows with the largest scale of the transform
+    radii = np.linalg.norm(halfSizes, axis=1) * np.linalg.norm(rotations, axis=1).max(axis=1)
+    visible = (distances >= -radii[:, None]).all(axis=1)
+
+    # half sizes of the world aligned box, projected onto every plane normal
+    extents = np.einsum('nij,nj->ni', np.abs(rotations), halfSizes) @ np.abs(planes[:, :3]).T
+    visible &= (distances >= -extents).all(axis=1)
+
+    return visible
+
+
+class ItemBounds:
+    def __init__(self):
+        """
+        bounds of the items of a list of queue items, by position in the list. the arrays are kept between frames
+        and only grow, so that culling takes world matrices straight from a TransformHierarchy
+        """
+        self.cullable = np.zeros(0, dtype=bool)  # False for instanced items and meshes without bounds
+        self.bounds = np.zeros((0, 2, 3), dtype=np.float32)
+        # handle of the node whose world matrix places the item, -1 if its matrix is in matrices
+        self.nodes = np.zeros(0, dtype=np.int64)
+        self.matrices = np.zeros((0, 4, 4), dtype=np.float32)
+
+    def set(self, index: int, mesh: Mesh, transform: glm.mat4, node: Optional[int], instanced: bool):
+        if index >= len(self.cullable):
+            capacity = max(2 * len(self.cullable), 64)
+            self.cullable = np.resize(self.cullable, capacity)
+            self.bounds = np.resize(self.bounds, (capacity, 2, 3))
+            self.nodes = np.resize(self.nodes, capacity)
+            self.matrices = np.resize(self.matrices, (capacity, 4, 4))
+
+        cullable = mesh.bounds is not None and not instanced
+        self.cullable[index] = cullable
+        if cullable:
+            self.bounds[index] = mesh.bounds
+            self.nodes[index] = -1 if node is None else node
+            if node is None:
+                self.matrices[index] = transform
+
+
+class RenderQueue:
+    def __init__(self, glState: GLState, transforms: Optional[TransformHierarchy] = None):
+        """
+        collects the meshes drawn in a frame and draws them sorted by a packed integer key
+        opaque items are grouped by program, material and vertex array and drawn front to back within a group,
+        blended items are drawn after them back to front
+        :param glState: state tracker of the context the queue is drawn in
+        :param transforms: hierarchy that the nodes of items are in, see add
+        """
+        self.glState = glState
+        self.transforms = transforms
+
+        # items are (key, shader, mesh, transform, mirrored, instance count, level of detail, joint offset)
+        self.opaque: List[Tuple[int, Shader, Mesh, glm.mat4, bool, Optional[int], int, Optional[int]]] = []
+        self.transparent: List[Tuple[int, Shader, Mesh, glm.mat4, bool, Optional[int], int, Optional[int]]] = []
+        self.__opaqueBounds = ItemBounds()
+        self.__transparentBounds = ItemBounds()
+
+        # view matrix of the frame, depths are measured along its forward axis
+        self.view = glm.mat4()
+
+        # planes of the view frustum of the frame, items outside it are not drawn
+        self.planes: Optional[np.ndarray] = None
+
+        # pixels covered by one unit at a distance of one unit, levels of detail are only used if set
+        self.pixelsPerUnit: Optional[float] = None
+
+        # largest error on screen in pixels of the levels of detail that are drawn
+        self.maxPixelError = 1.0
+
+        # number of items drawn and skipped by frustum culling in the last draw
+        self.visible = 0
+        self.culled = 0
+
+        # number of triangles drawn in the last draw
+        self.triangles = 0
+
+    def clear(self, view: glm.mat4, projection: Optional[glm.mat4] = None, height: Optional[int] = None):
+        """
+        removes every item, call once per frame before adding items
+        :param projection: if given, meshes with bounds are culled against the frustum of view and projection
+        :param height: if given with projection, the height of the viewport in device pixels,
+                       meshes with levels of detail are then drawn at the coarsest level that is not visibly coarser
+        """
+        self.opaque.clear()
+        self.transparent.clear()
+        self.view = view
+        self.planes = None if projection is None else Camera.frustumPlanes(view, projection)
+        # the projection scales y by the cotangent of half the field of view
+        self.pixelsPerUnit = None if projection is None or height is None else projection[1][1] * height / 2
+
+    def add(self, shader: Shader, mesh: Mesh, transform: glm.mat4, instanceCount: Optional[int] = None,
+            jointOffset: Optional[int] = None, node: Optional[int] = None):
+        """
+        :param transform: model matrix of the mesh, its origin is used as the depth of the mesh
+        :param instanceCount: if given, the mesh is drawn with Mesh.drawInstanced
+        :param jointOffset: if given, the first joint matrix of a skinned mesh, set as the jointOffset uniform
+        :param node: if given, the handle of the node in transforms whose world matrix is transform,
+                     culling then reads the matrix from transforms
+        """
+        depth = -(self.view * transform)[3].z
+
+        # a mirroring transform flips the winding of every triangle
+        mirrored = glm.determinant(glm.mat3(transform)) < 0
+
+        level = 0 if instanceCount is not None else self.__lodLevel(mesh, transform)
+
+        if mesh.material.isTransparent:
+            key = (1 << depthBits) - 1 - depthKey(depth)
+            self.__transparentBounds.set(len(self.transparent), mesh, transform, node, instanceCount is not None)
+            self.transparent.append((key, shader, mesh, transform, mirrored, instanceCount, level, jointOffset))
+        else:
+            # OpenGL names may be numpy integers, which would overflow when shifted
+            key = ((((int(shader.program) % (1 << programBits)) << materialBits
+                     | mesh.material.id % (1 << materialBits)) << vertexArrayBits
+                    | int(mesh.VAO) % (1 << vertexArrayBits)) << depthBits) | depthKey(depth)
+            self.__opaqueBounds.set(len(self.opaque), mesh, transform, node, instanceCount is not None)
+            self.opaque.append((key, shader, mesh, transform, mirrored, instanceCount, level, jointOffset))
+
+    def __lodLevel(self, mesh: Mesh, transform: glm.mat4) -> int:
+        """
+        level of detail of mesh for the size its error projects to on screen, instances always use the full detail
+        """
+        if self.pixelsPerUnit is None or mesh.lodCount == 1 or mesh.bounds is None:
+            return 0
+
+        center = transform * glm.vec4(glm.vec3(*((mesh.bounds[0] + mesh.bounds[1]) / 2)), 1)
+        scale = max(glm.length(transform[0].xyz), glm.length(transform[1].xyz), glm.length(transform[2].xyz))
+        radius = float(np.linalg.norm(mesh.bounds[1] - mesh.bounds[0])) / 2 * scale
+
+        # distance to the nearest point of the bounding sphere, the full detail is used inside it
+        distance = -(self.view * center).z - radius
+        if distance <= 0:
+            return 0
+        return mesh.lodLevel(self.pixelsPerUnit * scale / distance, self.maxPixelError)
+
+    def __len__(self) -> int:
+        return len(self.opaque) + len(self.transparent)
+
+    def draw(self):
+        """
+        sorts and draws every item, opaque items first with blending off,
+        then transparent items with blending on and depth writes off
+        """
+        total = len(self)
+        if self.planes is not None:
+            self.opaque = self.__cull(self.opaque, self.__opaqueBounds)
+            self.transparent = self.__cull(self.transparent, self.__transparentBounds)
+        self.visible = len(self)
+        self.culled = total - self.visible
+        self.triangles = sum(item[2].triangleCount(item[6]) * (1 if item[5] is None else item[5])
+                             for items in (self.opaque, self.transparent) for item in items)
+
+        self.opaque.sort(key=lambda item: item[0])
+        self.transparent.sort(key=lambda item: item[0])
+
+        self.glState.disable(GL.GL_BLEND)
+        self.glState.depthMask(True)
+        self.__drawItems(self.opaque)
+
+        self.glState.enable(GL.GL_BLEND)
+        self.glState.depthMask(False)
+        self.__drawItems(self.transparent)
+        self.glState.depthMask(True)
+
+    def __cull(self, items: List[Tuple[int, Shader, Mesh, glm.mat4, bool, Optional[int], int, Optional[int]]],
+               itemBounds: ItemBounds) -> List[Tuple[int, Shader, Mesh, glm.mat4, bool, Optional[int], int,
+                                                     Optional[int]]]:
+        """
+        :return: the items that may be inside the frustum, instanced items and meshes without bounds are kept
+        """
+        cullable = np.flatnonzero(itemBounds.cullable[:len(items)])
+        if not len(cullable):
+            return items
+
+        nodes = itemBounds.nodes[cullable]
+        transforms = itemBounds.matrices[cullable]
+        hasNode = nodes >= 0
+        if hasNode.any():
+            transforms[hasNode] = self.transforms.worlds[self.transforms.rows[nodes[hasNode]]]
+
+        keep = np.ones(len(items), dtype=bool)
+        keep[cullable] = intersectsFrustum(self.planes, itemBounds.bounds[cullable], transforms)
+        return list(itertools.compress(items, keep))
+
+    def __drawItems(self, items: List[Tuple[int, Shader, Mesh, glm.mat4, bool, Optional[int], int, Optional[int]]]):
+        shader: Optional[Shader] = None
+        material: Optional[Material] = None
+        model = None
+        joints = None
+
+        for _, itemShader, mesh, transform, mirrored, instanceCount, level, jointOffset in items:
+            if itemShader is not shader:
+                shader = itemShader
+                shader.use()
+                model = shader.uniform("model")
+                joints = shader.uniform("jointOffset") if "jointOffset" in shader.uniforms else None
+                material = None
+            if mesh.material is not material:
+                material = mesh.material
+                material.bind(shader)
+
+            self.glState.frontFace(GL.GL_CW if mirrored else GL.GL_CCW)
+            model.set(transform)
+            if jointOffset is not None and joints is not None:
+                joints.set(jointOffset)
+            if instanceCount is None:
+                mesh.draw(level)
+            else:
+                mesh.drawInstanced(instanceCount, level)
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .Graph import Graph
+    from .Model import Model
+
+import glm
+import numpy as np
+
+from .BVH import BVH, rayBoxDistances, transformBounds
+
+
+class Hit:
+    def __init__(self, model: Model, meshIndex: int, distance: float, position: glm.vec3, triangle: int):
+        """
+        result of a ray pick
+        :param meshIndex: index into model.meshes
+        :param distance: ray parameter of the hit, in world units for a unit direction
+        :param triangle: index of the hit triangle in the mesh
+        """
+        self.model = model
+        self.meshIndex = meshIndex
+        self.distance = distance
+        self.position = position
+        self.triangle = triangle
+
+
+class SceneBVH:
+    def __init__(self, graph: Graph):
+        """
+        BVH over the world boxes of every mesh drawn by the models of graph, each mesh has its own triangle BVH
+        it is brought up to date before every query, rebuilt when models or meshes were added or removed
+        and refit when only world transforms changed in graph.transforms
+        instanced models and meshes without bounds are not indexed
+        """
+        self.graph = graph
+
+        # every indexed mesh as (model, index into model.meshes)
+        self.instances: List[Tuple[Model, int]] = []
+
+        # models with their mesh count and transform version when the hierarchy was last updated
+        self.__models: List[Tuple[Model, int]] = []
+        self.__versions: List[int] = []
+
+        self.__bvh: Optional[BVH] = None
+        self.__transforms = np.zeros((0, 4, 4))
+        self.__localBounds = np.zeros((0, 2, 3))
+        self.__worldBounds = np.zeros((0, 2, 3))
+
+    def update(self):
+        """
+        called by every query, rebuilds or refits the hierarchy if the models changed since the last update
+        """
+        self.graph.transforms.update()
+        models = [(model, len(model.meshes)) for model in self.graph.models if model.instances is None]
+        versions = [model.transformVersion for model, _ in models]
+
+        if len(models) != len(self.__models) or \
+                any(model is not old or count != oldCount
+                    for (model, count), (old, oldCount) in zip(models, self.__models)):
+            self.__models = models
+            self.__versions = versions
+            self.__rebuild()
+        elif versions != self.__versions:
+            moved = {id(model) for (model, _), version, old in zip(models, versions, self.__versions)
+                     if version != old}
+            self.__versions = versions
+            self.__refit(moved)
+
+    def __instanceTransform(self, model: Model, meshIndex: int) -> np.ndarray:
+        return np.array(model.worldTransforms()[meshIndex])
+
+    def __rebuild(self):
+        self.instances = [(model, i) for model, count in self.__models for i in range(count)
+                          if model.meshes[i].bounds is not None]
+        self.__transforms = np.array([self.__instanceTransform(model, i) for model, i in self.instances],
+                                     dtype=np.float64).reshape(-1, 4, 4)
+        self.__localBounds = np.array([model.meshes[i].bounds for model, i in self.instances],
+                                      dtype=np.float64).reshape(-1, 2, 3)
+        self.__worldBounds = transformBounds(self.__localBounds, self.__transforms)
+        self.__bvh = BVH(self.__worldBounds, leafSize=4)
+
+    def __refit(self, moved: set):
+        changed = [j for j, (model, _) in enumerate(self.instances) if id(model) in moved]
+        for j in changed:
+            self.__transforms[j] = self.__instanceTransform(*self.instances[j])
+        self.__worldBounds[changed] = transformBounds(self.__localBounds[changed], self.__transforms[changed])
+        self.__bvh.refit(self.__worldBounds)
+
+    def intersectRay(self, origin: glm.vec3, direction: glm.vec3, maxDistance: float = np.inf) -> Optional[Hit]:
+        """
+        :return: the closest triangle hit by the ray origin + t direction for 0 <= t <= maxDistance, if any
+        """
+        self.update()
+        if not self.instances:
+            return None
+
+        o = np.array(origin, dtype=np.float64)
+        d = np.array(direction, dtype=np.float64)
+        candidates = self.__bvh.query(BVH.rayTest(o, d, maxDistance))
+        if len(candidates) == 0:
+            return None
+
+        # meshes are visited by the distance to their boxes, so the search stops at the first box past the best hit
+        near, far = rayBoxDistances(o, 1 / np.where(np.abs(d) < 1e-30, 1e-30, d),
+                                    self.__worldBounds[candidates, 0], self.__worldBounds[candidates, 1])
+        order = np.argsort(near)
+
+        best: Optional[Hit] = None
+        for j in order:
+            if near[j] > far[j] or far[j] < 0:
+                continue
+            if near[j] > maxDistance:
+                break
+
+            # meshes hidden by a zero scale cannot be hit and have no inverse transform
+            if np.linalg.det(self.__transforms[candidates[j], :3, :3]) == 0:
+                continue
+
+            model, meshIndex = self.instances[candidates[j]]
+            inverse = np.linalg.inv(self.__transforms[candidates[j]])
+            # the ray parameter is unchanged by the transform, so distances of all meshes can be compared
+            hit = model.meshes[meshIndex].triangleBVH.intersectRay(inverse[:3, :3] @ o + inverse[:3, 3],
+                                                                   inverse[:3, :3] @ d, maxDistance)
+            if hit is not None:
+                maxDistance, triangle = hit
+                best = Hit(model, meshIndex, maxDistance, origin + direction * maxDistance, triangle)
+
+        return best
+
+    def __query(self, test) -> List[Tuple[Model, int]]:
+        self.update()
+        if not self.instances:
+            return []
+        candidates = self.__bvh.query(test)
+        candidates = candidates[test(self.__worldBounds[candidates, 0], self.__worldBounds[candidates, 1])]
+        return [self.instances[j] for j in np.sort(candidates)]
+
+    def queryBox(self, low: glm.vec3, high: glm.vec3) -> List[Tuple[Model, int]]:
+        """
+        :return: (model, mesh index) of every mesh whose world box overlaps the box from low to high
+        """
+        return self.__query(BVH.boxTest(np.array(low, dtype=np.float64), np.array(high, dtype=np.float64)))
+
+    def querySphere(self, center: glm.vec3, radius: float) -> List[Tuple[Model, int]]:
+        """
+        :return: (model, mesh index) of every mesh whose world box overlaps the sphere
+        """
+        return self.__query(BVH.sphereTest(np.array(center, dtype=np.float64), radius))
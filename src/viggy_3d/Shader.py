@@ -1,117 +1,238 @@
+from __future__ import annotations
+
 import ctypes
-from typing import Dict, Union, Tuple, List
+from typing import Callable, Dict, Optional, Set, Union, Tuple, List, TYPE_CHECKING
 
+import glm
+import numpy as np
 import OpenGL.GL.shaders
 import OpenGL.GL as GL
 
+from .GLState import GLState
+from .VertexLayout import VertexLayout, defaultLayout
+
+if TYPE_CHECKING:
+    from .ShaderCache import ShaderCache
+
+
+# GLSL name of each type reported by glGetActiveUniform, the name selects the Shader._set_ method
+uniformTypeNames = {GL.GL_FLOAT: "float",
+                    GL.GL_FLOAT_VEC2: "vec2",
+                    GL.GL_FLOAT_VEC3: "vec3",
+                    GL.GL_FLOAT_VEC4: "vec4",
+                    GL.GL_INT: "int",
+                    GL.GL_BOOL: "bool",
+                    GL.GL_FLOAT_MAT3: "mat3",
+                    GL.GL_FLOAT_MAT4: "mat4",
+                    GL.GL_SAMPLER_2D: "sampler2D",
+                    GL.GL_SAMPLER_CUBE: "samplerCube",
+                    GL.GL_SAMPLER_BUFFER: "samplerBuffer",
+                    GL.GL_UNSIGNED_INT_SAMPLER_BUFFER: "usamplerBuffer"}
+
+
+class Uniform:
+    def __init__(self, shader: Shader, name: str, uniformType: Union[str, Tuple[Tuple[str, str]]],
+                 location: Union[int, List[int]]):
+        """
+        handle to a uniform of shader resolved once, get handles with Shader.uniform
+        """
+        self.shader = shader
+        self.name = name
+        self.type = uniformType
+        self.location = location
+
+        # struct uniforms are set through a handle for each member
+        self.members: Optional[List[Uniform]] = None
+        self.__set: Optional[Callable] = None
+
+        if type(uniformType) in (tuple, list):
+            self.members = [shader.uniform(f"{name}.{attribute}") for attribute, _ in uniformType]
+        else:
+            try:
+                setter = getattr(Shader, f"_set_{uniformType}")
+            except AttributeError:
+                raise Exception(f"uniform: {name} has invalid type")
+            if uniformType.startswith("mat"):
+                # the cached copy stays alive while its pointer is in use
+                self.__set = lambda location, value: setter(location, glm.value_ptr(value))
+            else:
+                self.__set = setter
+
+        # the value last uploaded through this handle, uploads of an equal value are skipped
+        self.__value = None
+
+    def set(self, value):
+        """
+        value is a number, a tuple, a glm vector or matrix or a numpy array in the layout of np.array(glm.mat4),
+        for structs a dict of member values, or a tuple of them in member order if the struct was given
+        with Shader.addUniforms
+        binds the program if a value is uploaded
+        """
+        if self.members is not None:
+            if not isinstance(value, dict) and self.name in self.shader.reflectedStructs:
+                raise Exception(f"uniform: {self.name} is a struct read from the program, set it with a dict")
+            if isinstance(value, dict):
+                for member in self.members:
+                    attribute = member.name.rsplit('.', 1)[1]
+                    if attribute in value:
+                        member.set(value[attribute])
+            else:
+                for member, memberValue in zip(self.members, value):
+                    member.set(memberValue)
+            return
+
+        if isinstance(value, np.ndarray):
+            # arrays are compared element wise, cache them as the glm matrix or tuple they stand for
+            if self.type.startswith("mat"):
+                value = getattr(glm, self.type)(value)
+            else:
+                value = value.item() if value.ndim == 0 else tuple(value.tolist())
+
+        if value == self.__value:
+            return
+
+        # copied so that later changes to a mutable glm value are not missed
+        self.__value = type(value)(value)
+        self.shader.use()
+        self.__set(self.location, self.__value)
+
+    def invalidate(self):
+        """
+        forget the cached value, the next set uploads whatever it is given
+        """
+        self.__value = None
+        for member in self.members or []:
+            member.invalidate()
+
 
 class Shader:
-    def __init__(self, shader_dir: str):
+    # uniform buffer binding point of each uniform block shared between programs
+    uniformBlockBindings: Dict[str, int] = {"Frame": 0}
+
+    def __init__(self, shader_dir: str, cache: Optional[ShaderCache] = None,
+                 vertexLayout: Optional[VertexLayout] = None, fragment_dir: Optional[str] = None,
+                 glState: Optional[GLState] = None):
         """
         :param shader_dir: directory must contain vertex.glsl, fragment.glsl, and optionally geometry.glsl
+        :param cache: if given, the linked program is read from or stored in the cache instead of compiled
+        :param vertexLayout: layout whose attribute inputs and decode functions replace VertexLayout.marker
+                             in vertex.glsl, defaultLayout if None
+        :param fragment_dir: if given, fragment.glsl is read from this directory instead of shader_dir,
+                             for shaders that only differ from another in their other stages
+        :param glState: state tracker of the context the shader is used in, a tracker of its own if None,
+                        Graph.addShaders replaces it with Graph.glState
         """
-        compiledShaders = []
+        self.glState = glState if glState is not None else GLState()
+
         # key is uniform name and value is a tuple of uniform type followed by uniform location
         self.uniforms: Dict[str, Union[Tuple[str, int], Tuple[Tuple[Tuple[str, str]], List[int]]]] = dict()
 
+        # handles returned by uniform, keyed by the name they were requested with
+        self.__handles: Dict[str, Uniform] = dict()
+
+        # structs read from the program, OpenGL reports their active members in no defined order,
+        # so they are only set by member name, see addUniforms for structs in declared order
+        self.reflectedStructs: Set[str] = set()
+
+        # key is shader type and value is the source of that stage
+        sources: Dict[int, str] = dict()
+
         with open(shader_dir.rstrip('/') + "/vertex.glsl", 'r') as f:
-            compiledShaders.append(GL.shaders.compileShader(f.read(), GL.GL_VERTEX_SHADER))
+            sources[GL.GL_VERTEX_SHADER] = f.read().replace(VertexLayout.marker,
+                                                            (vertexLayout or defaultLayout).glsl())
 
-        with open(shader_dir.rstrip('/') + "/fragment.glsl", 'r') as f:
-            compiledShaders.append(GL.shaders.compileShader(f.read(), GL.GL_FRAGMENT_SHADER))
+        with open((fragment_dir or shader_dir).rstrip('/') + "/fragment.glsl", 'r') as f:
+            sources[GL.GL_FRAGMENT_SHADER] = f.read()
 
         try:
             with open(shader_dir.rstrip('/') + "/geometry.glsl", 'r') as f:
-                compiledShaders.append(GL.shaders.compileShader(f.read(), GL.GL_GEOMETRY_SHADER))
+                sources[GL.GL_GEOMETRY_SHADER] = f.read()
 
         except FileNotFoundError:
             pass  # if no geometry shader
 
-        self.program = GL.shaders.compileProgram(*compiledShaders)
+        self.program = None if cache is None else cache.load(sources)
 
-        # delete after compiling program
-        for shader in compiledShaders:
-            GL.glDeleteShader(shader)
+        if self.program is None:
+            compiledShaders = [GL.shaders.compileShader(source, shaderType) for shaderType, source in sources.items()]
+            # validation checks the current state, in which every sampler still refers to texture unit 0,
+            # so programs with samplers of different types such as shaders/skinned would fail it
+            self.program = GL.shaders.compileProgram(*compiledShaders, retrievable=cache is not None, validate=False)
 
-        # add uniforms
-        for file in ("vertex.glsl", "fragment.glsl", "geometry.glsl"):
-            try:
-                with open(shader_dir.rstrip('/') + f"/{file}", 'r') as f:
-                    self.__addUniformsFromFile(f)
-            except FileNotFoundError:
-                pass
-
-    def __addUniformsFromFile(self, f):
-        f.seek(0)
-        lines = f.readlines()
-
-        # remove all empty lines
-        while '' in lines:
-            lines.remove('')
-
-        # assume first non empty line is version line and remove it
-        lines.pop(0)
-
-        # remove all single line comments starting with '//'
-        for i in range(len(lines)):
-            lines[i] = lines[i][:lines[i].find('//')]
-
-        code = ""
-        for line in lines:
-            code += line
-
-        code = code.replace('\t', '')
-
-        # remove multiline comments starting with '/*' and ending with '*/'
-        while '/*' in code:
-            code = code[:code.find('/*')] + code[code.find('*/') + 2:]
-
-        lines = code.split(";")
-
-        # remove whitespaces
-        for i in range(len(lines)):
-            lines[i] = lines[i].strip(' ')
-
-        structs: Dict[str, Tuple[Tuple[str, str]]] = dict()
-
-        # find all struct definitions
-        for i in range(len(lines)):
-            if lines[i].startswith('struct '):
-                words = lines[i].split(' ')
-                # remove empty strings
-                while '' in words:
-                    words.remove('')
-                # words = ['struct', <structNamw>, '{', <type1>, <attribute1>]
-                _, structName, _, type1, attribute1 = words
-                struct = [(attribute1, type1)]
-
-                i += 1
-
-                while lines[i] != '}':
-                    words = lines[i].split(' ')
-                    # remove empty strings
-                    while '' in words:
-                        words.remove('')
-                    # words = [<typeN>, <attributeN>]
-                    typeN, attributeN = words
-                    struct.append((attributeN, typeN))
-                    i += 1
-
-                structs[structName] = tuple(struct)
-
-        # find all uniform declarations
-        for i in range(len(lines)):
-            if lines[i].startswith('uniform '):
-                words = lines[i].split(' ')
-                # remove empty strings
-                while '' in words:
-                    words.remove('')
-                # words = ['uniform', <uniformType>, <uniformName>]
-                _, uniformType, uniformName = words
-                if uniformType in structs.keys():
-                    self.addUniforms((uniformName, structs[uniformType]))
-                else:
-                    self.addUniforms((uniformName, uniformType))
+            # delete after compiling program
+            for shader in compiledShaders:
+                GL.glDeleteShader(shader)
+
+            if cache is not None:
+                cache.store(sources, self.program)
+
+        # key is block name and value is a tuple of block index, size in bytes and the offset of each member
+        self.uniformBlocks: Dict[str, Tuple[int, int, Dict[str, int]]] = dict()
+
+        self.__addUniformsFromProgram()
+
+        # connect shared uniform blocks to their buffers, GLSL 330 cannot set the binding in the shader
+        for blockName, binding in self.uniformBlockBindings.items():
+            if blockName in self.uniformBlocks:
+                GL.glUniformBlockBinding(self.program, self.uniformBlocks[blockName][0], binding)
+
+    def __addUniformsFromProgram(self):
+        """
+        reads the active uniforms and uniform blocks of the linked program
+        every array element and struct member gets its own entry such as "lights[2].position",
+        a struct also gets an entry with all of its members
+        """
+        blockCount = GL.glGetProgramiv(self.program, GL.GL_ACTIVE_UNIFORM_BLOCKS)
+        blockNames = []
+        for blockIndex in range(blockCount):
+            value = np.zeros(1, dtype=np.int32)
+            GL.glGetActiveUniformBlockiv(self.program, blockIndex, GL.GL_UNIFORM_BLOCK_NAME_LENGTH, value)
+            name = ctypes.create_string_buffer(int(value[0]))
+            GL.glGetActiveUniformBlockName(self.program, blockIndex, int(value[0]), None, name)
+            GL.glGetActiveUniformBlockiv(self.program, blockIndex, GL.GL_UNIFORM_BLOCK_DATA_SIZE, value)
+            blockNames.append(name.value.decode())
+            self.uniformBlocks[blockNames[-1]] = (blockIndex, int(value[0]), dict())
+
+        count = GL.glGetProgramiv(self.program, GL.GL_ACTIVE_UNIFORMS)
+        if count == 0:
+            return
+
+        indices = np.arange(count, dtype=np.uint32)
+        blockIndices = np.zeros(count, dtype=np.int32)
+        offsets = np.zeros(count, dtype=np.int32)
+        GL.glGetActiveUniformsiv(self.program, count, indices, GL.GL_UNIFORM_BLOCK_INDEX, blockIndices)
+        GL.glGetActiveUniformsiv(self.program, count, indices, GL.GL_UNIFORM_OFFSET, offsets)
+
+        structs: Dict[str, List[Tuple[str, str, int]]] = dict()
+
+        for i in range(count):
+            name, size, glType = GL.glGetActiveUniform(self.program, i)
+            name = name.decode()
+            uniformType = uniformTypeNames.get(glType, str(glType))
+
+            # members of uniform blocks are set through buffers and have no location
+            if blockIndices[i] != -1:
+                self.uniformBlocks[blockNames[blockIndices[i]]][2][name] = int(offsets[i])
+                continue
+
+            # an array of a basic type is reported once, each element is queried by name
+            if name.endswith("[0]"):
+                names = [f"{name[:-3]}[{element}]" for element in range(size)]
+                self.uniforms[name[:-3]] = (uniformType, GL.glGetUniformLocation(self.program, name))
+            else:
+                names = [name]
+
+            for elementName in names:
+                location = GL.glGetUniformLocation(self.program, elementName)
+                self.uniforms[elementName] = (uniformType, location)
+                if '.' in elementName:
+                    structName, attribute = elementName.rsplit('.', 1)
+                    structs.setdefault(structName, []).append((attribute, uniformType, location))
+
+        for structName, members in structs.items():
+            self.reflectedStructs.add(structName)
+            self.uniforms[structName] = (tuple((attribute, uniformType) for attribute, uniformType, _ in members),
+                                         [location for _, _, location in members])
 
     def addUniforms(self, *uniforms: Tuple[str, Union[str, Tuple[Tuple[str, str]]]]):
         """
@@ -119,7 +240,7 @@ class Shader:
         finds location of each uniform and stores internally
         to calculate locations again or change type, pass the tuple again
         """
-        OpenGL.GL.glUseProgram(self.program)
+        self.use()
         for uniform in uniforms:
             uniformName, uniformType = uniform
             if type(uniformType) == str:
@@ -128,34 +249,60 @@ class Shader:
                 uniform_location = []
                 for attribute, u_type in uniformType:
                     uniform_location.append(GL.glGetUniformLocation(self.program, f"{uniformName}.{attribute}"))
+                    self.uniforms[f"{uniformName}.{attribute}"] = (u_type, uniform_location[-1])
             else:
                 raise Exception(f"uniform '{uniformName}' cannot have type: {uniformType}")
             self.uniforms[uniformName] = (uniformType, uniform_location)
+            self.reflectedStructs.discard(uniformName)
+
+            # handles resolved with the old type or location are resolved again on request
+            for name in [name for name in self.__handles if self.__isPartOf(name, uniformName)]:
+                del self.__handles[name]
+
+    @staticmethod
+    def __isPartOf(name: str, uniformName: str) -> bool:
+        """
+        whether name is uniformName or one of its members
+        """
+        return name == uniformName or name.startswith(uniformName + '.')
+
+    def uniform(self, name: str) -> Uniform:
+        """
+        resolves a uniform, a struct uniform or a struct member such as "light.position" once
+        :return: handle whose set method uploads values without any lookups
+        """
+        if name not in self.__handles:
+            uniformType, location = self.uniforms[name]
+            self.__handles[name] = Uniform(self, name, uniformType, location)
+        return self.__handles[name]
 
     def setUniform(self, uniform_name: str, value):
         """
         sets the uniform to value using appropriate OpenGL function depending on type
+        prefer a handle from uniform for uniforms that are set often
         """
-        GL.glUseProgram(self.program)
+        self.use()
+
+        # the value set here is not known to handles of the uniform
+        for name, handle in self.__handles.items():
+            if self.__isPartOf(name, uniform_name):
+                handle.invalidate()
 
         try:
-            # if setting an attribute of a struct
-            if '.' in uniform_name:
-                uniform_struct_name, uniform_attribute_name = uniform_name.split(".")
-                uniform_struct, uniform_location = self.uniforms[uniform_struct_name]
-                for i in range(len(uniform_struct)):
-                    attr_name, attr_type = uniform_struct[i]
-                    if attr_name == uniform_attribute_name:
-                        getattr(self, f"_set_{attr_type}")(uniform_location[i], value)
-            else:
-                uniform_type, uniform_location = self.uniforms[uniform_name]
-                # if setting a non struct variable
-                if type(uniform_type) == str:
-                    getattr(self, f"_set_{uniform_type}")(uniform_location, value)
-                # if setting entire struct
-                elif type(uniform_type) in (tuple, list):
-                    for i in range(len(uniform_type)):
-                        attr_name, attr_type = uniform_type[i]
+            uniform_type, uniform_location = self.uniforms[uniform_name]
+            # if setting a non struct variable
+            if type(uniform_type) == str:
+                getattr(self, f"_set_{uniform_type}")(uniform_location, value)
+            # if setting entire struct, by member name or in member order
+            elif type(uniform_type) in (tuple, list):
+                if not isinstance(value, dict) and uniform_name in self.reflectedStructs:
+                    raise Exception(f"uniform: {uniform_name} is a struct read from the program, set it with a dict")
+                for i in range(len(uniform_type)):
+                    attr_name, attr_type = uniform_type[i]
+                    if isinstance(value, dict):
+                        if attr_name in value:
+                            getattr(self, f"_set_{attr_type}")(uniform_location[i], value[attr_name])
+                    else:
                         getattr(self, f"_set_{attr_type}")(uniform_location[i], value[i])
 
         except AttributeError:
@@ -164,12 +311,32 @@ class Shader:
             raise Exception(f"uniform: {uniform_name} has invalid value")
 
     def use(self):
-        GL.glUseProgram(self.program)
+        self.glState.useProgram(self.program)
 
     @staticmethod
     def _set_sampler2D(location: int, x: int):
         GL.glUniform1i(location, x)
 
+    @staticmethod
+    def _set_samplerCube(location: int, x: int):
+        GL.glUniform1i(location, x)
+
+    @staticmethod
+    def _set_samplerBuffer(location: int, x: int):
+        GL.glUniform1i(location, x)
+
+    @staticmethod
+    def _set_usamplerBuffer(location: int, x: int):
+        GL.glUniform1i(location, x)
+
+    @staticmethod
+    def _set_int(location: int, x: int):
+        GL.glUniform1i(location, x)
+
+    @staticmethod
+    def _set_bool(location: int, x: bool):
+        GL.glUniform1i(location, x)
+
     @staticmethod
     def _set_float(location: int, x):
         """
@@ -204,3 +371,10 @@ class Shader:
         set a matrix4 type uniform
         """
         GL.glUniformMatrix4fv(location, 1, GL.GL_FALSE, matrix_ptr)
+
+    @staticmethod
+    def _set_mat3(location: int, matrix_ptr: ctypes.POINTER(ctypes.c_float)):
+        """
+        set a matrix3 type uniform
+        """
+        GL.glUniformMatrix3fv(location, 1, GL.GL_FALSE, matrix_ptr)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import ctypes
+import hashlib
+import os
+import pathlib
+import struct
+import tempfile
+
+import OpenGL.GL as GL
+from OpenGL.error import GLError
+
+
+# entry layout, all integers little endian:
+#     magic   4 bytes  b"V3DS"
+#     format  4 bytes  binary format returned by glGetProgramBinary
+#     binary  the rest of the entry
+
+magic = b"V3DS"
+
+
+class ShaderCache:
+    # bump whenever the way programs are linked changes, invalidates every entry
+    version = 1
+
+    def __init__(self, directory):
+        """
+        on disk cache of linked shader programs keyed by their source and the driver
+        binaries only work with the driver that created them, so a driver update misses every entry
+        :param directory: created if it does not exist
+        """
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def key(self, sources: Dict[int, str]) -> str:
+        """
+        hash of the cache version, the vendor, renderer and version strings of the current context and every source
+        """
+        digest = hashlib.sha256(f"viggy-3d shader cache {self.version}".encode('utf-8'))
+        for name in (GL.GL_VENDOR, GL.GL_RENDERER, GL.GL_VERSION):
+            digest.update(GL.glGetString(name) + b'\0')
+        for stage, source in sorted(sources.items()):
+            digest.update(struct.pack('<I', stage))
+            digest.update(source.encode('utf-8') + b'\0')
+
+        return digest.hexdigest()
+
+    def entryPath(self, sources: Dict[int, str]) -> pathlib.Path:
+        return self.directory.joinpath(self.key(sources) + ".v3ds")
+
+    def load(self, sources: Dict[int, str]) -> Optional[int]:
+        """
+        :param sources: source of each stage keyed by shader type such as GL.GL_VERTEX_SHADER
+        :return: program created from the cached binary, None on a miss or if the driver rejects the binary
+        """
+        entry = self.entryPath(sources)
+        try:
+            data = entry.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        if len(data) > 8 and data[:4] == magic:
+            binaryFormat, = struct.unpack_from('<I', data, 4)
+            program = GL.glCreateProgram()
+            try:
+                GL.glProgramBinary(program, binaryFormat, data[8:], len(data) - 8)
+                linked = GL.glGetProgramiv(program, GL.GL_LINK_STATUS) == GL.GL_TRUE
+            except GLError:
+                linked = False  # the format is not supported by this driver
+
+            if linked:
+                # modification time is used as the last access time
+                os.utime(entry)
+                return program
+            GL.glDeleteProgram(program)
+
+        entry.unlink(missing_ok=True)
+        return None
+
+    def store(self, sources: Dict[int, str], program: int):
+        """
+        writes the binary of program atomically, does nothing if the driver does not provide one
+        the program must be linked with the binary retrievable hint set
+        """
+        length = int(GL.glGetProgramiv(program, GL.GL_PROGRAM_BINARY_LENGTH))
+        if length == 0:
+            return
+
+        binary = ctypes.create_string_buffer(length)
+        written = GL.GLsizei(0)
+        binaryFormat = GL.GLenum(0)
+        GL.glGetProgramBinary(program, length, written, binaryFormat, binary)
+
+        entry = self.entryPath(sources)
+        # graphs on other threads or processes may store the same program at once, each writes its own file
+        handle, tempPath = tempfile.mkstemp(dir=entry.parent, prefix=entry.name, suffix=".tmp")
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(magic)
+                f.write(struct.pack('<I', binaryFormat.value))
+                f.write(binary.raw[:written.value])
+            os.replace(tempPath, entry)
+        except BaseException:
+            os.remove(tempPath)
+            raise
+
+    def entries(self) -> List[pathlib.Path]:
+        """
+        :return: cache entries, least recently used first
+        """
+        return sorted(self.directory.glob("*.v3ds"), key=lambda p: p.stat().st_mtime)
+
+    def clear(self):
+        for entry in self.entries():
+            entry.unlink(missing_ok=True)
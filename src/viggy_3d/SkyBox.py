@@ -1,9 +1,11 @@
 import ctypes
+from typing import Optional
 
 import OpenGL.GL as GL
 import numpy as np
 
-from PIL import Image
+from . import decoding
+from .GLState import GLState
 
 
 skyBoxVertices = np.array([-1.0, 1.0, -1.0,
@@ -50,13 +52,17 @@ skyBoxVertices = np.array([-1.0, 1.0, -1.0,
 
 
 class SkyBox:
-    def __init__(self, sky_box_dir: str, ext: str):
+    def __init__(self, sky_box_dir: str, ext: str, glState: Optional[GLState] = None):
         """
         :param sky_box_dir: must contain files ("right", "left", "top", "bottom", "front", "back").ext
         :param ext: one of png or jpg
+        :param glState: state tracker of the context the sky box is drawn in, a tracker of its own if None,
+                        setting Graph.skyBox replaces it with Graph.glState
         """
+        self.glState = glState if glState is not None else GLState()
+
         self.VAO = GL.glGenVertexArrays(1)
-        GL.glBindVertexArray(self.VAO)
+        self.glState.bindVertexArray(self.VAO)
 
         self.VBO = GL.glGenBuffers(1)
         GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.VBO)
@@ -70,11 +76,12 @@ class SkyBox:
 
         skyBoxImages = ("right", "left", "top", "bottom", "front", "back")
 
+        # faces are decoded in parallel, only the upload happens on this thread
+        faces = decoding.decodeImages(sky_box_dir + f"/{name}.{ext}" for name in skyBoxImages)
+
         for i in range(6):
-            img = Image.open(sky_box_dir + f"/{skyBoxImages[i]}.{ext}")
-            GL.glTexImage2D(GL.GL_TEXTURE_CUBE_MAP_POSITIVE_X + i, 0, GL.GL_RGB, img.width, img.height,
-                            0, GL.GL_RGB, GL.GL_UNSIGNED_BYTE,
-                            img.convert("RGB").tobytes())
+            GL.glTexImage2D(GL.GL_TEXTURE_CUBE_MAP_POSITIVE_X + i, 0, GL.GL_RGB, faces[i].shape[1], faces[i].shape[0],
+                            0, GL.GL_RGB, GL.GL_UNSIGNED_BYTE, faces[i])
 
         GL.glTexParameteri(GL.GL_TEXTURE_CUBE_MAP, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
         GL.glTexParameteri(GL.GL_TEXTURE_CUBE_MAP, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
@@ -83,11 +90,12 @@ class SkyBox:
         GL.glTexParameteri(GL.GL_TEXTURE_CUBE_MAP, GL.GL_TEXTURE_WRAP_R, GL.GL_CLAMP_TO_EDGE)
 
     def draw(self):
-        GL.glBindVertexArray(self.VAO)
+        self.glState.bindVertexArray(self.VAO)
         # bind texture to unit 0 in order to avoid setting uniform
-        GL.glActiveTexture(GL.GL_TEXTURE0)
-        GL.glBindTexture(GL.GL_TEXTURE_CUBE_MAP, self.cubeMap)
+        self.glState.bindTexture(0, GL.GL_TEXTURE_CUBE_MAP, self.cubeMap)
 
-        GL.glDepthMask(GL.GL_FALSE)
+        # the cube is seen from inside
+        self.glState.disable(GL.GL_CULL_FACE)
+        self.glState.depthMask(False)
         GL.glDrawArrays(GL.GL_TRIANGLES, 0, 36)
-        GL.glDepthMask(GL.GL_TRUE)
+        self.glState.depthMask(True)
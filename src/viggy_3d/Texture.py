@@ -1,7 +1,11 @@
+from typing import Optional
+
+import numpy as np
 import OpenGL.GL as GL
-from PIL import Image
 
 import viggy_3d.GLTFImporter as gltf
+from .GLState import GLState
+from .ModelData import TextureData
 
 
 GLMinFilter = {gltf.TextureMinFilter.NEAREST: GL.GL_NEAREST,
@@ -23,39 +27,39 @@ GLWrap = {gltf.TextureWrap.REPEAT: GL.GL_REPEAT,
 
 
 class Texture:
-    def __init__(self, texture: gltf.Texture):
+    def __init__(self, texture: TextureData, glState: Optional[GLState] = None):
+        """
+        uploads already decoded texture data, see TextureData.fromGLTF
+        :param glState: state tracker of the context the texture is drawn in, a tracker of its own if None,
+                        it is not used here so that the texture can be uploaded on another thread
+        """
+        self.glState = glState if glState is not None else GLState()
+
         self.textureID = GL.glGenTextures(1)
 
         GL.glBindTexture(GL.GL_TEXTURE_2D, self.textureID)
 
         # define texture image details
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GLMinFilter[texture.sampler.minFilter])
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GLMagFilter[texture.sampler.magFilter])
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GLWrap[texture.sampler.wrapS])
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GLWrap[texture.sampler.wrapT])
-
-        img = Image.open(texture.image.path)
-        # img = img.transpose(Image.FLIP_TOP_BOTTOM)  # needed due to internal storage format in GLSL
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GLMinFilter[texture.minFilter])
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GLMagFilter[texture.magFilter])
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GLWrap[texture.wrapS])
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GLWrap[texture.wrapT])
 
-        # send data to OpenGL
+        # send data to OpenGL, images without alpha are opaque
         GL.glTexImage2D(GL.GL_TEXTURE_2D,  # texture type
                         0,
-                        GL.GL_RGB,  # internal format
-                        img.width, img.height,  # dims
+                        GL.GL_RGBA8,  # internal format
+                        texture.width, texture.height,  # dims
                         0,  # border
-                        GL.GL_RGB,  # OpenGL format
+                        GL.GL_RGBA if texture.pixels.shape[2] == 4 else GL.GL_RGB,  # OpenGL format
                         GL.GL_UNSIGNED_BYTE,  # data type
-                        img.convert("RGB").tobytes())  # data
+                        np.ascontiguousarray(texture.pixels))  # data
 
-        if texture.sampler.minFilter in (gltf.TextureMinFilter.NEAREST_MIPMAP_NEAREST,
-                                         gltf.TextureMinFilter.LINEAR_MIPMAP_NEAREST,
-                                         gltf.TextureMinFilter.NEAREST_MIPMAP_LINEAR,
-                                         gltf.TextureMinFilter.LINEAR_MIPMAP_LINEAR):
+        if texture.isMipmapped:
             GL.glGenerateMipmap(GL.GL_TEXTURE_2D)  # needed because of GL_LINEAR_MIPMAP_LINEAR
 
     def bind(self, unit: int):
         """
         bind to unit before drawing
         """
-        GL.glActiveTexture(eval(f"GL.GL_TEXTURE{unit}"))
-        GL.glBindTexture(GL.GL_TEXTURE_2D, self.textureID)
+        self.glState.bindTexture(unit, GL.GL_TEXTURE_2D, self.textureID)
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import numpy as np
+import OpenGL.GL as GL
+
+from .GLState import GLState
+
+
+class TextureBuffer:
+    def __init__(self, glState: GLState, internalFormat: int):
+        """
+        a buffer texture whose data is replaced every frame, read in shaders with texelFetch
+        :param glState: state tracker of the context the texture is read in
+        :param internalFormat: format of the texels, such as GL_RGBA32F
+        """
+        self.glState = glState
+        self.internalFormat = internalFormat
+
+        # size of the storage in bytes
+        self.capacity = 0
+
+        self.glBuffer = GL.glGenBuffers(1)
+        self.texture = GL.glGenTextures(1)
+
+    def update(self, array: np.ndarray):
+        """
+        replaces the texels with the bytes of array, the storage only grows when array is larger than before
+        """
+        data = np.ascontiguousarray(array).view(np.uint8).reshape(-1)
+
+        GL.glBindBuffer(GL.GL_TEXTURE_BUFFER, self.glBuffer)
+        if len(data) > self.capacity:
+            self.capacity = len(data)
+            GL.glBufferData(GL.GL_TEXTURE_BUFFER, self.capacity, data, GL.GL_STREAM_DRAW)
+            # the texture refers to the storage, which is reallocated
+            self.glState.bindTexture(0, GL.GL_TEXTURE_BUFFER, self.texture)
+            GL.glTexBuffer(GL.GL_TEXTURE_BUFFER, self.internalFormat, self.glBuffer)
+        elif len(data):
+            # orphaning lets the driver keep reading the old storage in draws that are still in flight
+            GL.glBufferData(GL.GL_TEXTURE_BUFFER, self.capacity, None, GL.GL_STREAM_DRAW)
+            GL.glBufferSubData(GL.GL_TEXTURE_BUFFER, 0, len(data), data)
+        GL.glBindBuffer(GL.GL_TEXTURE_BUFFER, 0)
+
+    def bind(self, unit: int):
+        self.glState.bindTexture(unit, GL.GL_TEXTURE_BUFFER, self.texture)
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def composeTRS(translations: np.ndarray, rotations: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """
+    :param translations: (n, 3)
+    :param rotations: (n, 4) unit quaternions as (x, y, z, w) like glTF
+    :param scales: (n, 3)
+    :return: (n, 4, 4) matrices translation * rotation * scale in the layout of np.array(glm.mat4)
+    """
+    x, y, z, w = np.asarray(rotations, dtype=np.float32).T
+    sx, sy, sz = np.asarray(scales, dtype=np.float32).T
+    tx, ty, tz = np.asarray(translations, dtype=np.float32).T
+    xx, yy, zz = x * x, y * y, z * z
+    xy, xz, yz = x * y, x * z, y * z
+    wx, wy, wz = w * x, w * y, w * z
+    zero = np.zeros_like(x)
+    one = np.ones_like(x)
+    # the rotation matrix of the quaternion with its columns multiplied by the scales, built row by row
+    return np.stack(((1 - 2 * (yy + zz)) * sx, 2 * (xy - wz) * sy, 2 * (xz + wy) * sz, tx,
+                     2 * (xy + wz) * sx, (1 - 2 * (xx + zz)) * sy, 2 * (yz - wx) * sz, ty,
+                     2 * (xz - wy) * sx, 2 * (yz + wx) * sy, (1 - 2 * (xx + yy)) * sz, tz,
+                     zero, zero, zero, one), axis=1).reshape(-1, 4, 4)
+
+
+class TransformHierarchy:
+    def __init__(self):
+        """
+        local and world matrices of every node of a scene in contiguous (n, 4, 4) arrays in the layout of
+        np.array(glm.mat4). rows are in topological order, sorted by depth and within a depth by parent,
+        so that update computes every changed node of a depth with one batched matrix product
+        nodes are referred to by handles that stay valid when rows are reordered, rows[handle] is the row of a node
+        """
+        # by row
+        self.locals = np.zeros((0, 4, 4), dtype=np.float32)
+        self.worlds = np.zeros((0, 4, 4), dtype=np.float32)
+        self.parentRows = np.zeros(0, dtype=np.int64)  # -1 for roots
+        self.handles = np.zeros(0, dtype=np.int64)
+        # updateCount when the world matrix of each row last changed
+        self.updated = np.zeros(0, dtype=np.int64)
+        self.__dirty = np.zeros(0, dtype=bool)
+
+        # by handle, -1 for removed nodes and parents of roots
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.parents = np.zeros(0, dtype=np.int64)
+
+        # number of updates that changed any world matrix
+        self.updateCount = 0
+
+        # [start, end) rows of each depth, None when rows must be sorted again
+        self.__levels: Optional[List[Tuple[int, int]]] = []
+
+    def __len__(self) -> int:
+        return len(self.handles)
+
+    def __checkHandles(self, handles) -> np.ndarray:
+        """
+        :return: handles as an array
+        :raises ValueError: if any handle is not of a node in the hierarchy, such as a removed node
+        """
+        handles = np.asarray(handles, dtype=np.int64)
+        flat = handles.reshape(-1)
+        valid = (flat >= 0) & (flat < len(self.rows))
+        valid[valid] = self.rows[flat[valid]] >= 0
+        if not valid.all():
+            raise ValueError(f"handles {flat[~valid].tolist()} are not nodes of the hierarchy")
+        return handles
+
+    def add(self, transforms: np.ndarray, parents: Optional[np.ndarray] = None, parent: int = -1) -> np.ndarray:
+        """
+        adds a tree of nodes in one call
+        :param transforms: (n, 4, 4) local matrices
+        :param parents: index into transforms of the parent of each node, -1 for the top nodes
+        :param parent: handle of the node that the top nodes are children of, -1 to make them roots
+        :return: handles of the nodes
+        :raises ValueError: if parent was removed
+        """
+        if parent != -1:
+            self.__checkHandles(parent)
+        transforms = np.asarray(transforms, dtype=np.float32).reshape(-1, 4, 4)
+        count = len(transforms)
+        parents = np.full(count, -1, dtype=np.int64) if parents is None else np.asarray(parents, dtype=np.int64)
+        handles = np.arange(len(self.rows), len(self.rows) + count)
+
+        parentHandles = np.where(parents >= 0, handles[0] + parents if count else parents, parent)
+        rows = np.arange(len(self), len(self) + count)
+
+        self.rows = np.concatenate((self.rows, rows))
+        self.parents = np.concatenate((self.parents, parentHandles))
+        self.locals = np.concatenate((self.locals, transforms))
+        self.worlds = np.concatenate((self.worlds, transforms))
+        self.parentRows = np.concatenate((self.parentRows, np.where(parentHandles >= 0,
+                                                                    self.rows[parentHandles], -1)))
+        self.handles = np.concatenate((self.handles, handles))
+        self.updated = np.concatenate((self.updated, np.zeros(count, dtype=np.int64)))
+        self.__dirty = np.concatenate((self.__dirty, np.ones(count, dtype=bool)))
+        self.__levels = None
+        return handles
+
+    def setLocal(self, nodes, transforms: np.ndarray):
+        """
+        :param nodes: a handle or an array of them
+        :param transforms: (4, 4) or (n, 4, 4) local matrices
+        :raises ValueError: if a node was removed
+        """
+        rows = self.rows[self.__checkHandles(nodes)]
+        self.locals[rows] = transforms
+        self.__dirty[rows] = True
+
+    def setTRS(self, nodes: np.ndarray, translations: np.ndarray, rotations: np.ndarray, scales: np.ndarray):
+        """
+        sets the local matrices of many nodes from translations, (x, y, z, w) rotations and scales, see composeTRS
+        """
+        self.setLocal(nodes, composeTRS(translations, rotations, scales))
+
+    def local(self, node: int) -> np.ndarray:
+        return self.locals[self.rows[self.__checkHandles(node)]]
+
+    def world(self, node: int) -> np.ndarray:
+        """
+        world matrix of node as of the last update
+        """
+        return self.worlds[self.rows[self.__checkHandles(node)]]
+
+    def isAncestor(self, ancestor: int, node: int) -> bool:
+        while node >= 0:
+            if node == ancestor:
+                return True
+            node = int(self.parents[node])
+        return False
+
+    def setParent(self, nodes, parent: int, keepWorld: bool = False):
+        """
+        moves nodes with their subtrees under parent, -1 to make them roots
+        :param nodes: a handle or an array of them
+        :param keepWorld: if True, local matrices are changed so that world matrices stay the same,
+                          otherwise local matrices stay the same
+        :raises ValueError: if a node or parent was removed, or parent is in the subtree of a node
+        """
+        nodes = np.atleast_1d(self.__checkHandles(nodes))
+        if parent != -1:
+            self.__checkHandles(parent)
+        for node in nodes.tolist():
+            if self.isAncestor(node, parent):
+                raise ValueError(f"node {parent} is in the subtree of node {node}")
+
+        if keepWorld:
+            self.update()
+            parentWorld = np.eye(4) if parent < 0 else self.world(parent).astype(np.float64)
+            rows = self.rows[nodes]
+            self.locals[rows] = np.linalg.inv(parentWorld) @ self.worlds[rows].astype(np.float64)
+
+        self.parents[nodes] = parent
+        self.__dirty[self.rows[nodes]] = True
+        self.__levels = None
+
+    def remove(self, nodes):
+        """
+        removes nodes with their subtrees, their handles become invalid
+        :param nodes: a handle or an array of them
+        """
+        removed = np.zeros(len(self.rows), dtype=bool)
+        removed[nodes] = True
+        while True:
+            children = (self.parents >= 0) & ~removed & removed[np.maximum(self.parents, 0)]
+            if not children.any():
+                break
+            removed |= children
+
+        self.rows[removed] = -1
+        self.parents[removed] = -1
+        self.__levels = None
+
+    def __sort(self):
+        """
+        reorders rows by depth and within a depth by parent row, removed rows are dropped
+        """
+        handles = self.handles[self.rows[self.handles] >= 0]
+
+        # depth of every node, the nodes whose parent got a depth in the last round get the next one
+        depths = np.full(len(self.rows), -1, dtype=np.int64)
+        isRoot = self.parents[handles] < 0
+        depths[handles[isRoot]] = 0
+        pending = handles[~isRoot]
+        depth = 0
+        while len(pending):
+            depth += 1
+            ready = depths[self.parents[pending]] == depth - 1
+            depths[pending[ready]] = depth
+            pending = pending[~ready]
+
+        handles = handles[np.argsort(depths[handles], kind='stable')]
+        bounds = np.searchsorted(depths[handles], np.arange(depth + 2))
+        newRows = np.full(len(self.rows), -1, dtype=np.int64)
+        levels = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            level = handles[start:end]
+            if start > 0:
+                level = level[np.lexsort((level, newRows[self.parents[level]]))]
+                handles[start:end] = level
+            newRows[level] = np.arange(start, end)
+            levels.append((int(start), int(end)))
+
+        oldRows = self.rows[handles]
+        self.locals = self.locals[oldRows]
+        self.worlds = self.worlds[oldRows]
+        self.updated = self.updated[oldRows]
+        self.__dirty = self.__dirty[oldRows]
+        self.handles = handles
+        self.rows = newRows
+        parents = self.parents[handles]
+        self.parentRows = np.where(parents >= 0, newRows[np.maximum(parents, 0)], -1)
+        self.__levels = levels
+
+    def update(self) -> int:
+        """
+        recomputes the world matrices of the nodes whose local matrix or parent changed and of their subtrees
+        :return: number of world matrices recomputed
+        """
+        if self.__levels is None:
+            self.__sort()
+        dirty = self.__dirty
+        if not dirty.any():
+            return 0
+
+        # depths before the first changed row are up to date
+        firstDirty = int(np.argmax(dirty))
+        for start, end in self.__levels:
+            if end <= firstDirty:
+                continue
+            levelDirty = dirty[start:end]
+            if start == 0:
+                rows = np.nonzero(levelDirty)[0]
+                self.worlds[rows] = self.locals[rows]
+                continue
+
+            parentRows = self.parentRows[start:end]
+            levelDirty |= dirty[parentRows]
+            if levelDirty.all():
+                np.matmul(self.worlds[parentRows], self.locals[start:end], out=self.worlds[start:end])
+            elif levelDirty.any():
+                rows = start + np.nonzero(levelDirty)[0]
+                self.worlds[rows] = np.matmul(self.worlds[self.parentRows[rows]], self.locals[rows])
+
+        self.updateCount += 1
+        self.updated[dirty] = self.updateCount
+        count = int(dirty.sum())
+        dirty[:] = False
+        return count
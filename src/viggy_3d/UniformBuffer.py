@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import numpy as np
+import OpenGL.GL as GL
+
+
+# std140 layout of struct Light, every vec3 starts on a 16 byte boundary
+lightLayout = np.dtype({"names": ["position", "ambient", "diffuse", "specular", "k"],
+                        "formats": [(np.float32, 3)] * 5,
+                        "offsets": [0, 16, 32, 48, 64],
+                        "itemsize": 80})
+
+# std140 layout of the Frame uniform block declared by every shader, matrices are column major
+# clusterGrid and clusterDepth describe the clusters of LightClusters
+frameLayout = np.dtype({"names": ["view", "projection", "cameraPos", "light", "clusterGrid", "clusterDepth"],
+                        "formats": [(np.float32, (4, 4)), (np.float32, (4, 4)), (np.float32, 3), lightLayout,
+                                    (np.int32, 4), (np.float32, 4)],
+                        "offsets": [0, 64, 128, 144, 224, 240],
+                        "itemsize": 256})
+
+
+class UniformBuffer:
+    def __init__(self, layout: np.dtype, binding: int):
+        """
+        a uniform block backed by one buffer, filled from a single numpy record and uploaded with one call
+        :param layout: structured dtype with the std140 offsets of the block members
+        :param binding: uniform buffer binding point, Shader binds blocks to it by name
+        """
+        self.__array = np.zeros(1, dtype=layout)
+
+        # the record of the block, fields are written in place and sent by upload
+        self.data = self.__array[0]
+
+        self.binding = binding
+
+        self.glBuffer = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self.glBuffer)
+        GL.glBufferData(GL.GL_UNIFORM_BUFFER, self.__array.nbytes, None, GL.GL_DYNAMIC_DRAW)
+        GL.glBindBufferBase(GL.GL_UNIFORM_BUFFER, binding, self.glBuffer)
+
+    def upload(self):
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self.glBuffer)
+        GL.glBufferSubData(GL.GL_UNIFORM_BUFFER, 0, self.__array.nbytes, self.__array.view(np.uint8))
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from typing import Callable, Optional
+
+from concurrent.futures import Future
+import queue
+
+import OpenGL.GL as GL
+from PySide6.QtCore import QThread
+from PySide6.QtGui import QOpenGLContext, QOffscreenSurface
+
+
+class PendingUpload:
+    def __init__(self):
+        """
+        handle to a task submitted to an UploadThread
+        """
+        self.future = Future()
+        # fence inserted after the task, set by the upload thread before the future completes
+        self.fence = None
+
+    def isComplete(self) -> bool:
+        """
+        must be called from the rendering thread, True once the task has run and the GPU has finished its commands
+        raises the exception of the task if it failed
+        """
+        if not self.future.done():
+            return False
+
+        self.future.result()
+
+        if self.fence is not None:
+            status = GL.glClientWaitSync(self.fence, 0, 0)
+            if status not in (GL.GL_ALREADY_SIGNALED, GL.GL_CONDITION_SATISFIED):
+                return False
+            GL.glDeleteSync(self.fence)
+            self.fence = None
+
+        return True
+
+
+class UploadThread(QThread):
+    def __init__(self, shareContext: QOpenGLContext):
+        """
+        runs OpenGL uploads on a hidden context that shares objects with shareContext
+        must be created on the GUI thread, buffers and textures are shared but vertex arrays are not,
+        so vertex arrays must still be created on the rendering context
+        """
+        super().__init__()
+
+        self.surface = QOffscreenSurface()
+        self.surface.setFormat(shareContext.format())
+        self.surface.create()
+
+        self.context = QOpenGLContext()
+        self.context.setFormat(shareContext.format())
+        self.context.setShareContext(shareContext)
+        if not self.context.create():
+            raise RuntimeError("could not create an OpenGL context sharing with the widget")
+        self.context.moveToThread(self)
+
+        self.__tasks: queue.Queue = queue.Queue()
+
+        self.start()
+
+    def submit(self, task: Callable) -> PendingUpload:
+        """
+        queues task to be called with the upload context current
+        """
+        upload = PendingUpload()
+        self.__tasks.put((upload, task))
+        return upload
+
+    def run(self):
+        self.context.makeCurrent(self.surface)
+
+        while True:
+            item = self.__tasks.get()
+            if item is None:
+                break
+
+            upload, task = item
+            try:
+                result = task()
+                upload.fence = GL.glFenceSync(GL.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+                # the fence must reach the GPU before another context can wait on it
+                GL.glFlush()
+                upload.future.set_result(result)
+            except BaseException as e:
+                upload.future.set_exception(e)
+
+        self.context.doneCurrent()
+
+    def stop(self, timeout: Optional[int] = None):
+        """
+        finishes queued tasks and stops the thread
+        """
+        self.__tasks.put(None)
+        if timeout is None:
+            self.wait()
+        else:
+            self.wait(timeout)
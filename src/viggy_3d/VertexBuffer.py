@@ -1,37 +1,66 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
-
-if TYPE_CHECKING:
-    import numpy as np
+from typing import Optional
 
 import ctypes
+import time
 
+import numpy as np
 import OpenGL.GL as GL
 
+from .GLTFImporter import decodeStats
 
-class VertexBuffer:
-    def __init__(self, vertices: np.ndarray, normals: np.ndarray, texCoord: np.ndarray):
-        # create the OpenGL buffer
-        self.glBuffer = GL.glGenBuffers(1)
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.glBuffer)
 
-        # allocate memory
-        GL.glBufferData(GL.GL_ARRAY_BUFFER, vertices.nbytes + normals.nbytes + texCoord.nbytes, None, GL.GL_STATIC_DRAW)
+# OpenGL component types for each numpy component type
+GLComponentType = {np.dtype(np.int8): GL.GL_BYTE,
+                   np.dtype(np.uint8): GL.GL_UNSIGNED_BYTE,
+                   np.dtype(np.int16): GL.GL_SHORT,
+                   np.dtype(np.uint16): GL.GL_UNSIGNED_SHORT,
+                   np.dtype(np.int32): GL.GL_INT,
+                   np.dtype(np.uint32): GL.GL_UNSIGNED_INT,
+                   np.dtype(np.float32): GL.GL_FLOAT}
 
-        # fill memory
-        GL.glBufferSubData(GL.GL_ARRAY_BUFFER, 0, vertices.nbytes, vertices)
-        GL.glBufferSubData(GL.GL_ARRAY_BUFFER, vertices.nbytes, normals.nbytes, normals)
-        GL.glBufferSubData(GL.GL_ARRAY_BUFFER, vertices.nbytes + normals.nbytes, texCoord.nbytes, texCoord)
 
-        # glVertexAttribPointer(index, length of attribute, type, normalization, stride, (void*)offset)
+class VertexBuffer:
+    def __init__(self, array: np.ndarray, normalized: Optional[bool] = None):
+        """
+        uploads a single vertex attribute, the buffer can be shared by any number of meshes
+        integer attributes are uploaded as they are and converted to float by OpenGL when read
+        :param array: (count, size) array of attribute values, or (count, stride) bytes of interleaved vertices
+                      whose attributes are set with VertexLayout.setAttributes instead of setAttribute
+        :param normalized: whether integer components map to [0, 1] or [-1, 1],
+                           if None every integer attribute is normalized
+        """
+        # strided accessor views are packed before upload
+        start = time.perf_counter()
+        self.buffer = np.ascontiguousarray(array)
+        if self.buffer is not array:
+            decodeStats.add(self.buffer.nbytes, time.perf_counter() - start)
+
+        # number of components per vertex
+        self.size: int = self.buffer.shape[1] if self.buffer.ndim > 1 else 1
+        self.type = GLComponentType[self.buffer.dtype]
+        # KHR_mesh_quantization allows integer attributes that are not normalized, such as quantized positions
+        if normalized is None:
+            normalized = self.buffer.dtype != np.float32
+        self.normalized = GL.GL_TRUE if normalized and self.buffer.dtype != np.float32 else GL.GL_FALSE
 
-        GL.glEnableVertexAttribArray(0)
-        GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, GL.GL_FALSE, 3 * 4, ctypes.c_void_p(0))
+        # create the OpenGL buffer
+        self.glBuffer = GL.glGenBuffers(1)
+        self.bind()
+        start = time.perf_counter()
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, self.buffer.nbytes, self.buffer, GL.GL_STATIC_DRAW)
+        decodeStats.addUpload(self.buffer.nbytes, time.perf_counter() - start)
 
-        GL.glEnableVertexAttribArray(1)
-        GL.glVertexAttribPointer(1, 3, GL.GL_FLOAT, GL.GL_FALSE, 3 * 4, ctypes.c_void_p(vertices.nbytes))
+    def bind(self):
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.glBuffer)
 
-        GL.glEnableVertexAttribArray(2)
-        GL.glVertexAttribPointer(
-            2, 2, GL.GL_FLOAT, GL.GL_FALSE, 2 * 4, ctypes.c_void_p(vertices.nbytes + normals.nbytes))
+    def setAttribute(self, index: int):
+        """
+        sources vertex attribute index from this buffer, the target vertex array must be bound
+        """
+        self.bind()
+        GL.glEnableVertexAttribArray(index)
+        # glVertexAttribPointer(index, length of attribute, type, normalization, stride, (void*)offset)
+        GL.glVertexAttribPointer(index, self.size, self.type, self.normalized,
+                                 self.size * self.buffer.itemsize, ctypes.c_void_p(0))
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+import ctypes
+
+import numpy as np
+import OpenGL.GL as GL
+
+
+class VertexFormat:
+    def __init__(self, dtype, components: int, glSize: int, glType: int, normalized: bool, glslType: str,
+                 encode: Callable[[np.ndarray], np.ndarray], decode: Callable[[np.ndarray], np.ndarray],
+                 glslDecode: Optional[str] = None, fits: Optional[Callable[[np.ndarray, float], bool]] = None,
+                 fallback: Optional[str] = None):
+        """
+        encoding of one vertex attribute, every encoding takes a multiple of 4 bytes
+        :param dtype: numpy type of the stored components
+        :param components: number of components stored per vertex
+        :param glSize: size passed to glVertexAttribPointer
+        :param glslType: type of the value the vertex shader gets
+        :param encode: float32 (n, k) values to (n, components) stored values
+        :param decode: stored values back to float32 values, as the vertex shader sees them
+        :param glslDecode: GLSL expression of the value with the input in place of {},
+                           None if OpenGL converts the input to the value
+        :param fits: whether values are encoded within a tolerance relative to their extent, always if None
+        :param fallback: format used when values do not fit, it must give the shader the same input
+        """
+        self.dtype = np.dtype(dtype)
+        self.components = components
+        self.glSize = glSize
+        self.glType = glType
+        self.normalized = normalized
+        self.glslType = glslType
+        self.encode = encode
+        self.decode = decode
+        self.glslDecode = glslDecode
+        self.fits = fits
+        self.fallback = fallback
+
+    @property
+    def nbytes(self) -> int:
+        return self.dtype.itemsize * self.components
+
+    @property
+    def glslInputType(self) -> str:
+        """
+        type of the vertex shader input, the decode function turns it into glslType
+        """
+        return self.glslType if self.glslDecode is None else "vec2"
+
+
+def halfFits(values: np.ndarray, tolerance: float) -> bool:
+    with np.errstate(over='ignore'):
+        errors = np.abs(values.astype(np.float16).astype(np.float32) - values)
+    extent = float((values.max(axis=0) - values.min(axis=0)).max()) if len(values) else 0.0
+    return bool(np.all(errors <= tolerance * max(extent, 1e-30)))
+
+
+def padded(values: np.ndarray, components: int) -> np.ndarray:
+    result = np.zeros((len(values), components), dtype=np.float32)
+    result[:, :values.shape[1]] = values
+    return result
+
+
+def normalizedRows(values: np.ndarray) -> np.ndarray:
+    lengths = np.linalg.norm(values, axis=1, keepdims=True)
+    return values / np.where(lengths > 0, lengths, 1)
+
+
+def octEncode(normals: np.ndarray) -> np.ndarray:
+    """
+    octahedral encoding of directions into 2 signed normalized 16 bit components
+    """
+    normals = normals.astype(np.float64)
+    normals = normals / np.maximum(np.abs(normals).sum(axis=1, keepdims=True), 1e-30)
+    xy = normals[:, :2]
+    signs = np.where(xy >= 0, 1.0, -1.0)
+    # the lower half of the octahedron is folded over the diagonals
+    xy = np.where(normals[:, 2:] < 0, (1 - np.abs(xy[:, ::-1])) * signs, xy)
+    return np.round(np.clip(xy, -1, 1) * 32767).astype(np.int16)
+
+
+def octDecode(encoded: np.ndarray) -> np.ndarray:
+    xy = np.maximum(encoded.astype(np.float32) / 32767, -1)
+    normals = np.concatenate((xy, 1 - np.abs(xy).sum(axis=1, keepdims=True)), axis=1)
+    t = np.maximum(-normals[:, 2:], 0)
+    normals[:, :2] += np.where(normals[:, :2] >= 0, -t, t)
+    return normalizedRows(normals).astype(np.float32)
+
+
+def packInt2101010(normals: np.ndarray) -> np.ndarray:
+    """
+    packs directions into GL_INT_2_10_10_10_REV with x in the lowest bits and w = 0
+    """
+    components = np.round(np.clip(normalizedRows(normals), -1, 1) * 511).astype(np.int64) & 0x3FF
+    packed = components[:, 0] | (components[:, 1] << 10) | (components[:, 2] << 20)
+    return packed.astype(np.uint32).view(np.int32)[:, None]
+
+
+def unpackInt2101010(packed: np.ndarray) -> np.ndarray:
+    bits = packed.reshape(-1).view(np.uint32).astype(np.int64)
+    components = np.stack([(bits >> shift) & 0x3FF for shift in (0, 10, 20)], axis=1)
+    components = np.where(components >= 512, components - 1024, components)
+    return np.maximum(components / 511, -1).astype(np.float32)
+
+
+GLSLFunctions = {"octDecode": """vec3 octDecode(vec2 e)
+{
+    vec3 n = vec3(e, 1.0 - abs(e.x) - abs(e.y));
+    float t = max(-n.z, 0.0);
+    n.xy += vec2(n.x >= 0.0 ? -t : t, n.y >= 0.0 ? -t : t);
+    return normalize(n);
+}
+"""}
+
+
+# every encoding that layouts can use, by name
+vertexFormats: Dict[str, VertexFormat] = {
+    "float32x3": VertexFormat(np.float32, 3, 3, GL.GL_FLOAT, False, "vec3",
+                              lambda values: values.astype(np.float32), lambda stored: stored),
+    "float32x2": VertexFormat(np.float32, 2, 2, GL.GL_FLOAT, False, "vec2",
+                              lambda values: values.astype(np.float32), lambda stored: stored),
+    # the fourth component pads the attribute to 8 bytes and is ignored by the vec3 input
+    "float16x4": VertexFormat(np.float16, 4, 4, GL.GL_HALF_FLOAT, False, "vec3",
+                              lambda values: padded(values, 4).astype(np.float16),
+                              lambda stored: stored[:, :3].astype(np.float32),
+                              fits=halfFits, fallback="float32x3"),
+    "float16x2": VertexFormat(np.float16, 2, 2, GL.GL_HALF_FLOAT, False, "vec2",
+                              lambda values: values.astype(np.float16), lambda stored: stored.astype(np.float32),
+                              fits=halfFits, fallback="float32x2"),
+    "unorm16x2": VertexFormat(np.uint16, 2, 2, GL.GL_UNSIGNED_SHORT, True, "vec2",
+                              lambda values: np.round(np.clip(values, 0, 1) * 65535).astype(np.uint16),
+                              lambda stored: (stored / np.float32(65535)).astype(np.float32),
+                              fits=lambda values, tolerance: bool(np.all((values >= 0) & (values <= 1))),
+                              fallback="float16x2"),
+    "int2_10_10_10": VertexFormat(np.int32, 1, 4, GL.GL_INT_2_10_10_10_REV, True, "vec3",
+                                  packInt2101010, unpackInt2101010),
+    "oct16": VertexFormat(np.int16, 2, 2, GL.GL_SHORT, True, "vec3", octEncode, octDecode,
+                          glslDecode="octDecode({})"),
+}
+
+
+class VertexLayout:
+    # line of a vertex shader that is replaced by the attribute inputs and decode functions of a layout
+    marker = "#pragma vertex_layout"
+
+    def __init__(self, *attributes: Tuple[str, int, str], tolerance: float = 2 ** -12):
+        """
+        vertex attributes interleaved in one buffer in the given order, declared as (name, location, format),
+        name is one of position, normal and texCoord and format a key of vertexFormats
+        vertex shaders get each attribute from a function such as vec3 vertexPosition()
+        :param tolerance: largest error of a lossy format relative to the extent of the values,
+                          attributes that do not fit use the fallback of their format
+        """
+        for _, _, formatName in attributes:
+            if formatName not in vertexFormats:
+                raise ValueError(f"unknown vertex format {formatName}")
+        self.attributes: List[Tuple[str, int, str]] = [tuple(attribute) for attribute in attributes]
+        self.tolerance = tolerance
+
+    @property
+    def key(self) -> str:
+        return ",".join(f"{name}:{location}:{formatName}" for name, location, formatName in self.attributes) \
+            + f";{self.tolerance}"
+
+    def formatsFor(self, values: Dict[str, np.ndarray]) -> List[List]:
+        """
+        :param values: float32 values of each attribute by name
+        :return: [name, location, format] of each attribute, with fallbacks where the values do not fit
+        """
+        attributes = []
+        for name, location, formatName in self.attributes:
+            vertexFormat = vertexFormats[formatName]
+            while vertexFormat.fits is not None and not vertexFormat.fits(values[name], self.tolerance):
+                formatName = vertexFormat.fallback
+                vertexFormat = vertexFormats[formatName]
+            attributes.append([name, location, formatName])
+        return attributes
+
+    @staticmethod
+    def stride(attributes: List[List]) -> int:
+        return sum(vertexFormats[formatName].nbytes for _, _, formatName in attributes)
+
+    @staticmethod
+    def encode(values: Dict[str, np.ndarray], attributes: List[List]) -> np.ndarray:
+        """
+        :param attributes: from formatsFor
+        :return: (n, stride) bytes of the interleaved vertices
+        """
+        count = len(next(iter(values.values())))
+        vertices = np.empty((count, VertexLayout.stride(attributes)), dtype=np.uint8)
+        offset = 0
+        for name, _, formatName in attributes:
+            vertexFormat = vertexFormats[formatName]
+            encoded = np.ascontiguousarray(vertexFormat.encode(values[name]), dtype=vertexFormat.dtype)
+            vertices[:, offset: offset + vertexFormat.nbytes] = encoded.view(np.uint8).reshape(count, -1)
+            offset += vertexFormat.nbytes
+        return vertices
+
+    @staticmethod
+    def decode(vertices: np.ndarray, attributes: List[List], attributeName: str) -> np.ndarray:
+        """
+        :return: float32 values of one attribute of interleaved vertices, as the vertex shader sees them
+        """
+        offset = 0
+        for name, _, formatName in attributes:
+            vertexFormat = vertexFormats[formatName]
+            if name == attributeName:
+                stored = np.ascontiguousarray(vertices[:, offset: offset + vertexFormat.nbytes])
+                return vertexFormat.decode(stored.view(vertexFormat.dtype).reshape(len(vertices), -1))
+            offset += vertexFormat.nbytes
+        raise KeyError(attributeName)
+
+    @staticmethod
+    def setAttributes(attributes: List[List]):
+        """
+        sources the attributes from the bound array buffer of interleaved vertices,
+        the target vertex array must be bound
+        """
+        stride = VertexLayout.stride(attributes)
+        offset = 0
+        for _, location, formatName in attributes:
+            vertexFormat = vertexFormats[formatName]
+            GL.glEnableVertexAttribArray(location)
+            GL.glVertexAttribPointer(location, vertexFormat.glSize, vertexFormat.glType,
+                                     GL.GL_TRUE if vertexFormat.normalized else GL.GL_FALSE, stride,
+                                     ctypes.c_void_p(offset))
+            offset += vertexFormat.nbytes
+
+    def glsl(self) -> str:
+        """
+        GLSL inputs of the attributes and the functions that decode them, replaces marker in vertex shaders
+        """
+        lines = []
+        functions = []
+        for name, location, formatName in self.attributes:
+            vertexFormat = vertexFormats[formatName]
+            lines.append(f"layout (location = {location}) in {vertexFormat.glslInputType} v_{name};")
+            value = f"v_{name}"
+            if vertexFormat.glslDecode is not None:
+                value = vertexFormat.glslDecode.format(value)
+                functionName = vertexFormat.glslDecode.split("(")[0]
+                if GLSLFunctions[functionName] not in functions:
+                    functions.append(GLSLFunctions[functionName])
+            functions.append(f"{vertexFormat.glslType} vertex{name[0].upper() + name[1:]}()\n"
+                             f"{{\n    return {value};\n}}\n")
+        return "\n".join(lines) + "\n\n" + "\n".join(functions)
+
+
+# separate float32 buffers as the glTF file has them, what meshes without a layout are drawn with
+defaultLayout = VertexLayout(("position", 0, "float32x3"), ("normal", 1, "float32x3"), ("texCoord", 2, "float32x2"))
+
+# 16 bytes per vertex instead of 32, half float positions, octahedral normals and normalized 16 bit UVs
+compactLayout = VertexLayout(("position", 0, "float16x4"), ("normal", 1, "oct16"), ("texCoord", 2, "unorm16x2"))
@@ -0,0 +1 @@
+from .importer import loadIndexedObject, loadObject
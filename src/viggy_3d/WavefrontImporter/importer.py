@@ -1,12 +1,242 @@
 """
-Incomplete Functionality
+Wavefront .obj importer for positions, UVs, normals and polygon faces, materials and groups are ignored,
+see ModelData.fromOBJ to draw .obj files
 """
 from __future__ import annotations
 
+from typing import List, Optional, Tuple
+
+from enum import IntEnum
+
 import numpy as np
 
 
-# TODO: load other filetypes
+# whitespace bytes, tokens are separated by any of them
+isSpace = np.zeros(256, dtype=bool)
+isSpace[[ord(' '), ord('\t'), ord('\r'), ord('\n'), ord('\v'), ord('\f')]] = True
+
+isDigit = np.zeros(256, dtype=bool)
+isDigit[ord('0'): ord('9') + 1] = True
+
+slashToSpace = bytes.maketrans(b"/", b" ")
+
+
+class LineType(IntEnum):
+    OTHER = 0
+    POSITION = 1
+    UV = 2
+    NORMAL = 3
+    FACE = 4
+
+
+# the keyword that starts each parsed line type
+keywords = {LineType.POSITION: b"v", LineType.UV: b"vt", LineType.NORMAL: b"vn", LineType.FACE: b"f"}
+
+
+def _tokens(chars: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param chars: lines each ending with a newline
+    :return: True for every byte that starts a whitespace separated token and the number of tokens in every line
+    """
+    space = isSpace[chars]
+    start = ~space
+    start[1:] &= space[:-1]
+    tokensBefore = np.searchsorted(np.flatnonzero(start), np.flatnonzero(chars == ord('\n')))
+    return start, np.diff(tokensBefore, prepend=0)
+
+
+def _parseFloats(chars: np.ndarray, lineCount: int, width: int) -> np.ndarray:
+    """
+    parses the first width numbers of every line, missing numbers are 0
+    :param chars: lines with their keyword removed, each ending with a newline
+    :return: (lineCount, width) float32 array
+    """
+    if lineCount == 0:
+        return np.zeros((0, width), dtype=np.float32)
+
+    _, counts = _tokens(chars)
+
+    values = np.fromstring(chars.tobytes(), dtype=np.float64, sep=' ')
+    if len(values) != counts.sum():
+        raise ValueError("malformed number in .obj file")
+    if len(values) == 0:
+        return np.zeros((lineCount, width), dtype=np.float32)
+
+    column = np.arange(width)
+    index = np.minimum((np.cumsum(counts) - counts)[:, None] + column, len(values) - 1)
+    return np.where(column < counts[:, None], values[index], 0).astype(np.float32)
+
+
+def _parseFaces(chars: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param chars: face lines with their keyword removed, each ending with a newline
+    :return: (corners, 3) array of the position, UV and normal index of every corner as written,
+             0 where an index is missing, and the number of corners in every line
+    """
+    cornerStart, sizes = _tokens(chars)
+    cornerStarts = np.flatnonzero(cornerStart)
+
+    # every run of digits is one index, slashes separate the indices of a corner and empty fields are skipped
+    digit = isDigit[chars].view(np.int8)
+    edges = np.diff(digit, prepend=np.int8(0))
+    runStarts = np.flatnonzero(edges == 1)
+
+    values = np.fromstring(chars.tobytes().translate(slashToSpace), dtype=np.int64, sep=' ')
+    if len(values) != len(runStarts):
+        raise ValueError("malformed face in .obj file")
+
+    # the field of an index is the number of slashes between the start of its corner and itself
+    corner = np.cumsum(cornerStart, dtype=np.int32)[runStarts] - 1
+    slashes = np.cumsum(chars == ord('/'), dtype=np.int32)
+    field = slashes[runStarts] - slashes[cornerStarts[corner]]
+
+    corners = np.zeros((len(cornerStarts), 3), dtype=np.int64)
+    corners[corner, np.minimum(field, 2)] = values
+    return corners, sizes
+
+
+def _resolve(indices: np.ndarray, countBefore: np.ndarray) -> np.ndarray:
+    """
+    converts 1 based and negative, relative obj indices to 0 based indices, missing indices become -1
+    :param countBefore: number of elements defined before the line of each index
+    """
+    return np.where(indices > 0, indices - 1, np.where(indices < 0, countBefore + indices, -1))
+
+
+def _readChunks(obj_file: str, chunkSize: int):
+    """
+    yields uint8 arrays of whole lines, each ending with a newline
+    """
+    with open(obj_file, 'rb') as f:
+        remainder = b""
+        while True:
+            chunk = f.read(chunkSize)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            end = chunk.rfind(b'\n') + 1
+            remainder = chunk[end:]
+            if end:
+                yield np.frombuffer(chunk, dtype=np.uint8, count=end)
+
+        if remainder:
+            yield np.frombuffer(remainder + b'\n', dtype=np.uint8)
+
+
+def loadIndexedObject(obj_file: str, UV=True, normals=True, chunkSize: int = 1 << 24) \
+        -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray], np.ndarray]:
+    """
+    reads a .obj file in chunks of chunkSize bytes and parses every chunk with numpy
+    polygons are triangulated as fans and corners with the same position, UV and normal share a vertex
+    :param obj_file: .obj file
+    :param UV: whether to include UVs
+    :param normals: whether to include normals
+    :return: (n, 3) positions, (n, 2) UVs and (n, 3) normals as float32 arrays and a uint32 array of
+             triangle indices, ready for VertexBuffer and IndexBuffer
+             UVs and normals are None if not included or not in the file, missing values of corners are 0
+    """
+    elements: List[List[np.ndarray]] = [[], [], []]
+    corners: List[np.ndarray] = []
+    sizes: List[np.ndarray] = []
+
+    # number of positions, UVs and normals in previous chunks
+    totals = np.zeros(3, dtype=np.int64)
+
+    for chars in _readChunks(obj_file, chunkSize):
+        lineEnds = np.flatnonzero(chars == ord('\n'))
+        lineStarts = np.concatenate(([0], lineEnds[:-1] + 1))
+
+        # the keyword is the first token of a line and is followed by whitespace
+        blank = isSpace[chars] & (chars != ord('\n'))
+        notBlank = np.flatnonzero(~blank)
+        keywordStarts = notBlank[np.searchsorted(notBlank, lineStarts)]
+        first, second, third = (chars[np.minimum(keywordStarts + i, len(chars) - 1)] for i in range(3))
+        lineTypes = np.full(len(lineStarts), LineType.OTHER, dtype=np.int8)
+        lineTypes[(first == ord('v')) & isSpace[second]] = LineType.POSITION
+        lineTypes[(first == ord('v')) & (second == ord('t')) & isSpace[third]] = LineType.UV
+        lineTypes[(first == ord('v')) & (second == ord('n')) & isSpace[third]] = LineType.NORMAL
+        lineTypes[(first == ord('f')) & isSpace[second]] = LineType.FACE
+
+        # the keywords are blanked so that lines of one type can be gathered and parsed together
+        chars = chars.copy()
+        for lineType, keyword in keywords.items():
+            starts = keywordStarts[lineTypes == lineType]
+            chars[starts[:, None] + np.arange(len(keyword))] = ord(' ')
+        lineLengths = lineEnds - lineStarts + 1
+        charTypes = np.repeat(lineTypes, lineLengths)
+
+        # comments run from a # to the end of the line and are blanked too
+        hashes = np.cumsum(chars == ord('#'), dtype=np.int32)
+        hashesBefore = np.repeat(hashes[lineStarts] - (chars[lineStarts] == ord('#')), lineLengths)
+        chars[(hashes > hashesBefore) & (chars != ord('\n'))] = ord(' ')
+
+        def gather(lineType: int) -> Tuple[np.ndarray, int]:
+            return chars[charTypes == lineType], int(np.count_nonzero(lineTypes == lineType))
+
+        elements[0].append(_parseFloats(*gather(LineType.POSITION), 3))
+        if UV:
+            elements[1].append(_parseFloats(*gather(LineType.UV), 2))
+        if normals:
+            elements[2].append(_parseFloats(*gather(LineType.NORMAL), 3))
+
+        faceChars, faceCount = gather(LineType.FACE)
+        if faceCount:
+            chunkCorners, chunkSizes = _parseFaces(faceChars)
+
+            # relative indices count back from the last element defined before the face
+            faceLines = np.flatnonzero(lineTypes == LineType.FACE)
+            for column, lineType in enumerate((LineType.POSITION, LineType.UV, LineType.NORMAL)):
+                countBefore = totals[column] + np.cumsum(lineTypes == lineType)[faceLines]
+                chunkCorners[:, column] = _resolve(chunkCorners[:, column], np.repeat(countBefore, chunkSizes))
+
+            corners.append(chunkCorners)
+            sizes.append(chunkSizes)
+
+        totals += [np.count_nonzero(lineTypes == lineType)
+                   for lineType in (LineType.POSITION, LineType.UV, LineType.NORMAL)]
+
+    positions = np.concatenate(elements[0]) if elements[0] else np.zeros((0, 3), dtype=np.float32)
+    uvs = np.concatenate(elements[1]) if UV and totals[1] else None
+    normalVectors = np.concatenate(elements[2]) if normals and totals[2] else None
+
+    corners = np.concatenate(corners) if corners else np.zeros((0, 3), dtype=np.int64)
+    sizes = np.concatenate(sizes) if sizes else np.zeros(0, dtype=np.int64)
+
+    # fan triangulation, polygons with fewer than 3 corners are skipped
+    triangleCounts = np.maximum(sizes - 2, 0)
+    polygonStarts = np.repeat(np.cumsum(sizes) - sizes, triangleCounts)
+    k = np.arange(len(polygonStarts)) - np.repeat(np.cumsum(triangleCounts) - triangleCounts, triangleCounts)
+    triangles = np.stack((polygonStarts, polygonStarts + k + 1, polygonStarts + k + 2), axis=1)
+
+    # corners that are not included or not in the file do not split vertices
+    if uvs is None:
+        corners[:, 1] = -1
+    if normalVectors is None:
+        corners[:, 2] = -1
+    if corners.size and ((corners[:, 0] < 0).any() or corners.min() < -1 or (corners.max(axis=0) >= totals).any()):
+        raise IndexError("index out of range in .obj file")
+
+    # every distinct (position, UV, normal) triple becomes one vertex
+    counts = totals + 1
+    if len(corners) == 0:
+        first, inverse = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    elif counts[0] * counts[1] * counts[2] < 1 << 62:
+        keys = ((corners[:, 0] + 1) * counts[1] + corners[:, 1] + 1) * counts[2] + corners[:, 2] + 1
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    else:
+        _, first, inverse = np.unique(corners, axis=0, return_index=True, return_inverse=True)
+    vertices = corners[first]
+
+    def select(array: Optional[np.ndarray], column: int) -> Optional[np.ndarray]:
+        if array is None:
+            return None
+        index = vertices[:, column]
+        return np.where((index >= 0)[:, None], array[np.maximum(index, 0)], 0).astype(np.float32)
+
+    return select(positions, 0), select(uvs, 1), select(normalVectors, 2), \
+        inverse.reshape(-1)[triangles.reshape(-1)].astype(np.uint32)
+
+
 def loadObject(obj_file: str, UV=True, normals=True) -> np.ndarray:
     """
     :param obj_file: .obj file
@@ -14,32 +244,13 @@ def loadObject(obj_file: str, UV=True, normals=True) -> np.ndarray:
     :param normals: whether to include normals
     :return: returns a vertex array of format (x, y, z, [U, V], [n.x, n.y, n.z]) for each vertex in each triangle
     """
-    vertices = []
-
-    obj_vertices = []
-    obj_UV = []
-    obj_normals = []
-
-    with open(obj_file, 'r') as f:
-        line = f.readline()
-
-        while line:
-            if line[:2] == 'vt':
-                if UV:
-                    obj_UV.append([float(i) for i in line[3:].split(' ')])
-            elif line[:2] == 'vn':
-                if normals:
-                    obj_normals.append([float(i) for i in line[3:].split(' ')])
-            elif line[0] == 'v':
-                obj_vertices.append([float(i) for i in line[2:].split(' ')])
-            elif line[0] == 'f':
-                for data in line[2:].split(' '):
-                    i, j, k = [int(i) for i in data.split('/')]
-                    vertices.extend([*obj_vertices[i - 1]])
-                    if UV:
-                        vertices.extend([*obj_UV[j - 1]])
-                    if normals:
-                        vertices.extend([*obj_normals[k - 1]])
-            line = f.readline()
-
-    return np.array(vertices, dtype=np.float32)
+    positions, uvs, normalVectors, indices = loadIndexedObject(obj_file, UV, normals)
+
+    columns = [positions]
+    if UV:
+        columns.append(uvs if uvs is not None else np.zeros((len(positions), 2), dtype=np.float32))
+    if normals:
+        columns.append(normalVectors if normalVectors is not None else
+                       np.zeros((len(positions), 3), dtype=np.float32))
+
+    return np.hstack(columns)[indices].reshape(-1)
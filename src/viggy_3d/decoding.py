@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from typing import Iterable, List, Optional
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import numpy as np
+from PIL import Image
+
+
+# PIL releases the GIL while decoding, so images are decoded in parallel on this pool
+_workers: Optional[int] = None
+_pool: Optional[ThreadPoolExecutor] = None
+# ModelLoader workers decode images at the same time, so the pool is created and replaced under this lock
+_poolLock = threading.Lock()
+
+
+def setWorkers(n: Optional[int]):
+    """
+    sets the number of image decoding threads, None uses the ThreadPoolExecutor default
+    call it while no images are being decoded, the old pool accepts no new images
+    """
+    global _workers, _pool
+    with _poolLock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+        _workers = n
+
+
+def getPool() -> ThreadPoolExecutor:
+    global _pool
+    with _poolLock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="viggy_3d-decode")
+        return _pool
+
+
+def decodeImage(path, mode: str = "RGB") -> np.ndarray:
+    """
+    :param path: path or file like object of a png or jpg image
+    :param mode: "RGB" or "RGBA", images without alpha get an opaque alpha channel
+    :return: (height, width, 3) array of RGB bytes or (height, width, 4) array of RGBA bytes
+    """
+    with Image.open(path) as img:
+        return np.asarray(img.convert(mode))
+
+
+def decodeImages(paths: Iterable, mode: str = "RGB") -> List[np.ndarray]:
+    """
+    decodes every image on the decoding pool, results are in the same order as paths
+    """
+    return list(getPool().map(lambda path: decodeImage(path, mode), paths))
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from typing import List, Tuple
+
+import numpy as np
+
+
+# number of vertices in the post transform cache that orders are optimized for and ACMR is measured with
+cacheSize = 16
+
+
+def acmr(indices: np.ndarray, size: int = cacheSize) -> float:
+    """
+    average cache miss ratio, vertices transformed per triangle when a FIFO cache of size vertices is simulated
+    1.0 or less is good and 0.5 is the best possible for large regular meshes, 3.0 is the worst
+    :param indices: vertex indices of the triangles
+    """
+    indices = np.asarray(indices).reshape(-1)
+    if len(indices) < 3:
+        return 0.0
+
+    # whether an index misses depends on the misses before it, so the cache is simulated index by index over a list.
+    # miss count when each vertex last entered the cache, it is still cached while fewer misses followed
+    inserted = [-size] * (int(indices.max()) + 1)
+    misses = 0
+    for v in indices.tolist():
+        if misses - inserted[v] >= size:
+            inserted[v] = misses
+            misses += 1
+    return misses / (len(indices) // 3)
+
+
+def adjacency(triangles: np.ndarray, vertexCount: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param triangles: (n, 3) vertex indices
+    :return: triangles around each vertex as offsets with vertexCount + 1 entries and the triangle indices
+    """
+    corners = triangles.reshape(-1)
+    order = np.argsort(corners, kind='stable')
+    offsets = np.zeros(vertexCount + 1, dtype=np.int64)
+    np.cumsum(np.bincount(corners, minlength=vertexCount), out=offsets[1:])
+    return offsets, order // 3
+
+
+def tipsify(triangles: np.ndarray, vertexCount: int, size: int = cacheSize) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Tipsify triangle order for the post transform cache, from Sander, Nehab and Barczak,
+    Fast Triangle Reordering for Vertex Locality and Reduced Overdraw. the next vertex whose remaining
+    triangles are emitted is the one among the last emitted vertices that is still cached,
+    the walk jumps elsewhere at dead ends
+    :param triangles: (n, 3) vertex indices
+    :return: new order of the triangles and the positions in it where a jump starts a new cluster
+    """
+    # the walk is sequential, it runs over lists made once from the numpy adjacency, which index fastest one by one
+    offsets, neighbours = adjacency(triangles, vertexCount)
+    offsets = offsets.tolist()
+    neighbours = neighbours.tolist()
+    corners = triangles.tolist()
+
+    live = np.diff(offsets).tolist()
+    stamps = [0] * vertexCount
+    emitted = [False] * len(corners)
+    time = size + 1
+    deadEnds: List[int] = []
+    cursor = 0
+
+    order: List[int] = []
+    clusters: List[int] = []
+
+    def skipDeadEnd() -> int:
+        nonlocal cursor
+        while deadEnds:
+            v = deadEnds.pop()
+            if live[v] > 0:
+                return v
+        while cursor < vertexCount:
+            if live[cursor] > 0:
+                return cursor
+            cursor += 1
+        return -1
+
+    fan = -1
+    while True:
+        if fan < 0:
+            fan = skipDeadEnd()
+            if fan < 0:
+                break
+            clusters.append(len(order))
+
+        candidates = []
+        for t in neighbours[offsets[fan]: offsets[fan + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            order.append(t)
+            for v in corners[t]:
+                deadEnds.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - stamps[v] > size:
+                    stamps[v] = time
+                    time += 1
+
+        # the candidate that stays cached the longest while its remaining triangles are emitted
+        fan = -1
+        best = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = time - stamps[v] if time - stamps[v] + 2 * live[v] <= size else 0
+                if priority > best:
+                    best = priority
+                    fan = v
+
+    return np.array(order, dtype=np.int64), np.array(clusters, dtype=np.int64)
+
+
+def sortClusters(positions: np.ndarray, triangles: np.ndarray, clusters: np.ndarray) -> np.ndarray:
+    """
+    orders clusters of triangles so that those facing away from the center of the mesh come first,
+    they are the most likely to hide the others from any direction, which reduces overdraw
+    :param triangles: (n, 3) vertex indices in cluster order
+    :param clusters: first triangle of each cluster
+    :return: new order of the triangles
+    """
+    if len(clusters) < 2:
+        return np.arange(len(triangles))
+
+    corners = positions[triangles].astype(np.float64)
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    areas = np.linalg.norm(normals, axis=1)
+    centroids = corners.mean(axis=1)
+
+    center = (centroids * areas[:, None]).sum(axis=0) / max(areas.sum(), 1e-30)
+    clusterNormals = np.add.reduceat(normals, clusters)
+    clusterAreas = np.maximum(np.add.reduceat(areas, clusters), 1e-30)
+    clusterCentroids = np.add.reduceat(centroids * areas[:, None], clusters) / clusterAreas[:, None]
+    outwardness = ((clusterCentroids - center) * clusterNormals).sum(axis=1) \
+        / np.maximum(np.linalg.norm(clusterNormals, axis=1), 1e-30)
+
+    ends = np.append(clusters[1:], len(triangles))
+    return np.concatenate([np.arange(clusters[i], ends[i]) for i in np.argsort(-outwardness, kind='stable')])
+
+
+def optimizeVertexCache(positions: np.ndarray, indices: np.ndarray, size: int = cacheSize) -> np.ndarray:
+    """
+    :param positions: (n, 3) positions of the vertices that indices refer to
+    :return: the triangles of indices in Tipsify order with clusters sorted against overdraw
+    """
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    if len(triangles) == 0:
+        return np.asarray(indices).reshape(-1)
+
+    order, clusters = tipsify(triangles, int(triangles.max()) + 1, size)
+    triangles = triangles[order]
+    return triangles[sortClusters(positions, triangles, clusters)].reshape(-1)
+
+
+def vertexFetchOrder(indices: np.ndarray, vertexCount: int) -> np.ndarray:
+    """
+    :return: old index of every vertex in the order of first use by indices, unused vertices last
+    """
+    used, first = np.unique(np.asarray(indices).reshape(-1), return_index=True)
+    unused = np.setdiff1d(np.arange(vertexCount), used, assume_unique=True)
+    return np.concatenate((used[np.argsort(first, kind='stable')], unused)).astype(np.int64)
+
+
+def narrowIndices(indices: np.ndarray) -> np.ndarray:
+    """
+    :return: indices as 16 bit integers if they fit, wider types are twice as large to fetch
+    """
+    if indices.dtype.itemsize > 2 and (len(indices) == 0 or int(indices.max()) < 1 << 16):
+        return indices.astype(np.uint16)
+    return indices
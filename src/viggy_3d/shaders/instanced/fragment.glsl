@@ -0,0 +1,120 @@
+# version 330 core
+
+
+struct Material {
+    vec3 ambient;
+	vec3 diffuse;
+	vec3 specular;
+	float shininess;  // affects radius of specular highlight
+};
+
+
+struct Light {
+    vec3 position;
+
+    vec3 ambient;
+    vec3 diffuse;
+    vec3 specular;
+
+    vec3 k;  // attenuation
+};
+
+
+// per frame data shared by every shader, filled by Graph, must match UniformBuffer.frameLayout
+layout (std140) uniform Frame {
+    mat4 view;
+    mat4 projection;
+    vec3 cameraPos;
+    Light light;
+    // clusters along x, y and z and the number of lights, see LightClusters
+    ivec4 clusterGrid;
+    // the cluster slice of a view depth d is log(d) * clusterDepth.x + clusterDepth.y, viewport width and height
+    vec4 clusterDepth;
+};
+
+
+in VS_OUT {
+    vec3 position;
+    vec3 normal;  // already normalized
+    vec2 UV;
+    vec4 color;
+} fs_in;
+
+
+uniform sampler2D baseTexture;
+uniform vec4 baseColorFactor;
+uniform float alphaCutoff;  // alpha mode MASK, 0 for other modes
+uniform Material material;
+
+// point lights of the frame assigned to clusters of the view frustum, filled by LightClusters.
+// 5 texels per light: position and radius, ambient, diffuse, specular and attenuation
+uniform samplerBuffer lights;
+// first index into lightIndices and number of lights of each cluster
+uniform usamplerBuffer clusters;
+uniform usamplerBuffer lightIndices;
+
+
+vec3 calcLight(Material _material,
+               Light _light,
+               vec3 _fragPos,  // position of fragment in world coordinates
+               vec3 _cameraPos,  // position of camera in world coordinates
+               vec3 _normal)  // normalized normal
+{
+    // ambient
+    vec3 ambient = _light.ambient * _material.ambient;
+
+    // diffuse
+	vec3 lightDir = normalize(_light.position - _fragPos);
+	float diffuseFactor = max(dot(_normal, lightDir), 0.0f);
+	vec3 diffuse = diffuseFactor * _light.diffuse * _material.diffuse;
+
+	// specular
+	vec3 cameraDir = normalize(_cameraPos - _fragPos);
+    vec3 reflectedDir = reflect(-lightDir, _normal);
+    float specularFactor = pow(max(dot(cameraDir, reflectedDir), 0.01f), _material.shininess);
+    vec3 specular = specularFactor * _light.specular * _material.specular;
+
+    // loss in light due to distance
+	float distance = length(_light.position - _fragPos);
+	float attenuation = 1.0 / (_light.k.x + _light.k.y * distance + _light.k.z * distance * distance);
+
+	return (ambient + diffuse + specular) * attenuation;
+}
+
+
+// sum of the lights of the cluster of the fragment, lights are skipped beyond their radius
+vec3 calcLights(Material _material, vec3 _fragPos, vec3 _cameraPos, vec3 _normal)
+{
+    float depth = max(-(view * vec4(_fragPos, 1.0)).z, 1e-6);
+    ivec3 cell = ivec3(ivec2(gl_FragCoord.xy / clusterDepth.zw * vec2(clusterGrid.xy)),
+                       int(floor(log(depth) * clusterDepth.x + clusterDepth.y)));
+    cell = clamp(cell, ivec3(0), clusterGrid.xyz - 1);
+    uvec2 cluster = texelFetch(clusters, (cell.z * clusterGrid.y + cell.y) * clusterGrid.x + cell.x).xy;
+
+    vec3 color = vec3(0.0);
+    for (uint i = cluster.x; i < cluster.x + cluster.y; i++)
+    {
+        int texel = int(texelFetch(lightIndices, int(i)).x) * 5;
+        vec4 positionRadius = texelFetch(lights, texel);
+        if (length(positionRadius.xyz - _fragPos) > positionRadius.w)
+            continue;
+
+        Light pointLight = Light(positionRadius.xyz,
+                                 texelFetch(lights, texel + 1).xyz,
+                                 texelFetch(lights, texel + 2).xyz,
+                                 texelFetch(lights, texel + 3).xyz,
+                                 texelFetch(lights, texel + 4).xyz);
+        color += calcLight(_material, pointLight, _fragPos, _cameraPos, _normal);
+    }
+    return color;
+}
+
+
+void main()
+{
+    vec4 baseColor = baseColorFactor * fs_in.color * texture(baseTexture, fs_in.UV);
+    if (baseColor.a < alphaCutoff)
+        discard;
+
+    gl_FragColor = vec4(calcLights(material, fs_in.position, cameraPos, fs_in.normal), 1.0) * baseColor;
+}
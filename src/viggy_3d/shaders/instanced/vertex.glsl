@@ -0,0 +1,62 @@
+# version 330 core
+
+
+// vertex attributes at locations 0 to 2 and the vertexPosition, vertexNormal and vertexTexCoord functions
+// that decode them, generated by Shader from a VertexLayout. normals need not be normalized
+#pragma vertex_layout
+
+// instance attributes, must match InstancedVertexBuffer.instanceLayout
+layout (location = 3) in mat4 i_model;  // locations 3 to 6, applied after model
+layout (location = 7) in vec4 i_color;
+
+
+// output to fragment
+out VS_OUT {
+    vec3 position;
+    vec3 normal;
+    vec2 UV;
+    vec4 color;
+} vs_out;
+
+
+struct Light {
+    vec3 position;
+
+    vec3 ambient;
+    vec3 diffuse;
+    vec3 specular;
+
+    vec3 k;  // attenuation
+};
+
+
+// per frame data shared by every shader, filled by Graph, must match UniformBuffer.frameLayout
+layout (std140) uniform Frame {
+    mat4 view;
+    mat4 projection;
+    vec3 cameraPos;
+    Light light;
+    // clusters along x, y and z and the number of lights, see LightClusters
+    ivec4 clusterGrid;
+    // the cluster slice of a view depth d is log(d) * clusterDepth.x + clusterDepth.y, viewport width and height
+    vec4 clusterDepth;
+};
+
+
+uniform mat4 model;
+
+
+void main()
+{
+    mat4 world = i_model * model;
+
+    // the position in world coordinates
+    vs_out.position = (world * vec4(vertexPosition(), 1.0)).xyz;
+    // the normal with model rotations but no translations
+    vs_out.normal = normalize(mat3(world) * vertexNormal());
+    vs_out.UV = vertexTexCoord();
+    vs_out.color = i_color;
+
+    // the position in screen coordinates
+    gl_Position = projection * view * vec4(vs_out.position, 1.0);
+}
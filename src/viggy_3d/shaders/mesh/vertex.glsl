@@ -5,9 +5,31 @@ layout (location = 0) in vec3 position;
 layout (location = 1) in vec3 i_position;
 
 
+struct Light {
+    vec3 position;
+
+    vec3 ambient;
+    vec3 diffuse;
+    vec3 specular;
+
+    vec3 k;  // attenuation
+};
+
+
+// per frame data shared by every shader, filled by Graph, must match UniformBuffer.frameLayout
+layout (std140) uniform Frame {
+    mat4 view;
+    mat4 projection;
+    vec3 cameraPos;
+    Light light;
+    // clusters along x, y and z and the number of lights, see LightClusters
+    ivec4 clusterGrid;
+    // the cluster slice of a view depth d is log(d) * clusterDepth.x + clusterDepth.y, viewport width and height
+    vec4 clusterDepth;
+};
+
+
 uniform mat4 model;
-uniform mat4 view;
-uniform mat4 projection;
 
 
 void main()
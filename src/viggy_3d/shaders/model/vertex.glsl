@@ -1,10 +1,9 @@
 # version 330 core
 
 
-// vertex attributes
-layout (location = 0) in vec3 position;
-layout (location = 1) in vec3 normal;  // need not be normalized
-layout (location = 2) in vec2 UV;
+// vertex attributes at locations 0 to 2 and the vertexPosition, vertexNormal and vertexTexCoord functions
+// that decode them, generated by Shader from a VertexLayout. normals need not be normalized
+#pragma vertex_layout
 
 
 // output to fragment
@@ -15,18 +14,40 @@ out VS_OUT {
 } vs_out;
 
 
+struct Light {
+    vec3 position;
+
+    vec3 ambient;
+    vec3 diffuse;
+    vec3 specular;
+
+    vec3 k;  // attenuation
+};
+
+
+// per frame data shared by every shader, filled by Graph, must match UniformBuffer.frameLayout
+layout (std140) uniform Frame {
+    mat4 view;
+    mat4 projection;
+    vec3 cameraPos;
+    Light light;
+    // clusters along x, y and z and the number of lights, see LightClusters
+    ivec4 clusterGrid;
+    // the cluster slice of a view depth d is log(d) * clusterDepth.x + clusterDepth.y, viewport width and height
+    vec4 clusterDepth;
+};
+
+
 uniform mat4 model;
-uniform mat4 view;
-uniform mat4 projection;
 
 
 void main()
 {
     // the position in world coordinates
-    vs_out.position = (model * vec4(position, 1.0)).xyz;
+    vs_out.position = (model * vec4(vertexPosition(), 1.0)).xyz;
     // the normal with model rotations but no translations
-    vs_out.normal = normalize(mat3(model) * normal);
-    vs_out.UV = UV;
+    vs_out.normal = normalize(mat3(model) * vertexNormal());
+    vs_out.UV = vertexTexCoord();
 
     // the position in screen coordinates
     gl_Position = projection * view * vec4(vs_out.position, 1.0);
@@ -0,0 +1,79 @@
+# version 330 core
+
+
+// vertex attributes at locations 0 to 2 and the vertexPosition, vertexNormal and vertexTexCoord functions
+// that decode them, generated by Shader from a VertexLayout. normals need not be normalized
+#pragma vertex_layout
+
+// indices of the 4 joints that move the vertex into the joints of its skin and their weights
+layout (location = 8) in vec4 joints;
+layout (location = 9) in vec4 weights;
+
+
+// output to fragment
+out VS_OUT {
+    vec3 position;
+    vec3 normal;
+    vec2 UV;
+} vs_out;
+
+
+struct Light {
+    vec3 position;
+
+    vec3 ambient;
+    vec3 diffuse;
+    vec3 specular;
+
+    vec3 k;  // attenuation
+};
+
+
+// per frame data shared by every shader, filled by Graph, must match UniformBuffer.frameLayout
+layout (std140) uniform Frame {
+    mat4 view;
+    mat4 projection;
+    vec3 cameraPos;
+    Light light;
+    // clusters along x, y and z and the number of lights, see LightClusters
+    ivec4 clusterGrid;
+    // the cluster slice of a view depth d is log(d) * clusterDepth.x + clusterDepth.y, viewport width and height
+    vec4 clusterDepth;
+};
+
+
+uniform mat4 model;
+
+// joint matrices of every skinned mesh of the frame, 4 texels per matrix, filled by AnimationPlayer.
+// the matrices of this mesh start at jointOffset and take it from the space of the mesh into the space of its node
+uniform samplerBuffer jointMatrices;
+uniform int jointOffset;
+
+
+mat4 jointMatrix(float joint)
+{
+    int texel = (jointOffset + int(joint)) * 4;
+    return mat4(texelFetch(jointMatrices, texel),
+                texelFetch(jointMatrices, texel + 1),
+                texelFetch(jointMatrices, texel + 2),
+                texelFetch(jointMatrices, texel + 3));
+}
+
+
+void main()
+{
+    mat4 skin = weights.x * jointMatrix(joints.x)
+              + weights.y * jointMatrix(joints.y)
+              + weights.z * jointMatrix(joints.z)
+              + weights.w * jointMatrix(joints.w);
+    mat4 skinnedModel = model * skin;
+
+    // the position in world coordinates
+    vs_out.position = (skinnedModel * vec4(vertexPosition(), 1.0)).xyz;
+    // the normal with model rotations but no translations
+    vs_out.normal = normalize(mat3(skinnedModel) * vertexNormal());
+    vs_out.UV = vertexTexCoord();
+
+    // the position in screen coordinates
+    gl_Position = projection * view * vec4(vs_out.position, 1.0);
+}
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+from typing import List, Tuple
+
+import numpy as np
+
+
+# borders and attribute seams are kept in place by planes through their edges weighted by this factor
+edgeWeight = 10.0
+
+# rounds of picking collapses that share no vertex in every pass
+matchingRounds = 4
+
+
+def planeQuadrics(planes: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    :param planes: (n, 4) unit planes (a, b, c, d) with a x + b y + c z + d = 0
+    :return: (n, 4, 4) weighted quadrics measuring the squared distance to each plane
+    """
+    return planes[:, :, None] * planes[:, None, :] * weights[:, None, None]
+
+
+def accumulate(vertices: np.ndarray, values: np.ndarray, count: int) -> np.ndarray:
+    """
+    :param vertices: (n,) vertex index of each value
+    :param values: (n, ...) values to add up per vertex
+    :return: (count, ...) sums
+    """
+    flat = values.reshape(len(values), -1)
+    sums = np.stack([np.bincount(vertices, flat[:, i], count) for i in range(flat.shape[1])], axis=1)
+    return sums.reshape((count,) + values.shape[1:])
+
+
+def isDegenerate(triangles: np.ndarray) -> np.ndarray:
+    return (triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) \
+        | (triangles[:, 2] == triangles[:, 0])
+
+
+def simplify(positions: np.ndarray, indices: np.ndarray, targets: List[int]) -> List[Tuple[np.ndarray, float]]:
+    """
+    quadric error edge collapse that moves vertices onto their neighbours, so the vertex arrays are reused as they are
+    vertices at the same position are welded, vertices on seams of normals or texture coordinates only move along
+    the seam with the vertices on both sides of it and vertices on open borders only move along the border.
+    collapses that share no vertex are done together in passes, each pass takes the cheapest half of them
+    :param positions: (n, 3) vertex positions
+    :param indices: vertex indices of the triangles
+    :param targets: decreasing triangle counts, the mesh is recorded when it falls to each of them
+    :return: flat indices and the largest error in units of positions for each target that was reached,
+             fewer than targets if the mesh cannot be simplified further
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+
+    # welded vertex of every vertex, topology and quadrics use welded vertices
+    weldedPositions, welded = np.unique(positions, axis=0, return_inverse=True)
+    welded = welded.reshape(-1)
+    weldedCount = len(weldedPositions)
+
+    triangles = triangles[~isDegenerate(welded[triangles])]
+    weldedTriangles = welded[triangles]
+
+    corners = weldedPositions[weldedTriangles]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    areas = np.linalg.norm(normals, axis=1)
+    normals /= np.maximum(areas, 1e-30)[:, None]
+    planes = np.concatenate((normals, -(normals * corners[:, 0]).sum(axis=1, keepdims=True)), axis=1)
+
+    quadrics = accumulate(weldedTriangles.reshape(-1), np.repeat(planeQuadrics(planes, areas), 3, axis=0),
+                          weldedCount)
+    # area around each vertex, errors are divided by it to measure distances
+    weights = np.bincount(weldedTriangles.reshape(-1), np.repeat(areas, 3), weldedCount)
+
+    # an edge is on a border if one triangle uses it and on a seam if its triangles use different vertices for it
+    starts = weldedTriangles.reshape(-1)
+    ends = weldedTriangles[:, [1, 2, 0]].reshape(-1)
+    lows = np.where(starts < ends, triangles.reshape(-1), triangles[:, [1, 2, 0]].reshape(-1))
+    highs = np.where(starts < ends, triangles[:, [1, 2, 0]].reshape(-1), triangles.reshape(-1))
+    _, edges, edgeCounts = np.unique(np.minimum(starts, ends) * weldedCount + np.maximum(starts, ends),
+                                     return_inverse=True, return_counts=True)
+    edges = edges.reshape(-1)
+    border = edgeCounts[edges] == 1
+    seam = np.zeros(len(edges), dtype=bool)
+    for vertices in (lows, highs):
+        low = np.full(len(edgeCounts), len(positions))
+        high = np.full(len(edgeCounts), -1)
+        np.minimum.at(low, edges, vertices)
+        np.maximum.at(high, edges, vertices)
+        seam |= (low != high)[edges]
+
+    # planes through border and seam edges, perpendicular to their triangle
+    fixed = border | seam
+    directions = weldedPositions[ends[fixed]] - weldedPositions[starts[fixed]]
+    lengths = np.linalg.norm(directions, axis=1)
+    edgeNormals = np.cross(directions, np.repeat(normals, 3, axis=0)[fixed])
+    edgeNormals /= np.maximum(np.linalg.norm(edgeNormals, axis=1), 1e-30)[:, None]
+    edgePlanes = np.concatenate((edgeNormals, -(edgeNormals * weldedPositions[starts[fixed]])
+                                 .sum(axis=1, keepdims=True)), axis=1)
+    edgeQuadrics = planeQuadrics(edgePlanes, lengths * lengths * edgeWeight)
+    quadrics += accumulate(np.concatenate((starts[fixed], ends[fixed])), np.concatenate((edgeQuadrics,) * 2),
+                           weldedCount)
+    isBorder = np.zeros(weldedCount, dtype=bool)
+    isBorder[starts[border]] = True
+
+    results: List[Tuple[np.ndarray, float]] = []
+    error = 0.0
+    targets = list(targets)
+
+    while targets:
+        while targets and len(triangles) <= targets[0]:
+            results.append((triangles.reshape(-1).copy(), float(np.sqrt(error))))
+            targets.pop(0)
+        if not targets:
+            break
+
+        # every vertex of every directed edge of the current mesh, once for each destination
+        starts = weldedTriangles.reshape(-1)
+        ends = weldedTriangles[:, [1, 2, 0]].reshape(-1)
+        sources = np.concatenate((starts, ends))
+        destinations = np.concatenate((ends, starts))
+        sourceVertices = np.concatenate((triangles.reshape(-1), triangles[:, [1, 2, 0]].reshape(-1)))
+        destinationVertices = np.concatenate((triangles[:, [1, 2, 0]].reshape(-1), triangles.reshape(-1)))
+        _, first = np.unique(sourceVertices * weldedCount + destinations, return_index=True)
+        sources, destinations = sources[first], destinations[first]
+        sourceVertices, destinationVertices = sourceVertices[first], destinationVertices[first]
+
+        # collapses of a welded vertex onto a neighbour, each moves every vertex of the source that its edge uses
+        collapses, pairCollapses, movedCounts = np.unique(sources * weldedCount + destinations,
+                                                          return_inverse=True, return_counts=True)
+        pairCollapses = pairCollapses.reshape(-1)
+        collapseSources, collapseDestinations = np.divmod(collapses, weldedCount)
+
+        # a source with a vertex that the edge does not use would tear the mesh apart
+        vertexCounts = np.bincount(welded[np.unique(triangles)], minlength=weldedCount)
+        edgeKeys, edgeCounts = np.unique(np.minimum(starts, ends) * weldedCount + np.maximum(starts, ends),
+                                         return_counts=True)
+        isBorderEdge = edgeCounts[np.searchsorted(edgeKeys, np.minimum(collapseSources, collapseDestinations)
+                                                  * weldedCount + np.maximum(collapseSources,
+                                                                             collapseDestinations))] == 1
+        allowed = (movedCounts == vertexCounts[collapseSources]) & (~isBorder[collapseSources] | isBorderEdge)
+
+        point = np.concatenate((weldedPositions[collapseDestinations], np.ones((len(collapses), 1))), axis=1)
+        costs = np.einsum('ni,nij,nj->n', point, quadrics[collapseSources] + quadrics[collapseDestinations], point)
+        costs = np.maximum(costs, 0) / np.maximum(weights[collapseSources] + weights[collapseDestinations], 1e-30)
+
+        # collapses that share no vertex, each round takes those that are the cheapest at both of their vertices
+        candidates = np.nonzero(allowed)[0]
+        ranks = np.empty(len(costs), dtype=np.int64)
+        ranks[np.argsort(costs, kind='stable')] = np.arange(len(costs))
+        free = np.ones(weldedCount, dtype=bool)
+        chosen = []
+        for _ in range(matchingRounds):
+            candidates = candidates[free[collapseSources[candidates]] & free[collapseDestinations[candidates]]]
+            if len(candidates) == 0:
+                break
+            best = np.full(weldedCount, len(costs), dtype=np.int64)
+            np.minimum.at(best, collapseSources[candidates], ranks[candidates])
+            np.minimum.at(best, collapseDestinations[candidates], ranks[candidates])
+            picked = candidates[(best[collapseSources[candidates]] == ranks[candidates])
+                                & (best[collapseDestinations[candidates]] == ranks[candidates])]
+            free[collapseSources[picked]] = False
+            free[collapseDestinations[picked]] = False
+            chosen.append(picked)
+        if not chosen:
+            break
+
+        def withoutFlips(chosen: np.ndarray) -> np.ndarray:
+            """
+            drops collapses that would flip a triangle until no triangle flips
+            """
+            while len(chosen):
+                moved = weldedMap(chosen)[weldedTriangles]
+                changed = (moved != weldedTriangles).any(axis=1) & ~isDegenerate(moved)
+                newCorners = weldedPositions[moved[changed]]
+                newNormals = np.cross(newCorners[:, 1] - newCorners[:, 0], newCorners[:, 2] - newCorners[:, 0])
+                flipped = (newNormals * normals[changed]).sum(axis=1) <= 0
+                if not flipped.any():
+                    break
+                rejected = np.zeros(weldedCount, dtype=bool)
+                rejected[weldedTriangles[changed][flipped].reshape(-1)] = True
+                chosen = chosen[~rejected[collapseSources[chosen]] & ~rejected[collapseDestinations[chosen]]]
+            return chosen
+
+        def weldedMap(chosen: np.ndarray) -> np.ndarray:
+            result = np.arange(weldedCount)
+            result[collapseSources[chosen]] = collapseDestinations[chosen]
+            return result
+
+        # the cheapest half, each collapse removes about two triangles, near a target fewer are taken
+        chosen = withoutFlips(np.concatenate(chosen))
+        chosen = chosen[np.argsort(costs[chosen], kind='stable')]
+        chosen = withoutFlips(chosen[:max(1, min(len(chosen) // 2, (len(triangles) - targets[0]) // 2 + 16))])
+        if len(chosen) == 0:
+            break
+
+        error = max(error, float(costs[chosen].max()))
+        quadrics[collapseDestinations[chosen]] += quadrics[collapseSources[chosen]]
+        weights[collapseDestinations[chosen]] += weights[collapseSources[chosen]]
+
+        isChosen = np.zeros(len(collapses), dtype=bool)
+        isChosen[chosen] = True
+        pairs = isChosen[pairCollapses]
+        vertexMap = np.arange(len(positions))
+        vertexMap[sourceVertices[pairs]] = destinationVertices[pairs]
+
+        weldedTriangles = weldedMap(chosen)[weldedTriangles]
+        keep = ~isDegenerate(weldedTriangles)
+        triangles = vertexMap[triangles[keep]]
+        weldedTriangles = weldedTriangles[keep]
+        corners = weldedPositions[weldedTriangles]
+        normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+
+    return results
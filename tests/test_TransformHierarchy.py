@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from viggy_3d.TransformHierarchy import TransformHierarchy
+
+
+def translation(x: float, y: float = 0.0, z: float = 0.0) -> np.ndarray:
+    matrix = np.eye(4, dtype=np.float32)
+    matrix[:3, 3] = (x, y, z)
+    return matrix
+
+
+def chain() -> (TransformHierarchy, np.ndarray):
+    """
+    root -> child -> grandchild, each translated by 1 along x
+    """
+    hierarchy = TransformHierarchy()
+    handles = hierarchy.add(np.stack([translation(1)] * 3), np.array([-1, 0, 1]))
+    hierarchy.update()
+    return hierarchy, handles
+
+
+def test_add_and_update():
+    hierarchy, handles = chain()
+    assert len(hierarchy) == 3
+    for i, handle in enumerate(handles):
+        np.testing.assert_allclose(hierarchy.world(handle), translation(i + 1))
+
+
+def test_add_under_parent():
+    hierarchy, handles = chain()
+    new = hierarchy.add(translation(0, 1)[None], parent=handles[2])
+    hierarchy.update()
+    np.testing.assert_allclose(hierarchy.world(new[0]), translation(3, 1))
+
+
+def test_update_propagates_to_subtree_only():
+    hierarchy, handles = chain()
+    other = hierarchy.add(translation(5)[None])
+    hierarchy.update()
+
+    hierarchy.setLocal(handles[1], translation(2))
+    assert hierarchy.update() == 2
+    np.testing.assert_allclose(hierarchy.world(handles[2]), translation(4))
+    np.testing.assert_allclose(hierarchy.world(other[0]), translation(5))
+    assert hierarchy.update() == 0
+
+
+def test_set_parent():
+    hierarchy, handles = chain()
+    other = hierarchy.add(translation(0, 2)[None])
+
+    hierarchy.setParent(handles[2], other[0])
+    hierarchy.update()
+    np.testing.assert_allclose(hierarchy.world(handles[2]), translation(1, 2))
+
+    hierarchy.setParent(handles[2], handles[0], keepWorld=True)
+    hierarchy.update()
+    np.testing.assert_allclose(hierarchy.world(handles[2]), translation(1, 2), atol=1e-6)
+    np.testing.assert_allclose(hierarchy.local(handles[2]), translation(0, 2), atol=1e-6)
+
+
+def test_set_parent_rejects_cycles():
+    hierarchy, handles = chain()
+    with pytest.raises(ValueError):
+        hierarchy.setParent(handles[0], handles[2])
+
+
+def test_remove_removes_subtree():
+    hierarchy, handles = chain()
+    other = hierarchy.add(translation(5)[None])
+
+    hierarchy.remove(handles[1])
+    hierarchy.update()
+    assert len(hierarchy) == 2
+    np.testing.assert_allclose(hierarchy.world(handles[0]), translation(1))
+    np.testing.assert_allclose(hierarchy.world(other[0]), translation(5))
+    for handle in handles[1:]:
+        with pytest.raises(ValueError):
+            hierarchy.world(handle)
+
+
+def test_removed_handles_are_rejected():
+    hierarchy, handles = chain()
+    other = hierarchy.add(translation(5)[None])
+    hierarchy.remove(handles[1])
+    hierarchy.update()
+
+    with pytest.raises(ValueError):
+        hierarchy.add(translation(0)[None], parent=handles[1])
+    with pytest.raises(ValueError):
+        hierarchy.setParent(other[0], handles[1])
+    with pytest.raises(ValueError):
+        hierarchy.setParent(handles[2], -1)
+    with pytest.raises(ValueError):
+        hierarchy.setLocal(handles[1], translation(3))
+    with pytest.raises(ValueError):
+        hierarchy.local(handles[2])
+
+    # nothing was changed by the rejected calls
+    assert hierarchy.update() == 0
+    assert len(hierarchy) == 2
+    np.testing.assert_allclose(hierarchy.world(other[0]), translation(5))